@@ -0,0 +1,54 @@
+"""Per-lookup cost of matching action patterns against the Service Authorization Reference.
+
+Compares the `fnmatch.filter` scan over every qualified action name with
+`ActionIndex.match`, for literal actions and wildcard patterns derived from
+the reference itself.
+
+    python benchmarks/action_index.py
+"""
+
+import fnmatch
+import random
+import time
+
+from cloudformation_permissions.adapters.action_index import ActionIndex
+from cloudformation_permissions.adapters.sar import ServiceAuthorizationReferenceLocal
+
+
+def per_lookup(function, patterns, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for pattern in patterns:
+            function(pattern)
+        best = min(best, time.perf_counter() - start)
+    return best / len(patterns)
+
+
+def main():
+    names = list(ServiceAuthorizationReferenceLocal().actions)
+    start = time.perf_counter()
+    index = ActionIndex(names)
+    build = time.perf_counter() - start
+
+    sample = random.Random(0).sample(names, min(500, len(names)))  # noqa: S311 - seeded, runs are repeatable
+    workloads = {
+        "literal": sample,
+        "literal (missing)": [f"{name}Missing" for name in sample],
+        "prefix wildcard": [f"{name.partition(':')[0]}:{name.partition(':')[2][:3]}*" for name in sample],
+        "service wildcard": [f"{name.partition(':')[0]}:*" for name in sample],
+        "inner wildcard": [f"{name.partition(':')[0]}:*{name[-4:]}" for name in sample],
+    }
+
+    print(f"{len(names)} actions, index built in {build * 1e3:.1f} ms")
+    print(f"{'workload':<20}{'fnmatch':>14}{'index':>14}{'speedup':>10}")
+    for workload, patterns in workloads.items():
+        for pattern in patterns:
+            assert index.match(pattern) == fnmatch.filter(names, pattern), pattern
+        scan = per_lookup(lambda pattern: fnmatch.filter(names, pattern), patterns)
+        indexed = per_lookup(index.match, patterns)
+        print(f"{workload:<20}{scan * 1e6:>11.1f} us{indexed * 1e6:>11.1f} us{scan / indexed:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
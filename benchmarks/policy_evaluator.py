@@ -0,0 +1,54 @@
+"""Checks per second of the local policy evaluator against the Service Authorization Reference.
+
+Compiles a policy of service wildcards, prefix wildcards, NotAction and Deny
+statements, then decides every action in the reference, first uncached and
+then again from remembered decisions.
+
+    python benchmarks/policy_evaluator.py
+"""
+
+import random
+import time
+
+from cloudformation_permissions.adapters.policy_evaluator import PolicyEvaluator
+from cloudformation_permissions.adapters.sar import ServiceAuthorizationReferenceLocal
+
+
+def main():
+    reference = ServiceAuthorizationReferenceLocal()
+    names = list(reference.actions)
+    services = sorted({name.partition(":")[0] for name in names})
+    chosen = random.Random(0).sample(services, min(20, len(services)))  # noqa: S311 - seeded, runs are repeatable
+    policy = {
+        "Statement": [
+            {"Effect": "Allow", "Action": [f"{service}:*" for service in chosen], "Resource": "*"},
+            {"Effect": "Allow", "Action": ["*:Get*", "*:List*", "*:Describe*"], "Resource": "*"},
+            {"Effect": "Deny", "Action": [f"{service}:Delete*" for service in chosen], "Resource": "*"},
+            {
+                "Effect": "Deny",
+                "NotAction": [f"{service}:*" for service in services[: len(services) // 2]],
+                "Resource": "*",
+            },
+        ]
+    }
+
+    start = time.perf_counter()
+    evaluator = PolicyEvaluator.from_documents(reference.action_index, [policy])
+    compiled = time.perf_counter() - start
+
+    start = time.perf_counter()
+    decisions = [evaluator.decide(name) for name in names]
+    uncached = time.perf_counter() - start
+    start = time.perf_counter()
+    for name in names:
+        evaluator.decide(name)
+    cached = time.perf_counter() - start
+
+    print(f"{len(names)} actions, policy compiled in {compiled * 1e3:.1f} ms")
+    print(f"{decisions.count('allowed')} allowed, {decisions.count('explicitDeny')} explicitly denied")
+    print(f"uncached {len(names) / uncached:>12,.0f} checks/s")
+    print(f"cached   {len(names) / cached:>12,.0f} checks/s")
+
+
+if __name__ == "__main__":
+    main()
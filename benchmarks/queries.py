@@ -0,0 +1,319 @@
+"""Throughput, peak memory and time per stage of whole queries, without calling AWS.
+
+Wires `bootstrap` to fake CloudFormation and IAM clients. DescribeType
+answers from resource provider schemas, synthetic ones whose handlers list
+actions of the Service Authorization Reference, or those of a directory or
+zip given with --schemas, such as CloudformationSchema.zip.
+SimulatePrincipalPolicy allows three actions in four, its requests are rate
+limited as the CLI's are. `resource permissions` is run once for each
+resource type, up to the size, `template permissions` and `template verify`
+read synthetic templates of 10 to 10,000 resources. Schemas are not cached on
+disk, so every run describes its types again.
+
+Each query is run once to load the reference, then timed best of --repeat,
+then run once more under tracemalloc for its peak memory. Results are compared
+with the baseline, exiting 1 when a query made more AWS calls, which are the
+same on every machine. Throughput that fell, or peak memory that grew, by more
+than --tolerance is only reported, as times are only comparable on the
+machine they were recorded on, unless --strict is given. --save records them
+as the new baseline.
+
+    python benchmarks/queries.py [--sizes 10,100,1000,10000] [--schemas CloudformationSchema.zip] [--save]
+"""
+
+import argparse
+import io
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from collections import Counter
+from pathlib import Path
+
+import yaml
+from botocore.exceptions import ClientError
+
+from cloudformation_permissions.adapters.aws import AWS
+from cloudformation_permissions.adapters.permissions_resolver.permission_table import read_schemas
+from cloudformation_permissions.adapters.sar import ServiceAuthorizationReferenceLocal
+from cloudformation_permissions.adapters.timings import STAGES, Timings
+from cloudformation_permissions.bootstrap import WarmInstances, bootstrap, warm_instances
+from cloudformation_permissions.domain import queries
+from cloudformation_permissions.domain.model import ARN
+from cloudformation_permissions.entrypoints.cli import print_report
+
+BASELINE = Path(__file__).parent / "baselines" / "queries.json"
+QUERIES = ("resource permissions", "template permissions", "template verify")
+ROLE = ARN.from_str("arn:aws:iam::123456789012:role/deploy")
+HANDLER_TYPES = ("create", "read", "update", "delete", "list")
+# services with fewer actions are not used by the synthetic schemas
+MIN_SERVICE_ACTIONS = 10
+
+
+def synthetic_schemas(types: int) -> dict[str, dict]:
+    """Schemas of `types` resource types, each handler listing actions of one service of the reference"""
+    by_service = dict[str, list[str]]()
+    for name in ServiceAuthorizationReferenceLocal().actions:
+        by_service.setdefault(name.partition(":")[0], []).append(name)
+    services = sorted(service for service, names in by_service.items() if len(names) >= MIN_SERVICE_ACTIONS)
+    chosen = random.Random(0)  # noqa: S311 - seeded, runs are repeatable
+    schemas = {}
+    for index in range(types):
+        service = services[index % len(services)]
+        type_name = f"AWS::Benchmark{index}::{service.title().replace('-', '')}"
+        schemas[type_name] = {
+            "typeName": type_name,
+            "handlers": {handler: {"permissions": chosen.sample(by_service[service], 5)} for handler in HANDLER_TYPES},
+        }
+    return schemas
+
+
+def recorded_schemas(path: Path) -> dict[str, dict]:
+    """Schemas with handlers of a directory or zip of them"""
+    source = path if path.is_dir() else path.read_bytes()
+    return {schema["typeName"]: schema for schema in read_schemas(source) if schema.get("handlers")}
+
+
+class ReplayCloudFormation:
+    def __init__(self, schemas: dict[str, dict], latency: float):
+        self.schemas = schemas
+        self.latency = latency
+        self.calls = Counter[str]()
+
+    def describe_type(self, Type: str, TypeName: str) -> dict:
+        self.calls["DescribeType"] += 1
+        time.sleep(self.latency)
+        if TypeName not in self.schemas:
+            raise ClientError({"Error": {"Code": "TypeNotFoundException", "Message": TypeName}}, "DescribeType")
+        return {
+            "Arn": f"arn:aws:cloudformation:us-east-1::type/resource/{TypeName.replace('::', '-')}",
+            "DefaultVersionId": "00000001",
+            "Schema": json.dumps(self.schemas[TypeName]),
+        }
+
+
+class ReplaySimulation:
+    def __init__(self, iam: "ReplayIAM"):
+        self.iam = iam
+
+    def paginate(self, PolicySourceArn: str, ActionNames: list[str]):
+        self.iam.calls["SimulatePrincipalPolicy"] += 1
+        time.sleep(self.iam.latency)
+        yield {
+            "EvaluationResults": [
+                {
+                    "EvalActionName": action,
+                    "EvalDecision": "allowed" if zlib.crc32(action.encode()) % 4 else "implicitDeny",
+                }
+                for action in ActionNames
+            ],
+            "IsTruncated": False,
+        }
+
+
+class ReplayIAM:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = Counter[str]()
+
+    def get_paginator(self, operation: str) -> ReplaySimulation:
+        assert operation == "simulate_principal_policy", operation
+        return ReplaySimulation(self)
+
+
+class ReplaySTS:
+    def get_caller_identity(self) -> dict:
+        return {"Account": "123456789012", "Arn": "arn:aws:sts::123456789012:assumed-role/deploy/benchmark"}
+
+
+class ReplayAWS(AWS):
+    """An AWS session whose clients answer from `schemas` rather than calling AWS"""
+
+    region = "us-east-1"
+    partition = "aws"
+
+    def __init__(self, schemas: dict[str, dict], latency: float = 0.0):
+        super().__init__()
+        self.clients = {
+            "cloudformation": ReplayCloudFormation(schemas, latency),
+            "iam": ReplayIAM(latency),
+            "sts": ReplaySTS(),
+        }
+
+    def client(self, service_name: str):
+        return self.clients[service_name]
+
+    def calls(self) -> dict[str, int]:
+        return dict(self.clients["cloudformation"].calls + self.clients["iam"].calls)
+
+
+def synthetic_template(resources: int, type_names: list[str]) -> dict:
+    return {
+        "AWSTemplateFormatVersion": "2010-09-09",
+        "Parameters": {"Environment": {"Type": "String"}},
+        "Resources": {
+            f"Resource{index}": {
+                "Type": type_names[index % len(type_names)],
+                "Properties": {
+                    "Name": {"Fn::Sub": f"${{Environment}}-resource-{index}"},
+                    "Tags": [{"Key": "index", "Value": str(index)}, {"Key": "team", "Value": "platform"}],
+                },
+            }
+            for index in range(resources)
+        },
+    }
+
+
+def answer(query: queries.Query, template: Path | None, aws: ReplayAWS, timings: Timings, args) -> None:
+    """Answer `query` as the CLI would with --no-cache, writing its report to memory"""
+    output = io.StringIO()
+    handlers = bootstrap(
+        template_source=template,
+        output_format=args.output,
+        output_stream=output,
+        use_cache=False,
+        timings=timings,
+        aws=aws,
+    )
+    report = handlers[type(query)](query).ok_value
+    with timings.stage("report"):
+        print_report(report, output)
+
+
+def run(name: str, size: int, schemas: dict[str, dict], template: Path, args) -> tuple[Timings, dict[str, int]]:
+    """Run query `name` once, returning its timings and AWS calls"""
+    aws = ReplayAWS(schemas, args.latency)
+    timings = Timings()
+    match name:
+        case "resource permissions":
+            # as many runs of the CLI, one per resource type
+            type_names = list(schemas)
+            for index in range(size):
+                resource_type = type_names[index % len(type_names)]
+                query = queries.ListResourceTypePermissions(ResourceType=resource_type, PermissionLevel="full")
+                answer(query, None, aws, timings, args)
+        case "template permissions":
+            query = queries.ListTemplatePermissions(TemplateSource=template, PermissionLevel="full")
+            answer(query, template, aws, timings, args)
+        case "template verify":
+            query = queries.VerifyTemplatePermissions(TemplateSource=template, Role=ROLE, PermissionLevel="full")
+            answer(query, template, aws, timings, args)
+    return timings, aws.calls()
+
+
+def measure(name: str, size: int, schemas: dict[str, dict], template: Path, args) -> dict:
+    best, best_timings, calls = float("inf"), None, {}
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        timings, calls = run(name, size, schemas, template, args)
+        if (seconds := time.perf_counter() - start) < best:
+            best, best_timings = seconds, timings
+    tracemalloc.start()
+    run(name, size, schemas, template, args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds": best,
+        "throughput": size / best,
+        "peak_mib": peak / 2**20,
+        "stages": {stage: timing["wall"] for stage, timing in best_timings.as_dict()["stages"].items()},
+        "aws_calls": calls,
+    }
+
+
+def machine() -> dict:
+    return {"python": platform.python_version(), "platform": platform.platform(), "processor": platform.machine()}
+
+
+def compare(key: str, result: dict, baseline: dict, tolerance: float, strict: bool = False) -> tuple[str, bool]:
+    """How `result` compares with `baseline`, and whether it regressed.
+
+    Making more AWS calls is a regression, throughput or peak memory worse by
+    more than `tolerance` only is when `strict`, and is otherwise a warning.
+    """
+    if (previous := baseline.get("results", {}).get(key)) is None:
+        return "new", False
+    throughput = result["throughput"] / previous["throughput"] - 1
+    memory = result["peak_mib"] / previous["peak_mib"] - 1 if previous["peak_mib"] else 0.0
+    # the calls made are the same on every machine, any more of them is a regression
+    more_calls = sum(result["aws_calls"].values()) > sum(previous["aws_calls"].values())
+    slower = throughput < -tolerance or memory > tolerance
+    regressed = more_calls or (strict and slower)
+    verdict = f"{throughput:+.0%} speed {memory:+.0%} peak{'  more AWS calls' if more_calls else ''}"
+    if regressed:
+        return f"{verdict}  REGRESSED", True
+    return f"{verdict}{'  slower' if slower else ''}", False
+
+
+def row(name: str, size: int, result: dict, verdict: str) -> str:
+    stages = "".join(f"{result['stages'].get(stage, 0.0):>9.3f}" for stage in STAGES)
+    return (
+        f"{name:<22}{size:>7}{result['seconds']:>9.3f}{result['throughput']:>10,.0f}"
+        f"{result['peak_mib']:>10.1f}{stages}  {verdict}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="resources per template, comma separated")
+    parser.add_argument("--types", type=int, default=200, help="distinct resource types of the synthetic schemas")
+    parser.add_argument("--schemas", type=Path, help="directory or zip of resource provider schemas to replay")
+    parser.add_argument("--queries", default=",".join(QUERIES), help="queries to run, comma separated")
+    parser.add_argument("--output", default="list", help="report format, as --output of the CLI")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds each fake AWS call takes")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="regression allowed, as a fraction")
+    parser.add_argument("--strict", action="store_true", help="also fail when throughput or peak memory regressed")
+    parser.add_argument("--save", action="store_true", help="record the results as the new baseline")
+    args = parser.parse_args()
+
+    schemas = recorded_schemas(args.schemas) if args.schemas is not None else synthetic_schemas(args.types)
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    if baseline and baseline.get("machine") != machine():
+        print(f"The baseline was recorded on {baseline.get('machine')}, results may not be comparable")
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results, regressions = {}, []
+    print(f"{len(schemas)} resource types, {args.latency * 1e3:.0f} ms per AWS call, output {args.output}")
+    # queries per second for resource permissions, resources per second for the others
+    stages = "".join(f"{stage:>9}" for stage in STAGES)
+    print(f"{'query':<22}{'size':>7}{'seconds':>9}{'per s':>10}{'peak MiB':>10}{stages}  vs baseline")
+    # the reference is loaded once, as the daemon does, so only the queries themselves are measured
+    token = warm_instances.set(WarmInstances())
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            template = Path(directory) / "warm.yaml"
+            template.write_text(yaml.safe_dump(synthetic_template(10, list(schemas))))
+            run("template verify", 10, schemas, template, args)
+            for size in sizes:
+                template = Path(directory) / f"template{size}.yaml"
+                template.write_text(yaml.safe_dump(synthetic_template(size, list(schemas)), sort_keys=False))
+                for name in args.queries.split(","):
+                    # each resource type is asked for at most once
+                    count = min(size, len(schemas)) if name == "resource permissions" else size
+                    if (key := f"{name}/{count}") in results:
+                        continue
+                    results[key] = result = measure(name, count, schemas, template, args)
+                    verdict, regressed = compare(key, result, baseline, args.tolerance, args.strict)
+                    if regressed:
+                        regressions.append(key)
+                    print(row(name, count, result, verdict))
+    finally:
+        warm_instances.reset(token)
+
+    if args.save:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps({"machine": machine(), "results": results}, indent=2) + "\n")
+        print(f"Saved the baseline to {args.baseline}")
+    elif regressions:
+        print(f"Regressed: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Time to write a large batch report with each reporter.
+
+Builds a synthetic batch of templates sharing a handful of resource types,
+then writes it to memory with the rich renderables (`list`, `tree`, `iam`)
+and with the reporters that serialise straight to the stream (`plain`,
+`json`, `ndjson`).
+
+    python benchmarks/reporters.py [TEMPLATES]
+"""
+
+import io
+import sys
+import time
+from pathlib import Path
+
+from rich.console import Console
+
+from cloudformation_permissions.adapters.reporter import (
+    IAMPolicyReporter,
+    JSONLinesReporter,
+    JSONReporter,
+    ListReporter,
+    PlainListReporter,
+    ResourceReporterTree,
+    StreamingReporter,
+)
+from cloudformation_permissions.domain.model import BatchSummary, ResourcePermissionSummary, TemplateSummary
+
+REPORTERS = {
+    "list": ListReporter,
+    "tree": ResourceReporterTree,
+    "iam": IAMPolicyReporter,
+    "plain": PlainListReporter,
+    "json": JSONReporter,
+    "ndjson": JSONLinesReporter,
+}
+
+
+def batch(templates: int, resources: int = 40) -> BatchSummary:
+    types = [
+        ResourcePermissionSummary(
+            resource_type=f"AWS::Service{index}::Resource",
+            permissions=frozenset(f"service{index}:Action{action}" for action in range(20)),
+        )
+        for index in range(8)
+    ]
+    return BatchSummary(
+        templates=[
+            TemplateSummary(
+                source=Path(f"templates/{template}.yaml"),
+                resources={f"Resource{index}": types[index % len(types)] for index in range(resources)},
+                failures=[],
+            )
+            for template in range(templates)
+        ]
+    )
+
+
+def write(name: str, summary: BatchSummary) -> int:
+    stream = io.StringIO()
+    if issubclass(REPORTERS[name], StreamingReporter):
+        reporter = REPORTERS[name](stream)
+        reporter.add_summary(summary)
+        reporter.finish()
+    else:
+        Console(file=stream, width=120).print(REPORTERS[name]().add_summary(summary))
+    return len(stream.getvalue())
+
+
+def main():
+    templates = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    summary = batch(templates)
+    print(f"{templates} templates of 40 resources")
+    print(f"{'reporter':<10}{'seconds':>10}{'bytes':>14}")
+    for name in REPORTERS:
+        start = time.perf_counter()
+        size = write(name, summary)
+        print(f"{name:<10}{time.perf_counter() - start:>10.2f}{size:>14,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Wall time and peak memory of listing the resources of large local templates.
+
+Compares the full cfnlint decode `LocalAdapter` used to make with the
+streaming extractor it now uses, on synthetic YAML and JSON templates.
+
+    python benchmarks/template_extract.py [RESOURCES ...]
+"""
+
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import yaml
+
+from cloudformation_permissions.adapters.template_loader import LocalAdapter
+
+RESOURCE_TYPES = ("AWS::IAM::Role", "AWS::S3::Bucket", "AWS::Lambda::Function", "AWS::SQS::Queue")
+
+
+def synthetic_template(resources):
+    return {
+        "AWSTemplateFormatVersion": "2010-09-09",
+        "Parameters": {"Environment": {"Type": "String"}},
+        "Resources": {
+            f"Resource{index}": {
+                "Type": RESOURCE_TYPES[index % len(RESOURCE_TYPES)],
+                "Properties": {
+                    "Name": {"Fn::Sub": f"${{Environment}}-resource-{index}"},
+                    "Tags": [{"Key": "index", "Value": str(index)}, {"Key": "team", "Value": "platform"}],
+                    "Policy": {"Statement": [{"Effect": "Allow", "Action": ["s3:GetObject"], "Resource": "*"}]},
+                },
+            }
+            for index in range(resources)
+        },
+    }
+
+
+def to_yaml(template):
+    return yaml.safe_dump(template, sort_keys=False)
+
+
+def measure(function, source, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(source)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    resources = function(source).ok_value
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, resources
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [1_000, 10_000]
+    adapter = LocalAdapter(client=None)
+    print(f"{'template':<18}{'cfnlint':>12}{'extractor':>12}{'speedup':>9}{'cfnlint peak':>15}{'extractor peak':>16}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            template = synthetic_template(size)
+            for suffix, dump in ((".yaml", to_yaml), (".json", json.dumps)):
+                source = Path(directory) / f"template{size}{suffix}"
+                source.write_text(dump(template))
+
+                full, full_peak, decoded = measure(adapter._get_template_resources_with_cfnlint, source)
+                streamed, streamed_peak, extracted = measure(adapter.get_template_resources, source)
+                assert extracted == decoded
+
+                print(
+                    f"{size:>6} {suffix:<11}{full * 1e3:>9.0f} ms{streamed * 1e3:>9.0f} ms{full / streamed:>8.1f}x"
+                    f"{full_peak / 2**20:>12.1f} MiB{streamed_peak / 2**20:>13.1f} MiB"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -9,3 +9,14 @@ def test(session: Session) -> None:
     """Run Tests."""
     session.install(".")
     session.run("pytest", "-v")
+
+
+@nox.session(tags=["benchmarks"])
+def benchmark(session: Session) -> None:
+    """Run Benchmarks."""
+    session.install(".")
+    session.run("python", "benchmarks/action_index.py")
+    session.run("python", "benchmarks/template_extract.py")
+    session.run("python", "benchmarks/policy_evaluator.py")
+    session.run("python", "benchmarks/reporters.py")
+    session.run("python", "benchmarks/queries.py", *session.posargs)
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import bisect
+import fnmatch
+import re
+from collections.abc import Callable, Iterable, Sequence
+from functools import cache
+
+type QualifiedName = str
+type ActionPattern = str
+
+WILDCARDS = frozenset("*?[")
+
+
+def _literal_prefix(pattern: ActionPattern) -> str:
+    for position, character in enumerate(pattern):
+        if character in WILDCARDS:
+            return pattern[:position]
+    return pattern
+
+
+@cache
+def _compile(pattern: ActionPattern) -> Callable[[str], re.Match[str] | None]:
+    return re.compile(fnmatch.translate(pattern)).match
+
+
+class ActionIndex:
+    """Lookup of qualified action names by exact name or `fnmatch` pattern.
+
+    Literal names are answered from a hash of all names. Patterns are narrowed
+    to the buckets of the service prefixes they can match, then to the range of
+    the bucket's sorted names sharing the pattern's literal prefix, which acts
+    as a prefix trie over the bucket. Only names in that range are tested
+    against the compiled pattern. Matches are returned in insertion order, the
+    same order `fnmatch.filter` over all names would return them.
+
+    Matching with `ignore_case`, as IAM matches actions in policies, uses a
+    second index of the lower cased names, built on first use.
+    """
+
+    def __init__(self, names: Iterable[QualifiedName]):
+        self._folded: tuple[ActionIndex, dict[str, QualifiedName]] | None = None
+        self.ordinals: dict[QualifiedName, int] = {}
+        buckets: dict[str, list[QualifiedName]] = {}
+        for ordinal, name in enumerate(names):
+            self.ordinals[name] = ordinal
+            service_prefix, _, _ = name.partition(":")
+            buckets.setdefault(service_prefix, []).append(name)
+        self.buckets = {service_prefix: sorted(bucket) for service_prefix, bucket in buckets.items()}
+
+    def __len__(self) -> int:
+        return len(self.ordinals)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.ordinals
+
+    def _candidate_buckets(self, prefix: str) -> Iterable[Sequence[QualifiedName]]:
+        service_prefix, separator, _ = prefix.partition(":")
+        if separator:
+            if bucket := self.buckets.get(service_prefix):
+                yield bucket
+            return
+        for name, bucket in self.buckets.items():
+            if name.startswith(service_prefix):
+                yield bucket
+
+    def _fold(self) -> tuple[ActionIndex, dict[str, QualifiedName]]:
+        if self._folded is None:
+            canonical = dict[str, QualifiedName]()
+            for name in self.ordinals:
+                canonical.setdefault(name.lower(), name)
+            self._folded = (ActionIndex(canonical), canonical)
+        return self._folded
+
+    def canonical(self, name: str) -> QualifiedName | None:
+        """The indexed name equal to `name` ignoring case"""
+        return self._fold()[1].get(name.lower())
+
+    def match(self, pattern: ActionPattern, ignore_case: bool = False) -> list[QualifiedName]:
+        if ignore_case:
+            folded, canonical = self._fold()
+            return [canonical[name] for name in folded.match(pattern.lower())]
+
+        prefix = _literal_prefix(pattern)
+        if prefix == pattern:
+            return [pattern] if pattern in self.ordinals else []
+
+        only_trailing_star = pattern == f"{prefix}*"
+        matches = _compile(pattern)
+        found = list[QualifiedName]()
+        for bucket in self._candidate_buckets(prefix):
+            for position in range(bisect.bisect_left(bucket, prefix), len(bucket)):
+                name = bucket[position]
+                if not name.startswith(prefix):
+                    break
+                if only_trailing_star or matches(name):
+                    found.append(name)
+
+        found.sort(key=self.ordinals.__getitem__)
+        return found
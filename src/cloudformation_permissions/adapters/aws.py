@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import threading
+from collections.abc import Callable
+from functools import cached_property
+from typing import TYPE_CHECKING, Any
+
+from .telemetry import ApiCallsProtocol, NoApiCalls, instrument
+
+if TYPE_CHECKING:
+    from botocore.session import Session
+
+
+class LazyClient:
+    """Stands in for a boto3 client, creating it on first attribute access"""
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._client: Any = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return getattr(self._client, name)
+
+
+class AWS:
+    """A botocore session, imported and created on first use, and the clients built from it.
+
+    botocore is used directly because importing boto3 also imports s3transfer,
+    which nearly doubles the cost of the first AWS call of a run.
+
+    The calls of every client are recorded into `api_calls`, which may be
+    replaced between runs sharing the session.
+    """
+
+    def __init__(self, max_pool_connections: int = 10):
+        self.max_pool_connections = max_pool_connections
+        self._session: Session | None = None
+        self._clients = dict[str, LazyClient]()
+        self._lock = threading.Lock()
+        self.api_calls: ApiCallsProtocol = NoApiCalls()
+
+    @property
+    def session(self) -> Session:
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    from botocore.session import Session  # noqa: PLC0415 - botocore is imported on first use
+
+                    self._session = Session()
+        return self._session
+
+    @property
+    def region(self) -> str:
+        if (region := self.session.get_config_variable("region")) is None:
+            from botocore.exceptions import NoRegionError  # noqa: PLC0415 - botocore is imported on first use
+
+            raise NoRegionError()
+        return region
+
+    @cached_property
+    def account(self) -> str | None:
+        """The account of the session's credentials, None when they can't be read"""
+        from botocore.exceptions import BotoCoreError, ClientError  # noqa: PLC0415 - botocore is imported on first use
+
+        try:
+            return self.client("sts").get_caller_identity()["Account"]
+        except (BotoCoreError, ClientError):
+            return None
+
+    @cached_property
+    def partition(self) -> str:
+        return self.session.get_partition_for_region(self.region)
+
+    def _create_client(self, service_name: str) -> Any:
+        from botocore.config import Config  # noqa: PLC0415 - botocore is imported on first use
+
+        config = Config(
+            retries={"mode": "adaptive", "max_attempts": 10},
+            max_pool_connections=self.max_pool_connections,
+        )
+        client = self.session.create_client(service_name, config=config)
+        instrument(client.meta.events, lambda: self.api_calls)
+        return client
+
+    def client(self, service_name: str) -> LazyClient:
+        """The client of `service_name`, one per session"""
+        if service_name not in self._clients:
+            self._clients[service_name] = LazyClient(lambda: self._create_client(service_name))
+        return self._clients[service_name]
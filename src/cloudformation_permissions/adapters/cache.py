@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections.abc import Iterator
+from contextlib import suppress
+from logging import getLogger
+from pathlib import Path
+from typing import Any
+
+from attrs import define, field, frozen
+
+logger = getLogger(__name__)
+
+CACHE_FORMAT_VERSION = 1
+CACHE_DIR_ENV = "CLOUDFORMATION_PERMISSIONS_CACHE_DIR"
+
+
+def default_cache_dir() -> Path:
+    if cache_dir := os.environ.get(CACHE_DIR_ENV):
+        return Path(cache_dir)
+    if xdg_cache_home := os.environ.get("XDG_CACHE_HOME"):
+        return Path(xdg_cache_home) / "cloudformation-permissions"
+    return Path.home() / ".cache" / "cloudformation-permissions"
+
+
+@define
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    evictions: int = 0
+
+
+@frozen
+class CacheEntry:
+    key: str
+    created: float
+    accessed: float
+    size: int
+
+
+@define
+class DiskCache:
+    """JSON documents stored on disk, one file per key.
+
+    Entries older than `ttl` seconds are treated as missing. Reads refresh the
+    file modification time, so when the cache grows beyond `max_bytes` the
+    least recently used entries are evicted first. The cache may be shared by
+    processes, and is best effort: entries that cannot be written are skipped,
+    as are files another process removed first.
+    """
+
+    root: Path
+    namespace: str
+    ttl: float | None = None
+    max_bytes: int | None = None
+    stats: CacheStats = field(factory=CacheStats)
+    _size: int | None = field(default=None, init=False)
+
+    @property
+    def directory(self) -> Path:
+        return self.root / self.namespace / f"v{CACHE_FORMAT_VERSION}"
+
+    def _path(self, key: str) -> Path:
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return self.directory / digest[:2] / f"{digest}.json"
+
+    def get(self, key: str) -> Any | None:
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_bytes())
+        except (OSError, ValueError):
+            self.stats.misses += 1
+            return None
+
+        if entry.get("key") != key or self._expired(entry):
+            self.stats.misses += 1
+            return None
+
+        with suppress(OSError):
+            os.utime(path)
+        self.stats.hits += 1
+        return entry["value"]
+
+    def _write(self, path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as file:
+            temporary = Path(file.name)
+        try:
+            temporary.write_bytes(data)
+            os.replace(temporary, path)
+        except OSError:
+            temporary.unlink(missing_ok=True)
+            raise
+
+    def put(self, key: str, value: Any) -> None:
+        path = self._path(key)
+        data = json.dumps({"key": key, "created": time.time(), "value": value}, separators=(",", ":")).encode()
+
+        previous_size = self._file_size(path)
+        try:
+            self._write(path, data)
+        except OSError as error:
+            logger.warning("Not caching %s in %s: %s", key, self.directory, error)
+            return
+        self.stats.writes += 1
+
+        if self.max_bytes is not None:
+            self._size = (self._size if self._size is not None else self._scan_size()) + len(data) - previous_size
+            if self._size > self.max_bytes:
+                self.evict()
+
+    def _expired(self, entry: dict[str, Any]) -> bool:
+        return self.ttl is not None and time.time() - entry.get("created", 0) > self.ttl
+
+    def _files(self) -> Iterator[Path]:
+        if self.directory.exists():
+            yield from self.directory.glob("*/*.json")
+
+    @staticmethod
+    def _file_size(path: Path) -> int:
+        try:
+            return path.stat().st_size
+        except OSError:
+            return 0
+
+    def _stats(self) -> Iterator[tuple[os.stat_result, Path]]:
+        """The status of each file, skipping those removed since they were listed"""
+        for path in self._files():
+            try:
+                yield path.stat(), path
+            except FileNotFoundError:
+                continue
+
+    def _scan_size(self) -> int:
+        return sum(stat.st_size for stat, _ in self._stats())
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits in `max_bytes`."""
+        files = sorted(self._stats(), key=lambda item: item[0].st_mtime)
+        size = sum(stat.st_size for stat, _ in files)
+        for stat, path in files:
+            if self.max_bytes is None or size <= self.max_bytes:
+                break
+            try:
+                path.unlink(missing_ok=True)
+            except OSError as error:
+                logger.warning("Could not evict %s: %s", path, error)
+                continue
+            size -= stat.st_size
+            self.stats.evictions += 1
+        self._size = size
+
+    def entries(self) -> Iterator[CacheEntry]:
+        """Every readable entry, expired or not"""
+        for path in self._files():
+            try:
+                stat = path.stat()
+                entry = json.loads(path.read_bytes())
+            except (OSError, ValueError):
+                continue
+            yield CacheEntry(key=entry["key"], created=entry["created"], accessed=stat.st_mtime, size=stat.st_size)
+
+    def delete(self, key: str) -> bool:
+        path = self._path(key)
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except OSError:
+            return False
+        if self._size is not None:
+            self._size -= size
+        self.stats.evictions += 1
+        return True
+
+    def clear(self) -> int:
+        removed = 0
+        for path in self._files():
+            path.unlink(missing_ok=True)
+            removed += 1
+        self._size = 0
+        return removed
@@ -4,6 +4,7 @@ from typing import TYPE_CHECKING, Any, Protocol
 
 if TYPE_CHECKING:
     from mypy_boto3_cloudformation.type_defs import (
+        DescribeChangeSetOutputTypeDef,
         DescribeTypeOutputTypeDef,
         GetTemplateOutputTypeDef,
     )
@@ -11,5 +12,6 @@ if TYPE_CHECKING:
 
 class CloudFormationClient(Protocol):
     def describe_type(self, Type: str, TypeName: str) -> DescribeTypeOutputTypeDef: ...
+    def describe_change_set(self, **kwargs: Any) -> DescribeChangeSetOutputTypeDef: ...
     def get_template(self, ChangeSetName: str, TemplateStage: str) -> GetTemplateOutputTypeDef: ...
     def get_paginator(self, operation: str) -> Any: ...
@@ -1,9 +1,15 @@
 from __future__ import annotations
 
-from collections.abc import Iterable
-from typing import TYPE_CHECKING, Literal, Protocol, TypedDict, Unpack
+import hashlib
+import json
+from collections.abc import Iterable, Iterator, Mapping
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from typing import TYPE_CHECKING, Any, Literal, Protocol, TypedDict, Unpack
+from urllib.parse import unquote
 
-from attrs import frozen
+from attrs import field, frozen
+from botocore.exceptions import ClientError
 
 if TYPE_CHECKING:
     from mypy_boto3_iam.type_defs import (
@@ -11,9 +17,20 @@ if TYPE_CHECKING:
         SimulatePrincipalPolicyRequestRequestTypeDef,
     )
 
-from ..domain.model import Action, ActionPermission, Authorized
+from ..domain.model import ARN, Action, ActionPermission, Authorized
+from .rate_limit import RateLimiter
+from .simulation_cache import NoSimulationCache, SimulationCacheProtocol
+from .timings import NoTimings, TimingsProtocol
+
+logger = getLogger(__name__)
+
+# SimulatePrincipalPolicy rejects requests naming too many actions, so actions are simulated in chunks
+MAX_ACTIONS_PER_SIMULATION = 100
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_REQUESTS_PER_SECOND = 5.0
 
 type EvalDecision = Literal["allowed", "implicitDeny", "explicitDeny"]
+type PolicyDocument = Mapping[str, Any]
 
 
 class IAMEvaluationResult(TypedDict):
@@ -21,38 +38,179 @@ class IAMEvaluationResult(TypedDict):
     EvalDecision: EvalDecision
 
 
+class RolePolicies(TypedDict):
+    Policies: list[PolicyDocument]
+    PermissionsBoundary: PolicyDocument | None
+
+
+def authorization(decision: EvalDecision) -> Authorized:
+    match decision:
+        case "allowed":
+            return Authorized.ALLOWED
+        case "implicitDeny" | "explicitDeny":
+            return Authorized.DENIED
+
+
+def role_name(role: str) -> str | None:
+    """Name of the role `role` is the ARN of, None when it is not a role"""
+    arn = ARN.from_str(role)
+    if arn.service != "iam" or not arn.resource.startswith("role/"):
+        return None
+    return arn.resource.rpartition("/")[2]
+
+
+def _policy_document(document: str | PolicyDocument) -> PolicyDocument:
+    # IAM returns URL encoded documents, which botocore decodes unless its handlers are unregistered
+    return json.loads(unquote(document)) if isinstance(document, str) else document
+
+
 class Paginator[P: TypedDict, R](Protocol):
     def paginate(self, **kwargs: Unpack[P]) -> Iterable[R]: ...
 
 
 class IAMClient(Protocol):
     def get_paginator(
-        self, operation: Literal["simulate_principal_policy"]
+        self, operation: Literal["simulate_principal_policy", "list_role_policies", "list_attached_role_policies"]
     ) -> Paginator[
         SimulatePrincipalPolicyRequestRequestTypeDef,
         SimulatePolicyResponseTypeDef,
     ]: ...
+    def get_role(self, RoleName: str) -> dict[str, Any]: ...
+    def get_role_policy(self, RoleName: str, PolicyName: str) -> dict[str, Any]: ...
+    def get_policy(self, PolicyArn: str) -> dict[str, Any]: ...
+    def get_policy_version(self, PolicyArn: str, VersionId: str) -> dict[str, Any]: ...
 
 
 class IAMProtocol(Protocol):
+    @property
+    def needs_principal(self) -> bool:
+        """Whether decisions depend on the role simulated, rather than only on policies given up front"""
+        return True
+
     def simulate(self, role: str, actions: Iterable[str]) -> Iterable[ActionPermission]: ...
 
 
 @frozen
 class IAM(IAMProtocol):
-    client: IAMClient
+    """Simulates the policies of a principal with SimulatePrincipalPolicy.
+
+    Each distinct action is simulated once. Actions are split into chunks of
+    `chunk_size`, simulated on up to `max_workers` threads, with every request
+    waiting on the shared `rate_limiter`. Results are yielded in the order
+    actions were first given.
+
+    Decisions for roles are kept in `simulation_cache` under a fingerprint of
+    the role's policies, so only actions that are new, or whose role's
+    policies changed, are simulated again.
+    """
 
-    def simulate(self, role: str, actions: Iterable[str]) -> Iterable[ActionPermission]:
+    client: IAMClient
+    rate_limiter: RateLimiter = field(
+        factory=lambda: RateLimiter(rate=DEFAULT_REQUESTS_PER_SECOND, burst=int(DEFAULT_REQUESTS_PER_SECOND))
+    )
+    max_workers: int = DEFAULT_MAX_WORKERS
+    chunk_size: int = MAX_ACTIONS_PER_SIMULATION
+    simulation_cache: SimulationCacheProtocol = field(factory=NoSimulationCache)
+    timings: TimingsProtocol = field(factory=NoTimings)
+
+    def _call(self, operation: str, **kwargs: Any) -> dict[str, Any]:
+        self.rate_limiter.acquire()
+        return getattr(self.client, operation)(**kwargs)
+
+    def _pages(self, operation: str, **kwargs: Any) -> Iterator[dict[str, Any]]:
+        return self.rate_limiter.paginate(self.client.get_paginator(operation), **kwargs)
+
+    def _policy_version(self, policy_arn: str) -> str:
+        return self._call("get_policy", PolicyArn=policy_arn)["Policy"]["DefaultVersionId"]
+
+    def policy_fingerprint(self, role: str) -> str | None:
+        """Digest of the role's permissions boundary, attached policy versions and inline policy documents.
+
+        None when `role` is not a role or its policies cannot be read.
+        """
+        if (name := role_name(role)) is None:
+            return None
+        try:
+            described_role = self._call("get_role", RoleName=name)["Role"]
+            boundary = described_role.get("PermissionsBoundary", {}).get("PermissionsBoundaryArn")
+            policies = {
+                "PermissionsBoundary": boundary and {boundary: self._policy_version(boundary)},
+                "AttachedPolicies": {
+                    policy["PolicyArn"]: self._policy_version(policy["PolicyArn"])
+                    for page in self._pages("list_attached_role_policies", RoleName=name)
+                    for policy in page["AttachedPolicies"]
+                },
+                "InlinePolicies": {
+                    policy: self._call("get_role_policy", RoleName=name, PolicyName=policy)["PolicyDocument"]
+                    for page in self._pages("list_role_policies", RoleName=name)
+                    for policy in page["PolicyNames"]
+                },
+            }
+        except ClientError as error:
+            logger.debug("Not caching simulations for %s, its policies could not be read: %s", role, error)
+            return None
+        return hashlib.sha256(json.dumps(policies, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _managed_policy(self, policy_arn: str) -> PolicyDocument:
+        version = self._policy_version(policy_arn)
+        response = self._call("get_policy_version", PolicyArn=policy_arn, VersionId=version)
+        return _policy_document(response["PolicyVersion"]["Document"])
+
+    def role_policies(self, name: str) -> RolePolicies:
+        """Documents of the attached and inline policies, and permissions boundary, of the role called `name`"""
+        described_role = self._call("get_role", RoleName=name)["Role"]
+        boundary = described_role.get("PermissionsBoundary", {}).get("PermissionsBoundaryArn")
+        attached = [
+            self._managed_policy(policy["PolicyArn"])
+            for page in self._pages("list_attached_role_policies", RoleName=name)
+            for policy in page["AttachedPolicies"]
+        ]
+        inline = [
+            _policy_document(self._call("get_role_policy", RoleName=name, PolicyName=policy)["PolicyDocument"])
+            for page in self._pages("list_role_policies", RoleName=name)
+            for policy in page["PolicyNames"]
+        ]
+        return RolePolicies(
+            Policies=attached + inline,
+            PermissionsBoundary=self._managed_policy(boundary) if boundary else None,
+        )
+
+    def _simulate_chunk(self, role: str, actions: list[str]) -> list[ActionPermission]:
         paginator = self.client.get_paginator("simulate_principal_policy")
-        for page in paginator.paginate(PolicySourceArn=role, ActionNames=list(actions)):
+        permissions = list[ActionPermission]()
+        for page in self.rate_limiter.paginate(paginator, PolicySourceArn=role, ActionNames=actions):
             for result in page["EvaluationResults"]:
                 evaluation_result = IAMEvaluationResult(result)
                 action = Action(evaluation_result["EvalActionName"])
-
-                match evaluation_result["EvalDecision"]:
-                    case "allowed":
-                        permission = Authorized.ALLOWED
-                    case "implicitDeny" | "explicitDeny":
-                        permission = Authorized.DENIED
-
-                yield ActionPermission(action=action, authorization=permission)
+                permission = authorization(evaluation_result["EvalDecision"])
+                permissions.append(ActionPermission(action=action, authorization=permission))
+        return permissions
+
+    def _simulate(self, role: str, actions: list[str]) -> Iterator[ActionPermission]:
+        chunks = [actions[start : start + self.chunk_size] for start in range(0, len(actions), self.chunk_size)]
+        if self.max_workers <= 1 or len(chunks) <= 1:
+            for chunk in chunks:
+                yield from self._simulate_chunk(role, chunk)
+            return
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as executor:
+            for permissions in executor.map(lambda chunk: self._simulate_chunk(role, chunk), chunks):
+                yield from permissions
+
+    def simulate(self, role: str, actions: Iterable[str]) -> Iterator[ActionPermission]:
+        distinct = list(dict.fromkeys(actions))
+        if not self.simulation_cache.enabled or (fingerprint := self.policy_fingerprint(role)) is None:
+            yield from self._simulate(role, distinct)
+            return
+
+        cached = self.simulation_cache.get(role, fingerprint, distinct)
+        missing = [action for action in distinct if action not in cached]
+        simulated = {permission.action: permission.authorization for permission in self._simulate(role, missing)}
+        if simulated:
+            self.simulation_cache.put(role, fingerprint, simulated)
+        logger.info("Simulation cache: %d hits, %d misses for %s", len(cached), len(missing), role)
+        self.timings.cache("simulations", hits=len(cached), misses=len(missing))
+
+        for action in distinct:
+            authorization = cached.get(action) or simulated.get(action, Authorized.UNKNOWN)
+            yield ActionPermission(action=Action(action), authorization=authorization)
@@ -1,17 +1,25 @@
 from __future__ import annotations
 
 import json
+import threading
+import time
 from collections.abc import Callable, Iterable
-from typing import TYPE_CHECKING, Literal, Protocol, TypedDict, assert_never
+from collections.abc import Set as AbstractSet
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Literal, Protocol, TypedDict
 
-from attrs import define
+from attrs import define, field
 from botocore.exceptions import ClientError
-from cloudformation_permissions.adapters.sar import ServiceAuthorizationReference, ServiceAuthorizationReferenceProcotol
-from result import Err, Ok, Result, as_result
+from result import Err, Ok, Result, as_result, is_ok
 
+from cloudformation_permissions.adapters.sar import ServiceAuthorizationReferenceProcotol
 from cloudformation_permissions.domain.model import PermissionsLevels
+from cloudformation_permissions.domain.permissions import ActionIds, PermissionSet
 
 from ..cloudformation import CloudFormationClient
+from ..timings import NoTimings, TimingsProtocol
+from .permission_table import PUBLIC_TYPE_PREFIX, NoPermissionTable, PermissionTableProtocol
+from .schema_cache import CachedSchema, SchemaCacheProtocol, type_version_arn
 
 if TYPE_CHECKING:
     from mypy_boto3_cloudformation.type_defs import DescribeTypeOutputTypeDef
@@ -32,11 +40,36 @@ class HandlerTypes(TypedDict):
     list: Handler
 
 
+DEFAULT_MAX_WORKERS = 8
+
 PermissionsLevelHandlerMap = {
     PermissionsLevels.READ: {"read", "list"},
     PermissionsLevels.MODIFY: {"read", "list", "update", "create"},
     PermissionsLevels.FULL: {"read", "list", "update", "create", "delete"},
+    PermissionsLevels.CREATE: {"create"},
+    PermissionsLevels.UPDATE: {"update"},
+    PermissionsLevels.DELETE: {"delete"},
+    # replacing a resource may update it in place, or create another and delete the original
+    PermissionsLevels.REPLACE: {"update", "create", "delete"},
 }
+HANDLER_TYPES = ("create", "read", "update", "delete", "list")
+HANDLERS_SEPARATOR = ","
+
+
+def handlers_permission_level(handler_types: Iterable[str]) -> str:
+    """The permission level of exactly `handler_types`, eg `create,update`"""
+    handler_types = set(handler_types)
+    return HANDLERS_SEPARATOR.join(handler for handler in HANDLER_TYPES if handler in handler_types)
+
+
+def level_handler_types(permission_level: str) -> frozenset[str]:
+    """The handlers of `permission_level`, either a `PermissionsLevels` or handlers joined with commas"""
+    if permission_level in PermissionsLevels:
+        return frozenset(PermissionsLevelHandlerMap[PermissionsLevels(permission_level)])
+    handler_types = frozenset(permission_level.split(HANDLERS_SEPARATOR))
+    if not handler_types <= set(HANDLER_TYPES):
+        raise ValueError(f"{permission_level!r} is neither a permission level nor a list of handlers")
+    return handler_types
 
 
 class ResourceProviderSchema(TypedDict):
@@ -47,7 +80,9 @@ class ResourceProviderSchema(TypedDict):
 class ResourceInformationResolverProtocol(Protocol):
     client: CloudFormationClient
 
-    def resolve(self, resource_type: str, permission_level: str) -> Result[frozenset[Permission], LookupError]: ...
+    def resolve(self, resource_type: str, permission_level: str) -> Result[AbstractSet[Permission], LookupError]: ...
+
+    def prefetch(self, resource_types: Iterable[str]) -> None: ...
 
 
 class DefaultDictKey[K, V](dict[K, V]):
@@ -67,8 +102,23 @@ class DefaultDictKey[K, V](dict[K, V]):
 
 @define
 class ResourceInformationResolver(ResourceInformationResolverProtocol):
+    """Resolves the permissions of resource types from their provider schemas.
+
+    Types in `permission_table` are answered from it, see `permission_table`,
+    every other type is described with `DescribeType`, through `schema_cache`.
+    Types registered in the account are cached by their default version, which
+    is listed once per kind of type with `ListTypes`.
+    The permissions of each handler of a type are filtered through the
+    reference once into a `PermissionSet` of the resolver's `action_ids`, then
+    every level asking for that handler is a union of those bitsets.
+    """
+
     client: CloudFormationClient
     reference: ServiceAuthorizationReferenceProcotol
+    schema_cache: SchemaCacheProtocol
+    max_workers: int = DEFAULT_MAX_WORKERS
+    permission_table: PermissionTableProtocol = field(factory=NoPermissionTable)
+    timings: TimingsProtocol = field(factory=NoTimings)
 
     @staticmethod
     def _is_module(resource_type_name: str):
@@ -76,9 +126,13 @@ class ResourceInformationResolver(ResourceInformationResolverProtocol):
 
     def __attrs_post_init__(self):
         self.resource_schemas = DefaultDictKey[str, Result[ResourceProviderSchema, str]](self._resolve_resource_schema)
+        self.action_ids = ActionIds()
+        self.handler_permission_sets = dict[tuple[str, str], Result[PermissionSet, LookupError]]()
+        self.type_versions = dict[str, dict[str, str]]()
+        self._type_versions_lock = threading.Lock()
 
     def _load_module_schema(
-        self, resource_type: DescribeTypeOutputTypeDef
+        self, resource_type: DescribeTypeOutputTypeDef | CachedSchema
     ) -> Result[ResourceProviderSchema, json.JSONDecodeError]:
         schema = resource_type["Schema"]
         result: Result[ResourceProviderSchema, json.JSONDecodeError] = as_result(json.JSONDecodeError)(json.loads)(
@@ -91,40 +145,105 @@ class ResourceInformationResolver(ResourceInformationResolverProtocol):
     ) -> Result[DescribeTypeOutputTypeDef, ClientError]:
         return as_result(ClientError)(self.client.describe_type)(Type=resource_type, TypeName=resource_type_name)
 
+    def _list_type_versions(self, resource_type: Literal["RESOURCE", "MODULE"]) -> dict[str, str]:
+        pages = self.client.get_paginator("list_types").paginate(
+            Visibility="PRIVATE", Type=resource_type, DeprecatedStatus="LIVE"
+        )
+        return {
+            summary["TypeName"]: version_arn
+            for page in pages
+            for summary in page["TypeSummaries"]
+            if (version_arn := type_version_arn(summary.get("TypeArn"), summary))
+        }
+
+    def _default_version_arn(self, resource_type_name: str, resource_type: Literal["RESOURCE", "MODULE"]) -> str | None:
+        """The default version of a type registered in the account, None for public types or when it can't be listed"""
+        if resource_type_name.startswith(PUBLIC_TYPE_PREFIX):
+            return None
+        with self._type_versions_lock:
+            if resource_type not in self.type_versions:
+                listed = as_result(ClientError)(self._list_type_versions)(resource_type)
+                self.type_versions[resource_type] = listed.unwrap_or({})
+        return self.type_versions[resource_type].get(resource_type_name)
+
     def _resolve_resource_schema(self, resource_type_name: str) -> Result[ResourceProviderSchema, str]:
+        start = time.perf_counter()
         resource_type = "RESOURCE" if not self._is_module(resource_type_name) else "MODULE"
-        return (
-            self._describe_type(resource_type=resource_type, resource_type_name=resource_type_name)
-            .and_then(self._load_module_schema)
-            .map_err(str)
+        version_arn = self._default_version_arn(resource_type_name, resource_type)
+        if (cached := self.schema_cache.get(resource_type_name, version_arn)) is not None:
+            self.timings.cache("schemas", hits=1)
+            self.timings.resource_type(resource_type_name, seconds=time.perf_counter() - start, source="cache")
+            return self._load_module_schema(cached).map_err(str)
+
+        self.timings.cache("schemas", misses=1)
+        described_type_result = self._describe_type(resource_type=resource_type, resource_type_name=resource_type_name)
+        schema_result = described_type_result.and_then(self._load_module_schema).map_err(str)
+        if is_ok(schema_result):
+            self.schema_cache.put(resource_type_name, described_type_result.ok_value)
+        self.timings.resource_type(resource_type_name, seconds=time.perf_counter() - start, source="DescribeType")
+        return schema_result
+
+    def prefetch(self, resource_types: Iterable[str]) -> None:
+        """Resolve the schemas of all distinct `resource_types` up front, up to `max_workers` at a time"""
+        missing = sorted(
+            {name for name in resource_types if name not in self.resource_schemas and name not in self.permission_table}
         )
+        if self.max_workers <= 1 or len(missing) <= 1:
+            for resource_type_name in missing:
+                self.resource_schemas[resource_type_name]
+            return
 
-    def _get_permissions_for_operation(self, handler: Handler) -> Result[Iterable[Permission], LookupError]:
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as executor:
+            schemas = executor.map(self._resolve_resource_schema, missing)
+            for resource_type_name, schema in zip(missing, schemas, strict=True):
+                self.resource_schemas[resource_type_name] = schema
+
+    def _get_permissions_for_operation(self, handler: Handler) -> Result[PermissionSet, LookupError]:
         if not (permissions := handler.get("permissions")):
             return Err(LookupError("Permissions Unavailable"))
 
         # filter out permissons that do not exist in the reference
         # some handlers have invalid or outdated permissions
         valid_permissions = [p for p in permissions if self.reference.list_actions_by_pattern(p)]
-        return Ok(valid_permissions)
-
-    def resolve(self, resource_type: str, permission_level: str) -> Result[frozenset[Permission], LookupError]:
-        schema_result = self.resource_schemas[resource_type]
-        match schema_result:
-            case Ok(schema):
-                if not (handlers := schema.get("handlers")):
-                    return Err(LookupError(f"Handler Information Not Found {resource_type}"))
-
-                permissions = set[Permission]()
-                permission_level = PermissionsLevels(permission_level)
-                handlers_for_permission_level = PermissionsLevelHandlerMap.get(permission_level, [])
-                for handler_type, handler in handlers.items():
-                    if handler_type in handlers_for_permission_level:
-                        self._get_permissions_for_operation(handler).and_then(permissions.update)
-                return Ok(frozenset(permissions))
-
+        return Ok(PermissionSet.of(self.action_ids, valid_permissions))
+
+    def _type_error(self, resource_type: str) -> LookupError | None:
+        """Why none of the handlers of `resource_type` can be resolved, None when they can"""
+        if resource_type in self.permission_table:
+            return self.permission_table.handlers(resource_type).err()
+        match self.resource_schemas[resource_type]:
+            case Ok(schema) if not schema.get("handlers"):
+                return LookupError(f"Handler Information Not Found {resource_type}")
             case Err():
-                return Err(LookupError(f"Schema Not Found {resource_type}"))
-
-            case _:
-                assert_never(schema_result)
+                return LookupError(f"Schema Not Found {resource_type}")
+        return None
+
+    def _resolve_handler(self, resource_type: str, handler_type: str) -> Result[PermissionSet, LookupError]:
+        if (error := self._type_error(resource_type)) is not None:
+            return Err(error)
+        if resource_type in self.permission_table:
+            self.timings.resource_type(resource_type, source="permission table")
+            # the table only records handlers listing permissions, already filtered
+            handlers = self.permission_table.handlers(resource_type).ok_value
+            if handler_type not in handlers:
+                return Err(LookupError("Permissions Unavailable"))
+            return Ok(PermissionSet.of(self.action_ids, handlers[handler_type]))
+        handlers = self.resource_schemas[resource_type].ok_value["handlers"]
+        return self._get_permissions_for_operation(handlers.get(handler_type, {}))
+
+    def handler_permissions(self, resource_type: str, handler_type: str) -> Result[PermissionSet, LookupError]:
+        """The permissions of one handler of `resource_type`, filtered once and remembered"""
+        key = (resource_type, handler_type)
+        if (permissions := self.handler_permission_sets.get(key)) is None:
+            permissions = self.handler_permission_sets[key] = self._resolve_handler(resource_type, handler_type)
+        return permissions
+
+    def resolve(self, resource_type: str, permission_level: str) -> Result[PermissionSet, LookupError]:
+        """The union of the permissions of the handlers of `permission_level`, see `level_handler_types`"""
+        handler_types = level_handler_types(permission_level)
+        if (error := self._type_error(resource_type)) is not None:
+            return Err(error)
+
+        # handlers a type does not have, or that list no permissions, need none
+        resolved = (self.handler_permissions(resource_type, handler_type) for handler_type in handler_types)
+        return Ok(PermissionSet.union_of(self.action_ids, (result.ok_value for result in resolved if is_ok(result))))
@@ -0,0 +1,228 @@
+"""Precomputed permissions of the public resource types CloudFormation publishes.
+
+CloudFormation publishes the provider schemas of every public `AWS::` type of
+a region in one zip. Building a table from it, or from a directory of
+schemas, records for each type and handler the permissions that
+`ResourceInformationResolver` would have kept: those matching an action of
+the Service Authorization Reference. The table is a compact JSON file laid
+out as
+
+    format_version         FORMAT_VERSION
+    partition, region      where the schemas were published
+    reference              size, mtime and sha256 of the reference the permissions were filtered with
+    actions                every distinct permission, once
+    types                  per type, the permissions of each handler as positions in `actions`,
+                           or null for a type whose schema has no handlers
+
+A table filtered with a different reference than the one on disk, or built
+for another partition or region than types are described in, is stale and not
+used, nor are types outside the table, such as private types and modules,
+which are still described with `DescribeType`.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import os
+import threading
+import urllib.request
+import zipfile
+from collections.abc import Iterable, Iterator, Mapping
+from logging import getLogger
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Protocol, TypedDict
+
+from attrs import define, field, frozen
+from result import Err, Ok, Result
+
+from ..sar import ServiceAuthorizationReferenceProcotol
+from ..sar_snapshot import sha256_digest, source_fingerprint
+
+if TYPE_CHECKING:
+    from .schema_cache import SchemaLocationProtocol
+
+logger = getLogger(__name__)
+
+PERMISSION_TABLE = "permissions.table"
+FORMAT_VERSION = 2
+SCHEMA_ZIP_URL = "https://schema.cloudformation.{region}.amazonaws.com/CloudformationSchema.zip"
+PUBLIC_TYPE_PREFIX = "AWS::"
+
+
+class ReferenceFingerprint(TypedDict):
+    size: int
+    mtime_ns: int
+    sha256: str
+
+
+class PermissionTableFile(TypedDict):
+    format_version: int
+    partition: str
+    region: str
+    reference: ReferenceFingerprint
+    actions: list[str]
+    types: dict[str, dict[str, list[int]] | None]
+
+
+class PermissionTableProtocol(Protocol):
+    def __contains__(self, resource_type: object) -> bool: ...
+
+    def handlers(self, resource_type: str) -> Result[Mapping[str, list[str]], LookupError]: ...
+
+
+@frozen
+class NoPermissionTable(PermissionTableProtocol):
+    def __contains__(self, resource_type: object) -> bool:
+        return False
+
+    def handlers(self, resource_type: str) -> Result[Mapping[str, list[str]], LookupError]:
+        return Err(LookupError(f"Schema Not Found {resource_type}"))
+
+
+def download_schemas(region: str) -> bytes:
+    """The zip of every public resource provider schema of `region`"""
+    with urllib.request.urlopen(SCHEMA_ZIP_URL.format(region=region), timeout=60) as response:  # noqa: S310
+        return response.read()
+
+
+def read_schemas(source: Path | bytes) -> Iterator[dict[str, Any]]:
+    """The schemas of a directory of JSON files, or of a zip of them"""
+    if isinstance(source, Path) and source.is_dir():
+        documents = ((str(path), path.read_bytes()) for path in sorted(source.rglob("*.json")))
+    else:
+        archive = zipfile.ZipFile(io.BytesIO(source) if isinstance(source, bytes) else source)
+        names = sorted(name for name in archive.namelist() if name.endswith(".json"))
+        documents = ((name, archive.read(name)) for name in names)
+
+    for name, document in documents:
+        try:
+            schema = json.loads(document)
+        except ValueError as error:
+            logger.warning("Skipping %s, it is not JSON: %s", name, error)
+            continue
+        if isinstance(schema, dict) and "typeName" in schema:
+            yield schema
+
+
+def _reference_fingerprint(source: Path) -> ReferenceFingerprint:
+    size, mtime_ns = source_fingerprint(source)
+    return ReferenceFingerprint(size=size, mtime_ns=mtime_ns, sha256=sha256_digest(source).hex())
+
+
+def build_permission_table(
+    schemas: Iterable[Mapping[str, Any]],
+    reference: ServiceAuthorizationReferenceProcotol,
+    reference_source: Path,
+    destination: Path,
+    location: SchemaLocationProtocol,
+) -> int:
+    """Record the permissions of the public types in `schemas` at `destination`, returning the number of types.
+
+    `location` is the partition and region the schemas were published in.
+    """
+    positions = dict[str, int]()
+    types = dict[str, dict[str, list[int]] | None]()
+    for schema in schemas:
+        type_name = schema["typeName"]
+        if not type_name.startswith(PUBLIC_TYPE_PREFIX) or type_name.endswith("MODULE"):
+            continue
+        if not (handlers := schema.get("handlers")):
+            types[type_name] = None
+            continue
+        types[type_name] = {
+            handler_type: [
+                positions.setdefault(permission, len(positions))
+                for permission in permissions
+                if reference.list_actions_by_pattern(permission)
+            ]
+            # as when resolving, handlers without permissions are skipped
+            for handler_type, handler in handlers.items()
+            if (permissions := handler.get("permissions"))
+        }
+
+    table = PermissionTableFile(
+        format_version=FORMAT_VERSION,
+        partition=location.partition,
+        region=location.region,
+        reference=_reference_fingerprint(reference_source),
+        actions=list(positions),
+        types=types,
+    )
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    temporary = destination.with_suffix(f"{destination.suffix}.tmp")
+    temporary.write_text(json.dumps(table, separators=(",", ":")))
+    os.replace(temporary, destination)
+    return len(types)
+
+
+def is_stale(table: PermissionTableFile, reference_source: Path, location: SchemaLocationProtocol) -> bool:
+    """Whether the table was built for another partition or region than `location`, or its permissions were
+    filtered with a different reference than `reference_source`"""
+    if table.get("format_version") != FORMAT_VERSION:
+        return True
+    if (table["partition"], table["region"]) != (location.partition, location.region):
+        return True
+    if not reference_source.exists():
+        return False
+    fingerprint = table["reference"]
+    if source_fingerprint(reference_source) == (fingerprint["size"], fingerprint["mtime_ns"]):
+        return False
+    return sha256_digest(reference_source).hex() != fingerprint["sha256"]
+
+
+@define
+class DiskPermissionTable(PermissionTableProtocol):
+    """The permission table at `path`, read when it is first consulted.
+
+    A missing or stale table holds no types, so every type is resolved with
+    `DescribeType` as before. `location` is only read once the table is.
+    """
+
+    path: Path
+    reference_source: Path
+    location: SchemaLocationProtocol
+    _table: PermissionTableFile | None = field(init=False, default=None)
+    _handlers: dict[str, dict[str, list[str]]] = field(init=False, factory=dict)
+    _lock: threading.Lock = field(init=False, factory=threading.Lock)
+
+    def _load(self) -> PermissionTableFile:
+        if self._table is None:
+            with self._lock:
+                if self._table is None:
+                    self._table = self._read()
+        return self._table
+
+    def _read(self) -> PermissionTableFile:
+        empty = PermissionTableFile(
+            format_version=FORMAT_VERSION, partition="", region="", reference={}, actions=[], types={}
+        )
+        try:
+            table: PermissionTableFile = json.loads(self.path.read_bytes())
+        except FileNotFoundError:
+            return empty
+        except (OSError, ValueError) as error:
+            logger.warning("Not using the permission table %s, it cannot be read: %s", self.path, error)
+            return empty
+        if is_stale(table, self.reference_source, self.location):
+            logger.info("Not using the permission table %s, it was built for another reference or region", self.path)
+            return empty
+        return table
+
+    def __contains__(self, resource_type: object) -> bool:
+        return resource_type in self._load()["types"]
+
+    def handlers(self, resource_type: str) -> Result[Mapping[str, list[str]], LookupError]:
+        """The permissions of each handler of `resource_type` that lists any"""
+        table = self._load()
+        if resource_type not in table["types"]:
+            return Err(LookupError(f"Schema Not Found {resource_type}"))
+        if (handlers := table["types"][resource_type]) is None:
+            return Err(LookupError(f"Handler Information Not Found {resource_type}"))
+        if (named := self._handlers.get(resource_type)) is None:
+            actions = table["actions"]
+            named = self._handlers[resource_type] = {
+                handler_type: [actions[position] for position in positions]
+                for handler_type, positions in handlers.items()
+            }
+        return Ok(named)
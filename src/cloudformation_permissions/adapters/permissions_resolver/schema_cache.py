@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Protocol, TypedDict
+
+from attrs import frozen
+
+from ..cache import DiskCache
+from .permission_table import PUBLIC_TYPE_PREFIX
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+
+    from mypy_boto3_cloudformation.type_defs import DescribeTypeOutputTypeDef
+
+SCHEMA_CACHE_NAMESPACE = "schemas"
+SCHEMA_CACHE_TTL = 7 * 24 * 60 * 60
+SCHEMA_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+class CachedSchema(TypedDict):
+    TypeVersionArn: str | None
+    Schema: str
+
+
+class SchemaCacheProtocol(Protocol):
+    def get(self, resource_type_name: str, version_arn: str | None = None) -> CachedSchema | None: ...
+    def put(self, resource_type_name: str, described_type: DescribeTypeOutputTypeDef) -> None: ...
+
+
+class SchemaLocationProtocol(Protocol):
+    """Where types are described, eg an `AWS` session, only read once a schema is looked up"""
+
+    @property
+    def partition(self) -> str: ...
+    @property
+    def region(self) -> str: ...
+    @property
+    def account(self) -> str | None: ...
+
+
+@frozen
+class SchemaLocation(SchemaLocationProtocol):
+    partition: str
+    region: str
+    account: str | None = None
+
+
+def type_version_arn(arn: str | None, type_: Mapping[str, Any]) -> str | None:
+    """The version of `arn` that `type_`, a described type or a `ListTypes` summary, is the default of"""
+    if not arn:
+        return None
+    if version_id := type_.get("DefaultVersionId") or type_.get("PublicVersionNumber"):
+        return f"{arn}/{version_id}"
+    return arn
+
+
+@frozen
+class NoSchemaCache(SchemaCacheProtocol):
+    def get(self, resource_type_name: str, version_arn: str | None = None) -> CachedSchema | None:
+        return None
+
+    def put(self, resource_type_name: str, described_type: DescribeTypeOutputTypeDef) -> None:
+        return None
+
+
+@frozen
+class DiskSchemaCache(SchemaCacheProtocol):
+    """Resource provider schemas cached on disk per partition, region and type of `location`.
+
+    Private types, modules and activated third party types are registered in
+    an account, so they are also cached per account and per `version_arn`,
+    the current default version of the type. They are not cached at all when
+    the account is unknown, and a lookup without a `version_arn` misses, so
+    publishing a new default version is never answered from a stale entry.
+    With `refresh` set every lookup misses, forcing a `describe_type` whose
+    result replaces the entry.
+    """
+
+    cache: DiskCache
+    location: SchemaLocationProtocol
+    refresh: bool = False
+
+    def _key(self, resource_type_name: str, version_arn: str | None) -> str | None:
+        location = self.location
+        if resource_type_name.startswith(PUBLIC_TYPE_PREFIX):
+            return f"{location.partition}/{location.region}/{resource_type_name}"
+        if (account := location.account) is None or version_arn is None:
+            return None
+        return f"{location.partition}/{location.region}/{account}/{resource_type_name}/{version_arn}"
+
+    def get(self, resource_type_name: str, version_arn: str | None = None) -> CachedSchema | None:
+        if self.refresh or (key := self._key(resource_type_name, version_arn)) is None:
+            return None
+        return self.cache.get(key)
+
+    def put(self, resource_type_name: str, described_type: DescribeTypeOutputTypeDef) -> None:
+        version_arn = type_version_arn(described_type.get("Arn"), described_type)
+        if (key := self._key(resource_type_name, version_arn)) is None:
+            return
+        self.cache.put(key, CachedSchema(TypeVersionArn=version_arn, Schema=described_type["Schema"]))
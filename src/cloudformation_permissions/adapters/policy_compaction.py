@@ -0,0 +1,177 @@
+"""Compacts lists of actions into as few, as small, identity policies as possible.
+
+Actions are grouped into one statement per service. Within a service, runs of
+actions sharing a prefix are replaced by a `service:Prefix*` wildcard, but
+only when every action of the Service Authorization Reference the wildcard
+matches is one that is required, already granted by a wildcard that was
+required, or of one of the chosen access levels. Wildcards are only used when
+they replace at least two actions. Actions and patterns missing from the
+reference are kept as they are.
+
+Statements are then packed, largest first, into the fewest policies whose
+size stays under the managed policy limit, splitting the statements of
+services that do not fit in a policy of their own.
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+from collections.abc import Iterable, Mapping
+from typing import Any
+
+from attrs import field, frozen
+
+from .sar import AccessLevel, ServiceAuthorizationReferenceProcotol
+
+# IAM counts policy characters without whitespace against these limits
+MANAGED_POLICY_MAX_SIZE = 6144
+POLICY_VERSION = "2012-10-17"
+WILDCARDS = frozenset("*?")
+# sorts after every character of an action name
+_LAST = "\U0010ffff"
+
+type PolicyDocument = dict[str, Any]
+type Statement = dict[str, Any]
+
+
+def policy_size(document: Mapping[str, Any]) -> int:
+    """Characters of `document` counted against the IAM policy size limits"""
+    return len(json.dumps(document, separators=(",", ":")))
+
+
+def _literal_prefix(pattern: str) -> str:
+    for position, character in enumerate(pattern):
+        if character in WILDCARDS:
+            return pattern[:position]
+    return pattern
+
+
+def _statement(actions: list[str]) -> Statement:
+    return {"Effect": "Allow", "Action": actions, "Resource": "*"}
+
+
+def _policy(statements: list[Statement]) -> PolicyDocument:
+    return {"Version": POLICY_VERSION, "Statement": statements}
+
+
+@frozen
+class _ServiceActions:
+    """Lower cased, sorted names of one service's actions, with running counts to size any prefix range"""
+
+    names: list[str]
+    # counts of the actions before each position that may not be granted, and that are required
+    forbidden: list[int]
+    required: list[int]
+
+    @classmethod
+    def build(cls, names: Iterable[str], allowed: set[str], required: set[str]) -> _ServiceActions:
+        names = sorted(names)
+        forbidden, needed = [0], [0]
+        for name in names:
+            forbidden.append(forbidden[-1] + (name not in allowed))
+            needed.append(needed[-1] + (name in required))
+        return cls(names=names, forbidden=forbidden, required=needed)
+
+    def wildcard(self, name: str) -> str | None:
+        """The shortest prefix of `name` whose wildcard only matches allowed actions and replaces several"""
+        service, _, action = name.partition(":")
+        for length in range(len(action)):
+            prefix = f"{service}:{action[:length]}"
+            start = bisect.bisect_left(self.names, prefix)
+            end = bisect.bisect_left(self.names, prefix + _LAST)
+            if self.forbidden[end] == self.forbidden[start] and self.required[end] - self.required[start] > 1:
+                return prefix
+        return None
+
+
+@frozen
+class PolicyCompactor:
+    """Compacts actions into identity policies, see the module documentation.
+
+    With `access_levels`, wildcards may also grant actions of those levels
+    that were not required, eg `("List", "Read")`.
+    """
+
+    reference: ServiceAuthorizationReferenceProcotol
+    access_levels: frozenset[AccessLevel] = field(default=frozenset(), converter=frozenset)
+    max_policy_size: int = MANAGED_POLICY_MAX_SIZE
+
+    def _extra_allowed(self, names: Iterable[str]) -> set[str]:
+        if not self.access_levels:
+            return set()
+        return {name.lower() for name in names if self.reference.actions[name]["accessLevel"] in self.access_levels}
+
+    def compact_actions(self, actions: Iterable[str]) -> dict[str, list[str]]:
+        """The actions and wildcards granting `actions`, by service"""
+        index = self.reference.action_index
+        kept = dict[str, set[str]]()
+        required = dict[str, dict[str, str]]()
+        granted = set[str]()
+        for action in actions:
+            service = action.partition(":")[0].lower()
+            if not WILDCARDS.isdisjoint(action):
+                kept.setdefault(service, set()).add(action)
+                granted.update(name.lower() for name in index.match(action, ignore_case=True))
+            elif (name := index.canonical(action)) is not None:
+                required.setdefault(name.partition(":")[0], {})[name.lower()] = name
+            else:
+                kept.setdefault(service, set()).add(action)
+
+        compacted = {service: set(patterns) for service, patterns in kept.items()}
+        for service, names in required.items():
+            bucket = index.buckets[service]
+            allowed = set(names) | granted | self._extra_allowed(bucket)
+            service_actions = _ServiceActions.build((name.lower() for name in bucket), allowed, set(names))
+            patterns = compacted.setdefault(service.lower(), set())
+            prefixes = set[str]()
+            for lower, name in names.items():
+                if lower in granted:
+                    continue
+                if (prefix := service_actions.wildcard(lower)) is None:
+                    patterns.add(name)
+                else:
+                    prefixes.add(prefix)
+                    # keep the reference's spelling of the prefix
+                    patterns.add(f"{name[: len(prefix)]}*")
+            # required patterns are redundant once a wildcard matches everything they match
+            patterns.difference_update(
+                pattern
+                for pattern in kept.get(service.lower(), ())
+                if any(_literal_prefix(pattern).lower().startswith(prefix) for prefix in prefixes)
+            )
+        return {service: sorted(compacted[service]) for service in sorted(compacted)}
+
+    def _statements(self, compacted: Mapping[str, list[str]]) -> list[Statement]:
+        """One statement per service, split into several when a service's statement would not fit in a policy"""
+        budget = self.max_policy_size - policy_size(_policy([]))
+        statements = []
+        for patterns in compacted.values():
+            statement, size = _statement([]), policy_size(_statement([]))
+            for pattern in patterns:
+                # the pattern, quoted, and the comma before it
+                pattern_size = len(json.dumps(pattern)) + 1
+                if statement["Action"] and size + pattern_size > budget:
+                    statements.append(statement)
+                    statement, size = _statement([]), policy_size(_statement([]))
+                statement["Action"].append(pattern)
+                size += pattern_size
+            statements.append(statement)
+        return statements
+
+    def policies(self, actions: Iterable[str]) -> list[PolicyDocument]:
+        """The fewest policy documents, each under `max_policy_size`, granting `actions`"""
+        statements = self._statements(self.compact_actions(actions))
+        # first fit decreasing, a statement adds its size and a separating comma to a policy
+        sizes = [policy_size(statement) + 1 for statement in statements]
+        bins = list[tuple[int, list[int]]]()
+        for position in sorted(range(len(statements)), key=lambda position: -sizes[position]):
+            for bin_number, (used, packed) in enumerate(bins):
+                if used + sizes[position] <= self.max_policy_size:
+                    packed.append(position)
+                    bins[bin_number] = (used + sizes[position], packed)
+                    break
+            else:
+                bins.append((policy_size(_policy([])) + sizes[position], [position]))
+        # statements keep the order of their services within each policy
+        return [_policy([statements[position] for position in sorted(packed)]) for _, packed in bins]
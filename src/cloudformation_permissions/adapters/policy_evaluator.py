@@ -0,0 +1,226 @@
+"""Evaluates identity policies locally, as SimulatePrincipalPolicy does for requests without context.
+
+Statements are compiled once: each `Action` or `NotAction` pattern is
+expanded, ignoring case as IAM does, to the actions of the Service
+Authorization Reference it matches, so deciding an action the reference
+lists is a set lookup. Actions the reference does not list are matched
+against the patterns themselves.
+
+As with a simulation that names no resources or context entries, the request
+is for resource `*`, and conditions hold only when every condition operator
+holds for keys that are absent: `...IfExists` and negated operators,
+`ForAllValues:` operators and `Null` checks for missing keys. Service
+control policies, resource policies and session policies are not evaluated.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import threading
+from collections.abc import Iterable, Iterator, Mapping
+from pathlib import Path
+from typing import Any, Literal
+
+from attrs import define, field, frozen
+
+from ..domain.model import Action, ActionPermission
+from .action_index import ActionIndex
+from .iam import IAM, EvalDecision, IAMProtocol, PolicyDocument, authorization, role_name
+from .sar import ServiceAuthorizationReferenceProcotol
+
+WILDCARDS = frozenset("*?")
+# a simulation that names no resources is evaluated for every resource
+ANY_RESOURCE = "*"
+
+
+class PolicyError(ValueError):
+    """A policy that cannot be evaluated locally"""
+
+
+def _as_list(value: Any) -> list[Any]:
+    return value if isinstance(value, list) else [value]
+
+
+def _wildcard_pattern(pattern: str) -> re.Pattern[str]:
+    """IAM wildcard matching, where `*` matches any run of characters and `?` any one character"""
+    return re.compile(
+        "".join(".*" if char == "*" else "." if char == "?" else re.escape(char) for char in pattern), re.DOTALL
+    )
+
+
+def _condition_holds(condition: Mapping[str, Mapping[str, Any]]) -> bool:
+    """Whether `condition` holds for a request without any context keys"""
+    for qualified_operator, keys in condition.items():
+        qualifier, _, operator = qualified_operator.rpartition(":")
+        if qualifier == "ForAllValues":
+            continue
+        if qualifier == "ForAnyValue":
+            return False
+        if operator.endswith("IfExists") or "Not" in operator:
+            continue
+        if operator == "Null" and all(
+            str(value).lower() == "true" for values in keys.values() for value in _as_list(values)
+        ):
+            continue
+        return False
+    return True
+
+
+@frozen
+class Statement:
+    effect: Literal["Allow", "Deny"]
+    # lower cased actions matched, and patterns for actions missing from the reference
+    actions: frozenset[str]
+    patterns: tuple[re.Pattern[str], ...]
+    not_action: bool = False
+
+    def matches(self, action: str, indexed: bool) -> bool:
+        """Whether the statement applies to the lower cased `action`"""
+        found = action in self.actions or (not indexed and any(pattern.fullmatch(action) for pattern in self.patterns))
+        return found != self.not_action
+
+
+def _statement_applies(statement: Mapping[str, Any], resource: str) -> bool:
+    if ("Resource" in statement) == ("NotResource" in statement):
+        raise PolicyError("a statement needs exactly one of Resource or NotResource")
+    resource_key = "Resource" if "Resource" in statement else "NotResource"
+    matched = any(_wildcard_pattern(pattern).fullmatch(resource) for pattern in _as_list(statement[resource_key]))
+    if matched != (resource_key == "Resource"):
+        return False
+    return _condition_holds(statement.get("Condition", {}))
+
+
+def compile_statement(statement: Mapping[str, Any], index: ActionIndex) -> Statement:
+    effect = statement.get("Effect")
+    if effect not in ("Allow", "Deny"):
+        raise PolicyError(f"Effect must be Allow or Deny, not {effect!r}")
+    if ("Action" in statement) == ("NotAction" in statement):
+        raise PolicyError("a statement needs exactly one of Action or NotAction")
+
+    not_action = "NotAction" in statement
+    actions = set[str]()
+    patterns = list[re.Pattern[str]]()
+    for action_pattern in _as_list(statement["NotAction" if not_action else "Action"]):
+        if not isinstance(action_pattern, str):
+            raise PolicyError(f"actions must be strings, not {action_pattern!r}")
+        pattern = action_pattern.lower()
+        if WILDCARDS.isdisjoint(pattern):
+            actions.add(pattern)
+            continue
+        # the index matches with fnmatch, which reads [ as the start of a set where IAM does not
+        if "[" not in pattern:
+            actions.update(name.lower() for name in index.match(pattern, ignore_case=True))
+        patterns.append(_wildcard_pattern(pattern))
+    return Statement(effect=effect, actions=frozenset(actions), patterns=tuple(patterns), not_action=not_action)
+
+
+def compile_policy(document: PolicyDocument, index: ActionIndex, resource: str = ANY_RESOURCE) -> list[Statement]:
+    """The statements of `document` that apply to `resource` with no context"""
+    if not isinstance(document, Mapping) or "Statement" not in document:
+        raise PolicyError("a policy document needs a Statement")
+    statements = _as_list(document["Statement"])
+    if not all(isinstance(statement, Mapping) for statement in statements):
+        raise PolicyError("statements must be objects")
+    return [compile_statement(statement, index) for statement in statements if _statement_applies(statement, resource)]
+
+
+def _decide(statements: Iterable[Statement], action: str, indexed: bool) -> EvalDecision:
+    decision: EvalDecision = "implicitDeny"
+    for statement in statements:
+        if statement.matches(action, indexed):
+            if statement.effect == "Deny":
+                return "explicitDeny"
+            decision = "allowed"
+    return decision
+
+
+@define
+class PolicyEvaluator:
+    """Decides actions against a principal's identity policies and permissions boundary.
+
+    An explicit `Deny` in any policy denies an action, otherwise it is allowed
+    when an identity policy allows it and the boundary, if there is one, does
+    too. Decisions are remembered per action.
+    """
+
+    index: ActionIndex
+    statements: tuple[Statement, ...]
+    boundary: tuple[Statement, ...] | None = None
+    _decisions: dict[str, EvalDecision] = field(init=False, factory=dict)
+
+    @classmethod
+    def from_documents(
+        cls,
+        index: ActionIndex,
+        policies: Iterable[PolicyDocument],
+        boundary: PolicyDocument | None = None,
+        resource: str = ANY_RESOURCE,
+    ) -> PolicyEvaluator:
+        statements = tuple(statement for policy in policies for statement in compile_policy(policy, index, resource))
+        bounded = None if boundary is None else tuple(compile_policy(boundary, index, resource))
+        return cls(index=index, statements=statements, boundary=bounded)
+
+    def decide(self, action: str) -> EvalDecision:
+        key = action.lower()
+        if (decision := self._decisions.get(key)) is None:
+            indexed = self.index.canonical(key) is not None
+            decision = _decide(self.statements, key, indexed)
+            if self.boundary is not None and decision != "explicitDeny":
+                bounded = _decide(self.boundary, key, indexed)
+                if bounded != "allowed":
+                    decision = "explicitDeny" if bounded == "explicitDeny" else "implicitDeny"
+            self._decisions[key] = decision
+        return decision
+
+
+def _read_policy(path: Path) -> PolicyDocument:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError) as error:
+        raise PolicyError(f"Cannot read policy {path}: {error}") from error
+
+
+@define
+class LocalIAM(IAMProtocol):
+    """Evaluates identity policies locally instead of with SimulatePrincipalPolicy.
+
+    With `policy_files`, and optionally `boundary_file`, every principal is
+    evaluated against those policies. Otherwise a role's attached and inline
+    policies and its permissions boundary are fetched from IAM the first time
+    the role is simulated.
+    """
+
+    iam: IAM
+    reference: ServiceAuthorizationReferenceProcotol
+    policy_files: tuple[Path, ...] = ()
+    boundary_file: Path | None = None
+    _evaluators: dict[str, PolicyEvaluator] = field(init=False, factory=dict)
+    _lock: threading.Lock = field(init=False, factory=threading.Lock)
+
+    @property
+    def needs_principal(self) -> bool:
+        return not self.policy_files
+
+    def _evaluator(self, role: str) -> PolicyEvaluator:
+        if self.policy_files:
+            role = ""
+        with self._lock:
+            if role not in self._evaluators:
+                self._evaluators[role] = self._load(role)
+            return self._evaluators[role]
+
+    def _load(self, role: str) -> PolicyEvaluator:
+        index = self.reference.action_index
+        if not role:
+            boundary = None if self.boundary_file is None else _read_policy(self.boundary_file)
+            return PolicyEvaluator.from_documents(index, map(_read_policy, self.policy_files), boundary)
+        if (name := role_name(role)) is None:
+            raise PolicyError(f"Only the policies of roles can be evaluated locally, not those of {role}")
+        policies = self.iam.role_policies(name)
+        return PolicyEvaluator.from_documents(index, policies["Policies"], policies["PermissionsBoundary"])
+
+    def simulate(self, role: str, actions: Iterable[str]) -> Iterator[ActionPermission]:
+        evaluator = self._evaluator(role)
+        for action in dict.fromkeys(actions):
+            yield ActionPermission(action=Action(action), authorization=authorization(evaluator.decide(action)))
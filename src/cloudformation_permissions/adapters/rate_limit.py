@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections.abc import Callable, Iterator
+from typing import Any
+
+from attrs import define, field
+
+
+@define
+class RateLimiter:
+    """Token bucket shared between threads, allowing `rate` calls per second in bursts of up to `burst` calls"""
+
+    rate: float
+    burst: int = 1
+    clock: Callable[[], float] = time.monotonic
+    sleep: Callable[[float], None] = time.sleep
+    _tokens: float = field(init=False)
+    _updated: float = field(init=False)
+    _lock: threading.Lock = field(init=False, factory=threading.Lock)
+
+    def __attrs_post_init__(self):
+        self._tokens = float(self.burst)
+        self._updated = self.clock()
+
+    def acquire(self) -> None:
+        """Block until a call is allowed"""
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self.sleep(wait)
+
+    def paginate(self, paginator: Any, **kwargs: Any) -> Iterator[dict[str, Any]]:
+        """Pages of a botocore paginator, each page request waiting for a call to be allowed"""
+        self.acquire()
+        for page in paginator.paginate(**kwargs):
+            yield page
+            if page.get("NextToken") or page.get("IsTruncated"):
+                self.acquire()
@@ -1,19 +1,97 @@
 import json
+import sys
+from collections.abc import Iterable, Iterator
+from typing import IO, Any, Literal, Protocol, Self, TypedDict, runtime_checkable
 
-from typing import Protocol, Self, TypedDict, Literal
-
-from attrs import field, frozen
+from attrs import asdict, define, field, frozen
 from rich.console import Console
 from rich.text import Text
 from rich.tree import Tree
 
-from ..domain.model import ResourcePermissionSummary, TemplateSummary
+from ..domain.model import (
+    ActionPermission,
+    Authorized,
+    BatchSummary,
+    ResourcePermissionSummary,
+    TemplateError,
+    TemplateSummary,
+)
+from .policy_compaction import PolicyCompactor, PolicyDocument
+
+# bumped whenever a field of the json or ndjson records is changed or removed
+SCHEMA_VERSION = 1
+
+AUTHORIZATION_STYLES = {Authorized.ALLOWED: "green", Authorized.DENIED: "red", Authorized.UNKNOWN: "yellow"}
+
+
+def _sorted_permissions(permissions: Iterable[str | ActionPermission]) -> list[str | ActionPermission]:
+    return sorted(permissions, key=lambda p: p.action if isinstance(p, ActionPermission) else p)
+
+
+def _permission_texts(permissions: Iterable[str | ActionPermission]) -> list[Text]:
+    """Permissions sorted by action, verified permissions followed by their decision"""
+    texts = []
+    for permission in _sorted_permissions(permissions):
+        match permission:
+            case ActionPermission(action=action, authorization=authorization):
+                texts.append(Text.assemble(action, " ", (authorization, AUTHORIZATION_STYLES[authorization])))
+            case _:
+                texts.append(Text(permission))
+    return texts
+
+
+def _permission_lines(permissions: Iterable[str | ActionPermission]) -> list[str]:
+    return [
+        f"{permission.action} {permission.authorization}" if isinstance(permission, ActionPermission) else permission
+        for permission in _sorted_permissions(permissions)
+    ]
+
+
+def resource_type_record(summary: ResourcePermissionSummary) -> dict[str, Any]:
+    return {"resource_type": summary.resource_type, "permissions": _permission_records(summary.permissions)}
+
+
+def _resource_records(summary: TemplateSummary) -> Iterator[dict[str, Any]]:
+    for logical_id, resource in summary.resources.items():
+        yield {"logical_id": logical_id, **resource_type_record(resource)}
+
+
+def _template_totals(summary: TemplateSummary) -> dict[str, Any]:
+    return {"failures": summary.failures, "statistics": asdict(summary.statistics), "timings": summary.timings}
+
+
+def template_record(template: TemplateSummary | TemplateError) -> dict[str, Any]:
+    """A template's resources, failures, statistics and timings, or its error, as plain JSON types"""
+    match template:
+        case TemplateSummary():
+            resources = list(_resource_records(template))
+            return {"source": str(template.source), "resources": resources, **_template_totals(template)}
+        case TemplateError():
+            return {"source": str(template.source), "error": template.error}
+
+
+def _permission_records(permissions: Iterable[str | ActionPermission]) -> list[str | dict[str, str]]:
+    return [
+        {"action": permission.action, "authorization": str(permission.authorization)}
+        if isinstance(permission, ActionPermission)
+        else permission
+        for permission in _sorted_permissions(permissions)
+    ]
 
 
 class Reporter(Protocol):
     def add_summary(self, summary: ResourcePermissionSummary) -> Self: ...
 
 
+@runtime_checkable
+class StreamingReporter(Reporter, Protocol):
+    """Writes each summary to a stream as soon as it is added, rather than being rendered with rich"""
+
+    def add_template(self, template: TemplateSummary | TemplateError) -> Self: ...
+    def finish(self) -> None:
+        """Write whatever remains once every summary has been added"""
+
+
 @frozen
 class ListReporter(Reporter):
     items: list[Text] = field(factory=list)
@@ -21,16 +99,23 @@ class ListReporter(Reporter):
     def __rich_console__(self, console: Console, options):
         yield from self.items
 
-    def add_summary(self, summary_item: ResourcePermissionSummary | TemplateSummary) -> Self:
+    def add_summary(self, summary_item: ResourcePermissionSummary | TemplateSummary | BatchSummary) -> Self:
         match summary_item:
             case ResourcePermissionSummary():
-                for permission in sorted(summary_item.permissions):
-                    self.items.append(Text(permission))
+                self.items.extend(_permission_texts(summary_item.permissions))
 
             case TemplateSummary():
                 for resource in summary_item.resources.values():
-                    for permission in sorted(resource.permissions):
-                        self.items.append(Text(permission))
+                    self.items.extend(_permission_texts(resource.permissions))
+
+            case BatchSummary():
+                for template in summary_item.templates:
+                    match template:
+                        case TemplateSummary():
+                            self.items.append(Text(str(template.source), style="bold"))
+                            self.add_summary(template)
+                        case TemplateError():
+                            self.items.append(Text(f"{template.source}: {template.error}", style="red"))
         return self
 
 
@@ -41,22 +126,35 @@ class ResourceReporterTree(Reporter):
     def __rich_console__(self, console: Console, options):
         yield self.tree
 
-    def add_summary(self, summary_item: ResourcePermissionSummary | TemplateSummary) -> Self:
+    @staticmethod
+    def _add_template(tree: Tree, summary: TemplateSummary) -> None:
+        for logical_id, resource in summary.resources.items():
+            logical_tree = tree.add(Text(logical_id))
+            resource_type_tree = logical_tree.add(
+                resource.resource_type)
+            for text in _permission_texts(resource.permissions):
+                resource_type_tree.add(text)
+
+    def add_summary(self, summary_item: ResourcePermissionSummary | TemplateSummary | BatchSummary) -> Self:
         match summary_item:
             case ResourcePermissionSummary():
                 self.tree.label = Text(
                     str(summary_item.resource_type), style="bold")
-                for permission in sorted(summary_item.permissions):
-                    self.tree.add(Text(permission))
+                for text in _permission_texts(summary_item.permissions):
+                    self.tree.add(text)
 
             case TemplateSummary():
                 self.tree.label = str(summary_item.source)
-                for logical_id, resource in summary_item.resources.items():
-                    logical_tree = self.tree.add(Text(logical_id))
-                    resource_type_tree = logical_tree.add(
-                        resource.resource_type)
-                    for permission in sorted(resource.permissions):
-                        resource_type_tree.add(Text(permission))
+                self._add_template(self.tree, summary_item)
+
+            case BatchSummary():
+                self.tree.label = Text(f"{len(summary_item.templates)} templates", style="bold")
+                for template in summary_item.templates:
+                    match template:
+                        case TemplateSummary():
+                            self._add_template(self.tree.add(str(template.source)), template)
+                        case TemplateError():
+                            self.tree.add(Text(f"{template.source}: {template.error}", style="red"))
         return self
 
 
@@ -69,11 +167,19 @@ class IAMPolicy(TypedDict):
 @frozen
 class IAMPolicyReporter(Reporter):
     policy: IAMPolicy = field(factory=lambda: IAMPolicy(Effect='Allow', Action=[], Resource='*' ))
+    batch: dict[str, IAMPolicy | list[PolicyDocument] | str] = field(factory=dict)
+    compactor: PolicyCompactor | None = None
 
     def __rich_console__(self, console: Console, options):
-        yield json.dumps(self.policy, indent=4)
+        yield json.dumps(self.batch or self.document(), indent=4)
+
+    def document(self) -> IAMPolicy | list[PolicyDocument]:
+        """The statement allowing every action, or the policies `compactor` compacts them into"""
+        if self.compactor is None:
+            return self.policy
+        return self.compactor.policies(self.policy["Action"])
 
-    def add_summary(self, summary: ResourcePermissionSummary | TemplateSummary) -> Self:
+    def add_summary(self, summary: ResourcePermissionSummary | TemplateSummary | BatchSummary) -> Self:
         match summary:
             case ResourcePermissionSummary():
                 actions = sorted(str(permission) for permission in summary.permissions)
@@ -85,5 +191,150 @@ class IAMPolicyReporter(Reporter):
                     for permission in sorted(resource.permissions):
                         actions.append(permission)
                 self.policy["Action"] = actions
+
+            case BatchSummary():
+                for template in summary.templates:
+                    match template:
+                        case TemplateSummary():
+                            reporter = IAMPolicyReporter(compactor=self.compactor).add_summary(template)
+                            self.batch[str(template.source)] = reporter.document()
+                        case TemplateError():
+                            self.batch[str(template.source)] = template.error
+        return self
+
+
+@frozen
+class PlainListReporter(StreamingReporter):
+    """Permissions one per line, without styling, written as each template is added"""
+
+    stream: IO[str] = field(factory=lambda: sys.stdout)
+
+    def _write(self, lines: Iterable[str]) -> None:
+        self.stream.writelines(f"{line}\n" for line in lines)
+        self.stream.flush()
+
+    @staticmethod
+    def _template_lines(summary: TemplateSummary) -> list[str]:
+        return [line for resource in summary.resources.values() for line in _permission_lines(resource.permissions)]
+
+    def add_template(self, template: TemplateSummary | TemplateError) -> Self:
+        match template:
+            case TemplateSummary():
+                self._write([str(template.source), *self._template_lines(template)])
+            case TemplateError():
+                self._write([f"{template.source}: {template.error}"])
+        return self
+
+    def add_summary(self, summary: ResourcePermissionSummary | TemplateSummary | BatchSummary) -> Self:
+        match summary:
+            case ResourcePermissionSummary():
+                self._write(_permission_lines(summary.permissions))
+            case TemplateSummary():
+                self._write(self._template_lines(summary))
+            case BatchSummary():
+                for template in summary.templates:
+                    self.add_template(template)
+        return self
+
+    def finish(self) -> None:
+        return None
+
+
+@frozen
+class JSONLinesReporter(StreamingReporter):
+    """One JSON object per line, written as each template is added.
+
+    Each template is written as a `resource` record per resource followed by
+    a `template` record of its failures, statistics and timings, or as an
+    `error` record when it could not be loaded. Every record has the
+    `schema_version` of its fields.
+    """
+
+    stream: IO[str] = field(factory=lambda: sys.stdout)
+
+    def _write(self, record_type: str, records: Iterable[dict[str, Any]]) -> None:
+        header = {"schema_version": SCHEMA_VERSION, "record": record_type}
+        self.stream.writelines(f"{json.dumps(header | record)}\n" for record in records)
+        self.stream.flush()
+
+    def add_template(self, template: TemplateSummary | TemplateError) -> Self:
+        source = {"source": str(template.source)}
+        match template:
+            case TemplateSummary():
+                self._write("resource", (source | record for record in _resource_records(template)))
+                self._write("template", [source | _template_totals(template)])
+            case TemplateError():
+                self._write("error", [source | {"error": template.error}])
+        return self
+
+    def add_summary(self, summary: ResourcePermissionSummary | TemplateSummary | BatchSummary) -> Self:
+        match summary:
+            case ResourcePermissionSummary():
+                self._write("resource_type", [resource_type_record(summary)])
+            case TemplateSummary():
+                self.add_template(summary)
+            case BatchSummary():
+                for template in summary.templates:
+                    self.add_template(template)
+        return self
+
+    def finish(self) -> None:
+        return None
+
+
+@define
+class JSONReporter(StreamingReporter):
+    """A single JSON document with the `schema_version` of its fields.
+
+    Templates are written to the `templates` array as they are added, so only
+    one template is held at a time. A resource type on its own is written as
+    a document with its `resource_type` and `permissions`.
+    """
+
+    stream: IO[str] = field(factory=lambda: sys.stdout)
+    _templates: int | None = field(default=None, init=False)
+    _finished: bool = field(default=False, init=False)
+
+    def _open(self) -> int:
+        if self._templates is None:
+            self.stream.write(f'{{"schema_version": {SCHEMA_VERSION}, "templates": [')
+            self._templates = 0
+        return self._templates
+
+    def add_template(self, template: TemplateSummary | TemplateError) -> Self:
+        self.stream.write(("," if self._open() else "") + json.dumps(template_record(template)))
+        self._templates += 1
+        return self
+
+    def add_summary(self, summary: ResourcePermissionSummary | TemplateSummary | BatchSummary) -> Self:
+        match summary:
+            case ResourcePermissionSummary():
+                document = {"schema_version": SCHEMA_VERSION, **resource_type_record(summary)}
+                self.stream.write(f"{json.dumps(document)}\n")
+                self._finished = True
+            case TemplateSummary():
+                self.add_template(summary)
+            case BatchSummary():
+                for template in summary.templates:
+                    self.add_template(template)
+        return self
+
+    def finish(self) -> None:
+        if self._finished:
+            return
+        self._open()
+        self.stream.write("]}\n")
+        self.stream.flush()
+        self._finished = True
+
+
+@frozen
+class SummaryReporter(Reporter):
+    """Keeps the summaries it is given, for callers that want the summaries rather than a rendering"""
+
+    summaries: list[ResourcePermissionSummary | TemplateSummary | BatchSummary] = field(factory=list)
+
+    def add_summary(self, summary: ResourcePermissionSummary | TemplateSummary | BatchSummary) -> Self:
+        self.summaries.append(summary)
         return self
 
@@ -1,10 +1,17 @@
-import fnmatch
-import json
+from __future__ import annotations
 
-from importlib import resources
+import json
+from collections.abc import Mapping, Sequence
 from functools import cache, cached_property
+from importlib import resources
+from pathlib import Path
 from types import MappingProxyType
-from typing import Literal, Mapping, Protocol, Sequence, TypedDict
+from typing import TYPE_CHECKING, Literal, Protocol, TypedDict
+
+from .action_index import ActionIndex
+
+if TYPE_CHECKING:
+    from .sar_snapshot import Snapshot
 
 type AccessLevel = Literal["List", "Read",
                            "Write", "Permissions Management", "Tagging"]
@@ -62,20 +69,44 @@ type ServiceAuthorizationReference = list[Service]
 
 
 class ServiceAuthorizationReferenceProcotol(Protocol):
+    actions: Mapping[QualifiedName, QualifiedAction]
+    action_index: ActionIndex
+
     def list_actions_by_pattern(
         self, pattern: ActionPattern) -> Sequence[QualifiedAction]: ...
 
 
+def reference_data_dir() -> Path:
+    return Path(str(resources.files("cloudformation_permissions").joinpath("data")))
+
+
+REFERENCE_SOURCE = "auth.json"
+REFERENCE_SNAPSHOT = "auth.snapshot"
+# directory of the cache directory holding what is compiled from the reference
+REFERENCE_CACHE_NAMESPACE = "reference"
+
+
 class ServiceAuthorizationReferenceLocal(ServiceAuthorizationReferenceProcotol):
-    def __init__(self):
-        path = resources.files("cloudformation_permissions").joinpath(
-            "data", "auth.json")
-        self.index: ServiceAuthorizationReference = json.loads(
-            path.read_text())
+    """The Service Authorization Reference shipped in `data/auth.json`.
+
+    With a `snapshot` compiled from it, the actions are read from the snapshot
+    instead, see `sar_snapshot.load_reference`.
+    """
+
+    def __init__(self, snapshot: Snapshot | None = None):
+        self.source = reference_data_dir() / REFERENCE_SOURCE
+        self.snapshot = snapshot
         self.list_actions_by_pattern = cache(self._list_actions_by_pattern)
 
+    @cached_property
+    def index(self) -> ServiceAuthorizationReference:
+        return json.loads(self.source.read_text())
+
     @cached_property
     def actions(self) -> Mapping[QualifiedName, QualifiedAction]:
+        if self.snapshot is not None:
+            return self.snapshot.actions
+
         _actions: dict[QualifiedName, QualifiedAction] = {}
         for service in self.index:
             for action in service["actions"]:
@@ -84,5 +115,9 @@ class ServiceAuthorizationReferenceLocal(ServiceAuthorizationReferenceProcotol):
                     **action, qualifiedName=_name)
         return MappingProxyType(_actions)
 
+    @cached_property
+    def action_index(self) -> ActionIndex:
+        return ActionIndex(self.actions)
+
     def _list_actions_by_pattern(self, pattern: ActionPattern) -> list[QualifiedAction]:
-        return [self.actions[action] for action in fnmatch.filter(self.actions.keys(), pattern)]
+        return [self.actions[action] for action in self.action_index.match(pattern)]
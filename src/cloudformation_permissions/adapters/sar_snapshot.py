@@ -0,0 +1,158 @@
+"""Compact, memory mappable snapshot of the Service Authorization Reference.
+
+`auth.json` is compiled into a single file laid out as
+
+    header                 magic, format version, size, mtime and sha256 of the source
+    names                  newline separated qualified action names, in reference order
+    detail offsets         one unsigned 64 bit offset per action, plus the end offset
+    details                compact JSON of each action, decoded only when it is looked up
+
+Loading a snapshot maps the file, decodes the names and leaves the details
+in place until an action is looked up. The snapshot is written into the
+cache directory, as the installed package may not be writable.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from collections.abc import Iterator, Mapping
+from pathlib import Path
+
+from .sar import (
+    REFERENCE_SOURCE,
+    QualifiedAction,
+    QualifiedName,
+    ServiceAuthorizationReference,
+    ServiceAuthorizationReferenceLocal,
+    reference_data_dir,
+)
+
+MAGIC = b"CFPSAR\x00\x00"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<8sIQQ32sIQQQ")
+OFFSET = struct.Struct("<Q")
+OFFSET_PAIR = struct.Struct("<QQ")
+
+
+def source_fingerprint(source: Path) -> tuple[int, int]:
+    stat = source.stat()
+    return stat.st_size, stat.st_mtime_ns
+
+
+def sha256_digest(source: Path) -> bytes:
+    return hashlib.sha256(source.read_bytes()).digest()
+
+
+def build_snapshot(source: Path, destination: Path) -> int:
+    """Compile the reference at `source` into a snapshot at `destination`, returning the number of actions"""
+    source_bytes = source.read_bytes()
+    reference: ServiceAuthorizationReference = json.loads(source_bytes)
+
+    names = list[str]()
+    offsets = [0]
+    details = bytearray()
+    for service in reference:
+        for action in service["actions"]:
+            names.append(f"{service['servicePrefix']}:{action['name']}")
+            details += json.dumps(action, separators=(",", ":")).encode()
+            offsets.append(len(details))
+
+    names_blob = "\n".join(names).encode()
+    offsets_blob = b"".join(OFFSET.pack(offset) for offset in offsets)
+
+    size, mtime_ns = source_fingerprint(source)
+    names_offset = HEADER.size
+    offsets_offset = names_offset + len(names_blob)
+    details_offset = offsets_offset + len(offsets_blob)
+    header = HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        size,
+        mtime_ns,
+        hashlib.sha256(source_bytes).digest(),
+        len(names),
+        names_offset,
+        offsets_offset,
+        details_offset,
+    )
+
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    temporary = destination.with_suffix(f"{destination.suffix}.tmp")
+    with temporary.open("wb") as file:
+        for blob in (header, names_blob, offsets_blob, details):
+            file.write(blob)
+    os.replace(temporary, destination)
+    return len(names)
+
+
+class SnapshotActions(Mapping[QualifiedName, QualifiedAction]):
+    """Actions of a snapshot, each decoded from its details the first time it is looked up"""
+
+    def __init__(self, buffer: mmap.mmap, names: list[QualifiedName], offsets_offset: int, details_offset: int):
+        self._buffer = buffer
+        self._names = names
+        self._ordinals = {name: ordinal for ordinal, name in enumerate(names)}
+        self._offsets_offset = offsets_offset
+        self._details_offset = details_offset
+        self._decoded = dict[QualifiedName, QualifiedAction]()
+
+    def __getitem__(self, name: QualifiedName) -> QualifiedAction:
+        if (action := self._decoded.get(name)) is not None:
+            return action
+        ordinal = self._ordinals[name]
+        start, end = OFFSET_PAIR.unpack_from(self._buffer, self._offsets_offset + ordinal * OFFSET.size)
+        details = self._buffer[self._details_offset + start : self._details_offset + end]
+        action = self._decoded[name] = QualifiedAction(**json.loads(details), qualifiedName=name)
+        return action
+
+    def __iter__(self) -> Iterator[QualifiedName]:
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._ordinals
+
+
+class Snapshot:
+    def __init__(self, buffer: mmap.mmap):
+        *_, count, names_offset, offsets_offset, details_offset = HEADER.unpack_from(buffer)
+        names = [sys.intern(name) for name in buffer[names_offset:offsets_offset].decode().split("\n")]
+        self.actions = SnapshotActions(buffer, names if count else [], offsets_offset, details_offset)
+
+
+def is_stale(snapshot: Path, source: Path) -> bool:
+    """Whether the snapshot was compiled from a different `source` than the one on disk"""
+    with snapshot.open("rb") as file:
+        header = file.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return True
+    magic, version, size, mtime_ns, digest, *_ = HEADER.unpack(header)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        return True
+    if not source.exists():
+        return False
+    if source_fingerprint(source) == (size, mtime_ns):
+        return False
+    return sha256_digest(source) != digest
+
+
+def load_snapshot(snapshot: Path, source: Path) -> Snapshot | None:
+    """Map the snapshot, or return None when it is missing or stale"""
+    if not snapshot.exists() or is_stale(snapshot, source):
+        return None
+    with snapshot.open("rb") as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return Snapshot(buffer)
+
+
+def load_reference(snapshot: Path | None = None) -> ServiceAuthorizationReferenceLocal:
+    """The bundled reference, read from the `snapshot` when it was compiled from the same `auth.json`"""
+    source = reference_data_dir() / REFERENCE_SOURCE
+    return ServiceAuthorizationReferenceLocal(None if snapshot is None else load_snapshot(snapshot, source))
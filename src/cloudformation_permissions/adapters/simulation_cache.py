@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from collections.abc import Iterable, Mapping
+from typing import ClassVar, Protocol, TypedDict
+
+from attrs import define, field, frozen
+
+from ..domain.model import Authorized
+from .cache import CacheStats, DiskCache
+
+SIMULATION_CACHE_NAMESPACE = "simulations"
+# policies outside the fingerprint, such as SCPs, can change too
+SIMULATION_CACHE_TTL = 24 * 60 * 60
+SIMULATION_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+
+class CachedSimulation(TypedDict):
+    Role: str
+    PolicyFingerprint: str
+    Decisions: dict[str, Authorized]
+
+
+class SimulationCacheProtocol(Protocol):
+    stats: CacheStats
+    # fingerprinting a role's policies costs IAM calls, only worth making when decisions are cached
+    enabled: ClassVar[bool]
+
+    def get(self, role: str, fingerprint: str, actions: Iterable[str]) -> dict[str, Authorized]: ...
+    def put(self, role: str, fingerprint: str, decisions: Mapping[str, Authorized]) -> None: ...
+
+
+@frozen
+class NoSimulationCache(SimulationCacheProtocol):
+    enabled: ClassVar[bool] = False
+    stats: CacheStats = field(factory=CacheStats)
+
+    def get(self, role: str, fingerprint: str, actions: Iterable[str]) -> dict[str, Authorized]:
+        return {}
+
+    def put(self, role: str, fingerprint: str, decisions: Mapping[str, Authorized]) -> None:
+        return None
+
+
+@define
+class DiskSimulationCache(SimulationCacheProtocol):
+    """Simulation decisions cached on disk per role, policy fingerprint and action.
+
+    The decisions for one role and fingerprint are kept in a single entry, so
+    a change to any of the role's policies starts a new entry. `stats` counts
+    actions rather than entries. With `refresh` set every action misses and
+    is simulated again.
+    """
+
+    enabled: ClassVar[bool] = True
+    cache: DiskCache
+    refresh: bool = False
+    stats: CacheStats = field(factory=CacheStats)
+
+    @staticmethod
+    def _key(role: str, fingerprint: str) -> str:
+        return f"{role}/{fingerprint}"
+
+    def _decisions(self, role: str, fingerprint: str) -> dict[str, Authorized]:
+        entry: CachedSimulation | None = self.cache.get(self._key(role, fingerprint))
+        return {} if entry is None else entry["Decisions"]
+
+    def get(self, role: str, fingerprint: str, actions: Iterable[str]) -> dict[str, Authorized]:
+        actions = list(actions)
+        decisions = {} if self.refresh else self._decisions(role, fingerprint)
+        found = {action: Authorized(decisions[action]) for action in actions if action in decisions}
+        self.stats.hits += len(found)
+        self.stats.misses += len(actions) - len(found)
+        return found
+
+    def put(self, role: str, fingerprint: str, decisions: Mapping[str, Authorized]) -> None:
+        merged = self._decisions(role, fingerprint) | dict(decisions)
+        entry = CachedSimulation(Role=role, PolicyFingerprint=fingerprint, Decisions=merged)
+        self.cache.put(self._key(role, fingerprint), entry)
+        self.stats.writes += 1
@@ -0,0 +1,233 @@
+"""Counters and latencies of the AWS API calls a run made, recorded from botocore's client events.
+
+`instrument` registers handlers on the events of a client. A call is timed
+from `before-call` to `after-call`, or `after-call-error` when no response
+came, across all of its attempts. Each attempt fires `response-received`,
+where those throttled by AWS are counted. Recorded calls are exported in the
+Prometheus text format, eg for node_exporter's textfile collector, or as JSON.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import Callable
+from http import HTTPStatus
+from typing import TYPE_CHECKING, Any, Literal, Protocol
+
+from attrs import define, field, frozen
+
+if TYPE_CHECKING:
+    from botocore.hooks import BaseEventHooks
+
+METRICS_FORMATS = ("prometheus", "json")
+METRIC_PREFIX = "cloudformation_permissions_aws_api"
+# upper bounds, in seconds, of the latency histogram's buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+_BUCKET_LABELS = (*(f"{bound:g}" for bound in LATENCY_BUCKETS), "+Inf")
+# the error codes botocore's retry handlers treat as throttling
+THROTTLING_ERROR_CODES = frozenset(
+    {
+        "Throttling",
+        "ThrottlingException",
+        "ThrottledException",
+        "RequestThrottledException",
+        "TooManyRequestsException",
+        "ProvisionedThroughputExceededException",
+        "TransactionInProgressException",
+        "RequestLimitExceeded",
+        "BandwidthLimitExceeded",
+        "LimitExceededException",
+        "RequestThrottled",
+        "SlowDown",
+        "PriorRequestNotComplete",
+        "EC2ThrottledException",
+    }
+)
+# keys of botocore's request context carrying a call's progress between its events
+_STARTED = "cloudformation_permissions_started"
+_ATTEMPTS = "cloudformation_permissions_attempts"
+_THROTTLES = "cloudformation_permissions_throttles"
+
+
+@frozen
+class ApiCall:
+    """One call, across all of its attempts, and the error it ended with"""
+
+    service: str
+    operation: str
+    seconds: float
+    attempts: int = 1
+    throttles: int = 0
+    error: str | None = None
+
+
+class ApiCallsProtocol(Protocol):
+    def call(self, call: ApiCall) -> None: ...
+
+
+@frozen
+class NoApiCalls(ApiCallsProtocol):
+    def call(self, call: ApiCall) -> None:
+        return None
+
+
+@define
+class OperationCalls:
+    calls: int = 0
+    attempts: int = 0
+    throttles: int = 0
+    errors: Counter[str] = field(factory=Counter)
+    seconds: float = 0.0
+    # calls per bucket of LATENCY_BUCKETS, the last one is for slower calls
+    buckets: list[int] = field(factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "retries": self.attempts - self.calls,
+            "throttles": self.throttles,
+            "errors": dict(self.errors),
+            "seconds": self.seconds,
+            "latency_buckets": dict(zip(_BUCKET_LABELS, self.cumulative(), strict=True)),
+        }
+
+    def cumulative(self) -> list[int]:
+        """Calls at most as slow as each bucket's bound, as Prometheus histograms count them"""
+        counts, total = [], 0
+        for count in self.buckets:
+            total += count
+            counts.append(total)
+        return counts
+
+
+@define
+class ApiCalls(ApiCallsProtocol):
+    """AWS API calls recorded for `bootstrap(api_calls=...)`, per service and operation"""
+
+    operations: dict[tuple[str, str], OperationCalls] = field(factory=dict)
+    _lock: threading.Lock = field(init=False, factory=threading.Lock)
+
+    def call(self, call: ApiCall) -> None:
+        with self._lock:
+            calls = self.operations.setdefault((call.service, call.operation), OperationCalls())
+            calls.calls += 1
+            calls.attempts += call.attempts
+            calls.throttles += call.throttles
+            if call.error is not None:
+                calls.errors[call.error] += 1
+            calls.seconds += call.seconds
+            calls.buckets[bisect_left(LATENCY_BUCKETS, call.seconds)] += 1
+
+    def as_dict(self) -> dict[str, dict[str, dict[str, Any]]]:
+        recorded = dict[str, dict[str, dict[str, Any]]]()
+        for (service, operation), calls in sorted(self.operations.items()):
+            recorded.setdefault(service, {})[operation] = calls.as_dict()
+        return recorded
+
+    def prometheus(self) -> str:
+        """The recorded calls in the Prometheus text exposition format"""
+        lines = list[str]()
+
+        def metric(name: str, kind: str, description: str, samples: list[tuple[str, dict[str, str], float]]) -> None:
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {description}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+            for suffix, labels, value in samples:
+                rendered = ",".join(f'{label}="{_escape(text)}"' for label, text in labels.items())
+                lines.append(f"{METRIC_PREFIX}_{name}{suffix}{{{rendered}}} {value:g}")
+
+        operations = sorted(self.operations.items())
+        labelled = [({"service": service, "operation": operation}, calls) for (service, operation), calls in operations]
+        metric("calls_total", "counter", "AWS API calls", [("", labels, calls.calls) for labels, calls in labelled])
+        metric(
+            "retries_total",
+            "counter",
+            "Attempts of AWS API calls after their first",
+            [("", labels, calls.attempts - calls.calls) for labels, calls in labelled],
+        )
+        metric(
+            "throttles_total",
+            "counter",
+            "Attempts of AWS API calls throttled by AWS",
+            [("", labels, calls.throttles) for labels, calls in labelled],
+        )
+        metric(
+            "errors_total",
+            "counter",
+            "AWS API calls failing after their last attempt, by error code",
+            [
+                ("", {**labels, "code": code}, count)
+                for labels, calls in labelled
+                for code, count in sorted(calls.errors.items())
+            ],
+        )
+        samples = list[tuple[str, dict[str, str], float]]()
+        for labels, calls in labelled:
+            samples.extend(
+                ("_bucket", {**labels, "le": bound}, count)
+                for bound, count in zip(_BUCKET_LABELS, calls.cumulative(), strict=True)
+            )
+            samples.append(("_sum", labels, calls.seconds))
+            samples.append(("_count", labels, calls.calls))
+        metric("call_duration_seconds", "histogram", "Duration of AWS API calls, retries included", samples)
+        return "\n".join(lines) + "\n"
+
+    def export(self, metrics_format: Literal["prometheus", "json"]) -> str:
+        if metrics_format == "json":
+            return json.dumps(self.as_dict(), indent=2) + "\n"
+        return self.prometheus()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _names(event_name: str) -> tuple[str, str]:
+    # eg after-call.cloudformation.DescribeType
+    _, service, operation = event_name.split(".", 2)
+    return service, operation
+
+
+def instrument(events: BaseEventHooks, api_calls: Callable[[], ApiCallsProtocol]) -> None:
+    """Record the calls of the client emitting `events` into what `api_calls` returns when each call ends"""
+
+    def before_call(context: dict[str, Any], **kwargs: Any) -> None:
+        context[_STARTED] = time.perf_counter()
+        context[_ATTEMPTS] = context[_THROTTLES] = 0
+
+    def response_received(
+        context: dict[str, Any], parsed_response: dict[str, Any] | None, response_dict: dict[str, Any] | None, **kwargs
+    ) -> None:
+        context[_ATTEMPTS] = context.get(_ATTEMPTS, 0) + 1
+        status = (response_dict or {}).get("status_code")
+        code = (parsed_response or {}).get("Error", {}).get("Code")
+        if status == HTTPStatus.TOO_MANY_REQUESTS or code in THROTTLING_ERROR_CODES:
+            context[_THROTTLES] = context.get(_THROTTLES, 0) + 1
+
+    def record(event_name: str, context: dict[str, Any], error: str | None) -> None:
+        if _STARTED not in context:
+            return
+        api_calls().call(
+            ApiCall(
+                *_names(event_name),
+                seconds=time.perf_counter() - context.pop(_STARTED),
+                attempts=max(context.pop(_ATTEMPTS, 1), 1),
+                throttles=context.pop(_THROTTLES, 0),
+                error=error,
+            )
+        )
+
+    def after_call(event_name: str, context: dict[str, Any], http_response: Any, parsed: dict[str, Any], **kwargs):
+        error = parsed.get("Error", {}).get("Code") or str(http_response.status_code)
+        record(event_name, context, error if http_response.status_code >= HTTPStatus.MULTIPLE_CHOICES else None)
+
+    def after_call_error(event_name: str, context: dict[str, Any], exception: Exception, **kwargs) -> None:
+        record(event_name, context, type(exception).__name__)
+
+    events.register("before-call", before_call)
+    events.register("response-received", response_received)
+    events.register("after-call", after_call)
+    events.register("after-call-error", after_call_error)
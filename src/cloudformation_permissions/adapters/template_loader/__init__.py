@@ -1,19 +1,31 @@
 from __future__ import annotations
 
 import json
+import os
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from typing import TYPE_CHECKING, Any, Iterable, Protocol, TypedDict
 
-from attrs import frozen
-from botocore.exceptions import ClientError
-from cfnlint.decode import cfn_json, cfn_yaml
-from cfnlint.template import Template
+import yaml
+from attrs import field, frozen
+from botocore.exceptions import BotoCoreError, ClientError
 from result import Err, Ok, Result, as_result, is_ok
 
-from ...domain.model import ARN, ShortResourceInfo
+from ...domain.model import ARN, PermissionsLevels, ShortResourceInfo
 from ..cloudformation import CloudFormationClient
+from ..timings import NoTimings, TimingsProtocol
+from .extract import (
+    ResourcePairs,
+    UnsupportedTemplate,
+    extract_resources,
+    extract_resources_from_file,
+    resources_from_mapping,
+)
+from .parse_cache import NoTemplateParseCache, TemplateParseCacheProtocol
 
 if TYPE_CHECKING:
+    from cfnlint.template import Template
     from mypy_boto3_cloudformation.type_defs import GetTemplateOutputTypeDef
 
 
@@ -22,6 +34,24 @@ class TemplateResourceLoaderProtocol(Protocol):
 
     def get_template_resources(self, template_source: ARN | Path) -> Result[Iterable[ShortResourceInfo], str]: ...
 
+    def get_many_template_resources(
+        self, template_sources: Sequence[ARN | Path], max_workers: int
+    ) -> list[Result[list[ShortResourceInfo], str]]:
+        def load(template_source: ARN | Path) -> Result[list[ShortResourceInfo], str]:
+            return self.get_template_resources(template_source).map(list)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(load, template_sources))
+
+
+def _resource_information(pairs: ResourcePairs) -> list[ShortResourceInfo]:
+    return [ShortResourceInfo(LogicalId=logical_id, TypeName=type_name) for logical_id, type_name in pairs]
+
+
+def _resource_pairs(resources: Iterable[ShortResourceInfo]) -> ResourcePairs:
+    # cfnlint's str_node subclasses cannot be pickled, nor cached as plain strings
+    return [(str(resource.LogicalId), str(resource.TypeName)) for resource in resources]
+
 
 class CloudFormationTemplate(TypedDict):
     Resources: dict[str, Any]
@@ -31,7 +61,7 @@ class CloudFormationTemplate(TypedDict):
 class StackAdapter(TemplateResourceLoaderProtocol):
     client: CloudFormationClient
 
-    def get_template_resources(self, template_source: ARN) -> Result[Iterable[ShortResourceInfo], str]:
+    def _list_resources(self, template_source: ARN) -> list[ShortResourceInfo]:
         paginator = self.client.get_paginator("list_stack_resources")
         resources = []
         for stack_resource in paginator.paginate(StackName=str(template_source)):
@@ -41,7 +71,13 @@ class StackAdapter(TemplateResourceLoaderProtocol):
                     LogicalId=resource_summary["LogicalResourceId"],
                 )
                 resources.append(info)
-        return Ok(resources)
+        return resources
+
+    def get_template_resources(self, template_source: ARN) -> Result[Iterable[ShortResourceInfo], str]:
+        return (
+            as_result(ClientError, BotoCoreError)(self._list_resources)(template_source)
+            .map_err(lambda e: f"Failed to get CloudFormation Resources for {template_source}: {e}")
+        )
 
 
 @frozen
@@ -49,6 +85,8 @@ class ChangeSetAdapter(TemplateResourceLoaderProtocol):
     client: CloudFormationClient
 
     def _load_template(self, template_str: GetTemplateOutputTypeDef) -> Result[Template, str]:
+        from cfnlint.decode import cfn_json  # noqa: PLC0415 - cfnlint is imported only as a fallback
+
         return as_result(json.JSONDecodeError)(cfn_json.loads)(template_str["TemplateBody"]).map_err(str)
 
     def _get_template(self, template_source: ARN) -> Result[GetTemplateOutputTypeDef, str]:
@@ -56,33 +94,125 @@ class ChangeSetAdapter(TemplateResourceLoaderProtocol):
             ChangeSetName=str(template_source), TemplateStage="Processed"
         ).map_err(str)
 
+    def _get_resources_with_cfnlint(self, template: GetTemplateOutputTypeDef) -> Result[ResourcePairs, str]:
+        return self._load_template(template).map(lambda loaded: resources_from_mapping(loaded.template))
+
+    def _get_resources(self, template: GetTemplateOutputTypeDef) -> Result[ResourcePairs, str]:
+        body = template["TemplateBody"]
+        if isinstance(body, Mapping):
+            # botocore decodes JSON template bodies
+            return Ok(resources_from_mapping(body))
+        extracted = as_result(UnsupportedTemplate, yaml.YAMLError, ValueError)(extract_resources)(body)
+        if is_ok(extracted):
+            return Ok(extracted.ok_value)
+        return self._get_resources_with_cfnlint(template)
+
     def get_template_resources(self, template_source: ARN) -> Result[Iterable[ShortResourceInfo], str]:
-        template_result = self._get_template(template_source).and_then(self._load_template)
+        template_result = self._get_template(template_source).and_then(self._get_resources)
 
         match template_result:
-            case Ok(template):
-                resources = template.get_resources()
-                r = []
-                for logical_id, properties in resources.items():
-                    type_name = properties["Type"]
-                    info = ShortResourceInfo(LogicalId=logical_id, TypeName=type_name)
-                    r.append(info)
-                return Ok(r)
+            case Ok(pairs):
+                return Ok(_resource_information(pairs))
             case Err(e):
                 return Err(f"Failed to get CloudFormation Resources for {template_source}: {e}")
 
 
+# the handlers each change of a ChangeSet runs, a modification that may replace the resource runs any of them
+CHANGE_PERMISSION_LEVELS = {
+    "Add": PermissionsLevels.CREATE,
+    "Modify": PermissionsLevels.UPDATE,
+    "Remove": PermissionsLevels.DELETE,
+    "Import": PermissionsLevels.READ,
+    "Dynamic": PermissionsLevels.REPLACE,
+}
+REPLACEMENTS = ("True", "Conditional")
+
+
+def change_permission_level(change: Mapping[str, Any]) -> PermissionsLevels | None:
+    """The permission level `change`, a resource change of a ChangeSet, needs"""
+    if change.get("Action") == "Modify" and change.get("Replacement") in REPLACEMENTS:
+        return PermissionsLevels.REPLACE
+    return CHANGE_PERMISSION_LEVELS.get(change.get("Action", ""))
+
+
+@frozen
+class ChangeSetChangesAdapter(TemplateResourceLoaderProtocol):
+    """Loads only the resources a ChangeSet adds, modifies or removes, from DescribeChangeSet.
+
+    Each resource carries the permission level its change needs, so a
+    resource that is added is resolved for its create handler, one that is
+    modified for its update handler and one that is removed for its delete
+    handler. Resources the ChangeSet leaves alone are not loaded at all.
+    """
+
+    client: CloudFormationClient
+
+    def _changes(self, template_source: ARN) -> Iterable[Mapping[str, Any]]:
+        kwargs = {"ChangeSetName": str(template_source)}
+        while True:
+            page = self.client.describe_change_set(**kwargs)
+            for change in page.get("Changes", []):
+                if change.get("Type") == "Resource":
+                    yield change["ResourceChange"]
+            if not (next_token := page.get("NextToken")):
+                return
+            kwargs["NextToken"] = next_token
+
+    def get_template_resources(self, template_source: ARN) -> Result[Iterable[ShortResourceInfo], str]:
+        resources = list[ShortResourceInfo]()
+        try:
+            for change in self._changes(template_source):
+                if (permission_level := change_permission_level(change)) is None:
+                    continue
+                resources.append(
+                    ShortResourceInfo(
+                        TypeName=change["ResourceType"],
+                        LogicalId=change["LogicalResourceId"],
+                        PermissionLevel=permission_level,
+                    )
+                )
+        except ClientError as e:
+            return Err(f"Failed to get the changes of {template_source}: {e}")
+        return Ok(resources)
+
+
+def _extract_resource_pairs(template_source: str) -> ResourcePairs | str:
+    """Parse a local template in a worker process, returning (LogicalId, TypeName) pairs or an error"""
+    match LocalAdapter(client=None).get_template_resources(Path(template_source)):
+        case Ok(resources):
+            return _resource_pairs(resources)
+        case Err(error):
+            return error
+
+
 @frozen
 class LocalAdapter(TemplateResourceLoaderProtocol):
+    """Loads resources from local template files.
+
+    Resource types are read by the streaming extractor in `extract`, falling
+    back to a full cfnlint decode for templates it does not handle. Parsing
+    large templates is CPU bound, so when many templates are loaded together
+    they are parsed in a pool of up to `max_processes` worker processes,
+    defaulting to one per core. Workers only send back the (LogicalId,
+    TypeName) pairs of each template. Templates found in `parse_cache` are
+    not parsed at all, see `parse_cache`.
+    """
+
     client: CloudFormationClient
+    max_processes: int | None = None
+    parse_cache: TemplateParseCacheProtocol = field(factory=NoTemplateParseCache)
+    timings: TimingsProtocol = field(factory=NoTimings)
 
     def _get_template(self, template_source: Path) -> Result[Template, str]:
-        load_result = as_result(OSError)(cfn_yaml.load)(template_source)
+        from cfnlint.decode import cfn_yaml  # noqa: PLC0415 - cfnlint is imported only as a fallback
+        from cfnlint.template import Template  # noqa: PLC0415 - cfnlint is imported only as a fallback
+
+        load_result = as_result(OSError, yaml.YAMLError)(cfn_yaml.load)(template_source)
         if is_ok(load_result):
             return Ok(Template(str(template_source), template=load_result.ok_value))
-        return Err(str(load_result))
+        return Err(str(load_result.err_value))
 
-    def get_template_resources(self, template_source: Path) -> Result[Iterable[ShortResourceInfo], str]:
+    def _get_template_resources_with_cfnlint(self, template_source: Path) -> Result[Iterable[ShortResourceInfo], str]:
         get_template_result = self._get_template(template_source)
 
         match get_template_result:
@@ -96,3 +226,99 @@ class LocalAdapter(TemplateResourceLoaderProtocol):
                 return Ok(resource_information_collection)
             case Err(e):
                 return Err(str(e))
+
+    def _parse_template_resources(self, template_source: Path) -> Result[Iterable[ShortResourceInfo], str]:
+        extract = as_result(OSError, UnsupportedTemplate, yaml.YAMLError, ValueError)(extract_resources_from_file)
+        match extract(template_source):
+            case Ok(pairs):
+                return Ok(_resource_information(pairs))
+            case Err(OSError() as e):
+                return Err(str(e))
+            case Err(_):
+                return self._get_template_resources_with_cfnlint(template_source)
+
+    def get_template_resources(self, template_source: Path) -> Result[Iterable[ShortResourceInfo], str]:
+        if (pairs := self.parse_cache.get(template_source)) is not None:
+            self.timings.cache("templates", hits=1)
+            return Ok(_resource_information(pairs))
+        self.timings.cache("templates", misses=1)
+        with self.timings.stage("parse"):
+            parsed = self._parse_template_resources(template_source).map(list)
+        if is_ok(parsed):
+            self.parse_cache.put(template_source, _resource_pairs(parsed.ok_value))
+        return parsed
+
+    def _parse_many_template_resources(self, template_sources: Sequence[Path]) -> list[ResourcePairs | str]:
+        processes = min(self.max_processes or os.cpu_count() or 1, len(template_sources))
+        if processes <= 1:
+            return [_extract_resource_pairs(str(source)) for source in template_sources]
+
+        chunksize = max(1, len(template_sources) // (processes * 4))
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            return list(executor.map(_extract_resource_pairs, map(str, template_sources), chunksize=chunksize))
+
+    def get_many_template_resources(
+        self, template_sources: Sequence[Path], max_workers: int
+    ) -> list[Result[list[ShortResourceInfo], str]]:
+        """Find templates in the parse cache, then parse the others"""
+        extracted = [self.parse_cache.get(source) for source in template_sources]
+        missing = [position for position, pairs in enumerate(extracted) if pairs is None]
+        self.timings.cache("templates", hits=len(extracted) - len(missing), misses=len(missing))
+        with self.timings.stage("parse"):
+            parsed = self._parse_many_template_resources([template_sources[position] for position in missing])
+        for position, pairs in zip(missing, parsed, strict=True):
+            extracted[position] = pairs
+            if not isinstance(pairs, str):
+                self.parse_cache.put(template_sources[position], pairs)
+
+        results = list[Result[list[ShortResourceInfo], str]]()
+        for pairs in extracted:
+            match pairs:
+                case str() as error:
+                    results.append(Err(error))
+                case _:
+                    results.append(Ok(_resource_information(pairs)))
+        return results
+
+
+@frozen
+class TemplateSourceAdapter(TemplateResourceLoaderProtocol):
+    """Loads resources from Stacks, ChangeSets or local files, whichever `template_source` refers to"""
+
+    client: CloudFormationClient
+    max_processes: int | None = None
+    parse_cache: TemplateParseCacheProtocol = field(factory=NoTemplateParseCache)
+    timings: TimingsProtocol = field(factory=NoTimings)
+
+    def get_template_resources(self, template_source: ARN | Path) -> Result[Iterable[ShortResourceInfo], str]:
+        match template_source:
+            case ARN() as stack if stack.resource.startswith("stack/"):
+                return StackAdapter(self.client).get_template_resources(stack)
+            case ARN() as changeset if changeset.resource.startswith("changeSet/"):
+                return ChangeSetAdapter(self.client).get_template_resources(changeset)
+            case ARN():
+                return Err(f"{template_source} is not the ARN of a Stack or ChangeSet")
+            case _:
+                local_adapter = LocalAdapter(self.client, parse_cache=self.parse_cache, timings=self.timings)
+                return local_adapter.get_template_resources(Path(template_source))
+
+    def get_many_template_resources(
+        self, template_sources: Sequence[ARN | Path], max_workers: int
+    ) -> list[Result[list[ShortResourceInfo], str]]:
+        """Parse local templates in worker processes, then load Stacks and ChangeSets on threads"""
+        local = [position for position, source in enumerate(template_sources) if not isinstance(source, ARN)]
+        remote = [position for position, source in enumerate(template_sources) if isinstance(source, ARN)]
+
+        results = dict[int, Result[list[ShortResourceInfo], str]]()
+        local_adapter = LocalAdapter(
+            self.client, max_processes=self.max_processes, parse_cache=self.parse_cache, timings=self.timings
+        )
+        local_results = local_adapter.get_many_template_resources(
+            [Path(template_sources[position]) for position in local], max_workers
+        )
+        results.update(zip(local, local_results, strict=True))
+        remote_results = TemplateResourceLoaderProtocol.get_many_template_resources(
+            self, [template_sources[position] for position in remote], max_workers
+        )
+        results.update(zip(remote, remote_results, strict=True))
+        return [results[position] for position in range(len(template_sources))]
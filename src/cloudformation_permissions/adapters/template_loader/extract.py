@@ -0,0 +1,210 @@
+"""Extracts `Resources.<LogicalId>.Type` from templates without building a cfnlint Template.
+
+YAML is read as a stream of parser events, so only the logical ids and types
+of resources are ever held in memory; everything else is skipped as it is
+parsed. JSON is decoded with the standard library into plain containers.
+
+Templates whose resources the extractor cannot list exactly as cfnlint would,
+such as those with aliases, merge keys or duplicate keys inside `Resources`,
+tagged or non string types, or several documents, raise `UnsupportedTemplate`
+so callers can fall back to cfnlint. Content outside `Resources` is only
+checked for being well formed.
+"""
+
+from __future__ import annotations
+
+import json
+from collections.abc import Iterator, Mapping
+from pathlib import Path
+from typing import IO, Any
+
+import yaml
+from yaml.events import (
+    AliasEvent,
+    CollectionEndEvent,
+    CollectionStartEvent,
+    DocumentEndEvent,
+    DocumentStartEvent,
+    Event,
+    MappingEndEvent,
+    MappingStartEvent,
+    ScalarEvent,
+    StreamEndEvent,
+    StreamStartEvent,
+)
+from yaml.nodes import ScalarNode
+from yaml.resolver import Resolver
+
+type ResourcePairs = list[tuple[str, str]]
+
+# bumped whenever the resources extracted from a template change, so cached extractions are not reused
+EXTRACTOR_VERSION = 1
+
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+MERGE_KEY = "<<"
+STR_TAG = "tag:yaml.org,2002:str"
+NULL_TAG = "tag:yaml.org,2002:null"
+
+_resolver = Resolver()
+
+
+class UnsupportedTemplate(Exception):
+    """The template needs a full decode to list its resources"""
+
+
+def resources_from_mapping(template: Mapping[str, Any]) -> ResourcePairs:
+    """(LogicalId, TypeName) pairs of an already decoded template, as `cfnlint.Template.get_resources` lists them"""
+    if not isinstance(template, Mapping):
+        raise UnsupportedTemplate(f"template is a {type(template).__name__}")
+    resources = template.get("Resources", {})
+    if not isinstance(resources, Mapping):
+        return []
+    return [
+        (logical_id, resource["Type"])
+        for logical_id, resource in resources.items()
+        if isinstance(resource, Mapping) and resource.get("Type") is not None
+    ]
+
+
+def _unique_keys(pairs: list[tuple[str, Any]]) -> dict[str, Any]:
+    mapping = dict(pairs)
+    if len(mapping) != len(pairs):
+        raise UnsupportedTemplate("duplicate keys")
+    return mapping
+
+
+def _skip(events: Iterator[Event], event: Event) -> None:
+    """Consume the rest of the node that starts with `event`"""
+    if not isinstance(event, CollectionStartEvent):
+        return
+    depth = 1
+    for nested in events:
+        if isinstance(nested, CollectionStartEvent):
+            depth += 1
+        elif isinstance(nested, CollectionEndEvent):
+            depth -= 1
+            if not depth:
+                return
+
+
+def _mapping_keys(events: Iterator[Event]) -> Iterator[tuple[str | None, Event]]:
+    """Yield each key of the mapping being read and the first event of its value.
+
+    The caller must consume the value before asking for the next key. Non
+    scalar keys are skipped and yielded as None.
+    """
+    seen = set[str]()
+    for event in events:
+        if isinstance(event, MappingEndEvent):
+            return
+        key = None
+        if isinstance(event, ScalarEvent):
+            key = event.value
+            if key == MERGE_KEY or key in seen:
+                raise UnsupportedTemplate(f"merge or duplicate key {key!r}")
+            seen.add(key)
+        else:
+            _skip(events, event)
+        yield key, next(events)
+
+
+def _implicit_tag(event: ScalarEvent) -> str | None:
+    """The tag the scalar resolves to, as SafeLoader would construct it"""
+    if event.tag is not None:
+        return None
+    if not event.implicit[0]:
+        return STR_TAG
+    return _resolver.resolve(ScalarNode, event.value, (True, False))
+
+
+def _scalar_type(event: ScalarEvent) -> str | None:
+    tag = _implicit_tag(event)
+    if tag == NULL_TAG:
+        return None
+    if tag != STR_TAG:
+        raise UnsupportedTemplate(f"Type is not a string: {event.value!r}")
+    return event.value
+
+
+def _resource_type(events: Iterator[Event]) -> str | None:
+    type_name = None
+    for key, value in _mapping_keys(events):
+        if key != "Type":
+            _skip(events, value)
+        elif isinstance(value, ScalarEvent):
+            type_name = _scalar_type(value)
+        else:
+            raise UnsupportedTemplate("Type is not a scalar")
+    return type_name
+
+
+def _resources(events: Iterator[Event]) -> ResourcePairs:
+    resources: ResourcePairs = []
+    for logical_id, value in _mapping_keys(events):
+        if logical_id is None or isinstance(value, AliasEvent):
+            raise UnsupportedTemplate("complex logical id or aliased resource")
+        if not isinstance(value, MappingStartEvent):
+            _skip(events, value)
+        elif (type_name := _resource_type(events)) is not None:
+            resources.append((logical_id, type_name))
+    return resources
+
+
+def _expect(events: Iterator[Event], event_type: type[Event]) -> Event:
+    if not isinstance(event := next(events), event_type):
+        raise UnsupportedTemplate(f"expected {event_type.__name__}, found {type(event).__name__}")
+    return event
+
+
+def resources_from_yaml_events(events: Iterator[Event]) -> ResourcePairs:
+    _expect(events, StreamStartEvent)
+    if isinstance(event := next(events), StreamEndEvent):
+        return []
+    if not isinstance(event, DocumentStartEvent):
+        raise UnsupportedTemplate("expected a document")
+
+    resources: ResourcePairs = []
+    match root := next(events):
+        case MappingStartEvent():
+            for key, value in _mapping_keys(events):
+                if key == "Resources" and isinstance(value, AliasEvent):
+                    raise UnsupportedTemplate("aliased Resources")
+                if key == "Resources" and isinstance(value, MappingStartEvent):
+                    resources = _resources(events)
+                else:
+                    _skip(events, value)
+        case ScalarEvent() if _implicit_tag(root) == NULL_TAG:
+            pass
+        case _:
+            raise UnsupportedTemplate(f"template is a {type(root).__name__}")
+
+    _expect(events, DocumentEndEvent)
+    _expect(events, StreamEndEvent)
+    return resources
+
+
+def _looks_like_json(head: bytes | str) -> bool:
+    return head.lstrip()[:1] in (b"{", "{")
+
+
+def extract_resources(template: str | bytes | IO[bytes]) -> ResourcePairs:
+    """(LogicalId, TypeName) pairs of a YAML or JSON template.
+
+    Raises `UnsupportedTemplate`, `yaml.YAMLError` or `ValueError` when the
+    template should be decoded in full instead.
+    """
+    if isinstance(template, str | bytes):
+        if _looks_like_json(template[:64]):
+            return resources_from_mapping(json.loads(template, object_pairs_hook=_unique_keys))
+        return resources_from_yaml_events(yaml.parse(template, Loader=Loader))
+
+    if _looks_like_json(template.read(64)):
+        template.seek(0)
+        return resources_from_mapping(json.load(template, object_pairs_hook=_unique_keys))
+    template.seek(0)
+    return resources_from_yaml_events(yaml.parse(template, Loader=Loader))
+
+
+def extract_resources_from_file(template_source: Path) -> ResourcePairs:
+    with template_source.open("rb") as template:
+        return extract_resources(template)
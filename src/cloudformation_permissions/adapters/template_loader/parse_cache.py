@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+from typing import Protocol, TypedDict
+
+from attrs import define, field, frozen
+
+from ..cache import CacheStats, DiskCache
+from .extract import EXTRACTOR_VERSION, ResourcePairs
+
+TEMPLATE_CACHE_NAMESPACE = "templates"
+TEMPLATE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+
+class CachedTemplate(TypedDict):
+    # each resource's LogicalId and the position of its type in TypeNames, in template order
+    TypeNames: list[str]
+    Resources: list[tuple[str, int]]
+
+
+class CachedPath(TypedDict):
+    Size: int
+    MtimeNs: int
+    Digest: str
+
+
+class TemplateParseCacheProtocol(Protocol):
+    stats: CacheStats
+
+    def get(self, template_source: Path) -> ResourcePairs | None: ...
+    def put(self, template_source: Path, pairs: ResourcePairs) -> None: ...
+
+
+@frozen
+class NoTemplateParseCache(TemplateParseCacheProtocol):
+    stats: CacheStats = field(factory=CacheStats)
+
+    def get(self, template_source: Path) -> ResourcePairs | None:
+        return None
+
+    def put(self, template_source: Path, pairs: ResourcePairs) -> None:
+        return None
+
+
+def _compact(pairs: ResourcePairs) -> CachedTemplate:
+    positions = dict[str, int]()
+    resources = [(logical_id, positions.setdefault(type_name, len(positions))) for logical_id, type_name in pairs]
+    return CachedTemplate(TypeNames=list(positions), Resources=resources)
+
+
+def _expand(template: CachedTemplate) -> ResourcePairs:
+    type_names = template["TypeNames"]
+    return [(logical_id, type_names[position]) for logical_id, position in template["Resources"]]
+
+
+@define
+class DiskTemplateParseCache(TemplateParseCacheProtocol):
+    """Resources of local templates cached on disk by a digest of the template's bytes.
+
+    Each template path also records the size, modification time and digest
+    it was last seen with, so a template whose size and modification time
+    are unchanged is found without reading it. Any other template is read
+    and hashed, and found when a template with the same bytes was parsed
+    before, wherever it was, by the same `EXTRACTOR_VERSION`. Only each
+    resource's LogicalId and type are kept, see `CachedTemplate`. Both kinds
+    of entry share `cache`, whose least recently used entries are evicted
+    beyond its `max_bytes`. With `refresh` set every template misses and is
+    parsed again.
+    """
+
+    cache: DiskCache
+    refresh: bool = False
+    stats: CacheStats = field(factory=CacheStats)
+    # (size, mtime_ns, digest, recorded) of the templates looked up, whether their path entry holds that digest
+    _digests: dict[Path, tuple[int, int, str, bool]] = field(init=False, factory=dict)
+
+    @staticmethod
+    def _content_key(digest: str) -> str:
+        return f"content/v{EXTRACTOR_VERSION}/{digest}"
+
+    @staticmethod
+    def _path_key(template_source: Path) -> str:
+        return f"path/{template_source.resolve()}"
+
+    def _digest(self, template_source: Path) -> tuple[str, bool]:
+        """The digest of the template's bytes, and whether its path already records that digest"""
+        stat = template_source.stat()
+        fingerprint = (stat.st_size, stat.st_mtime_ns)
+        seen = self._digests.get(template_source)
+        if seen is not None and seen[:2] == fingerprint:
+            return seen[2], seen[3]
+
+        cached_path: CachedPath | None = self.cache.get(self._path_key(template_source))
+        recorded = cached_path is not None and (cached_path["Size"], cached_path["MtimeNs"]) == fingerprint
+        digest = cached_path["Digest"] if recorded else hashlib.sha256(template_source.read_bytes()).hexdigest()
+        self._digests[template_source] = (*fingerprint, digest, recorded)
+        return digest, recorded
+
+    def _record_path(self, template_source: Path) -> None:
+        size, mtime_ns, digest, _ = self._digests[template_source]
+        self.cache.put(self._path_key(template_source), CachedPath(Size=size, MtimeNs=mtime_ns, Digest=digest))
+        self._digests[template_source] = (size, mtime_ns, digest, True)
+
+    def get(self, template_source: Path) -> ResourcePairs | None:
+        if self.refresh:
+            self.stats.misses += 1
+            return None
+        try:
+            digest, recorded = self._digest(template_source)
+        except OSError:
+            self.stats.misses += 1
+            return None
+        template: CachedTemplate | None = self.cache.get(self._content_key(digest))
+        if template is None:
+            self.stats.misses += 1
+            return None
+        if not recorded:
+            # the same bytes were parsed from another path, or before this path changed
+            self._record_path(template_source)
+        self.stats.hits += 1
+        return _expand(template)
+
+    def put(self, template_source: Path, pairs: ResourcePairs) -> None:
+        try:
+            digest, _ = self._digest(template_source)
+        except OSError:
+            return
+        self.cache.put(self._content_key(digest), _compact(pairs))
+        self._record_path(template_source)
+        self.stats.writes += 1
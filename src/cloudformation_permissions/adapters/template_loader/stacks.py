@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import queue
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Protocol
+
+from attrs import frozen
+from botocore.exceptions import BotoCoreError, ClientError
+
+from ...domain.model import ARN, ShortResourceInfo, StackResources, TemplateError
+from ..cloudformation import CloudFormationClient
+from ..rate_limit import RateLimiter
+
+DEFAULT_REQUESTS_PER_SECOND = 10.0
+NESTED_STACK_TYPE = "AWS::CloudFormation::Stack"
+ACTIVE_STACK_STATUSES = (
+    "CREATE_IN_PROGRESS",
+    "CREATE_FAILED",
+    "CREATE_COMPLETE",
+    "ROLLBACK_IN_PROGRESS",
+    "ROLLBACK_FAILED",
+    "ROLLBACK_COMPLETE",
+    "DELETE_IN_PROGRESS",
+    "DELETE_FAILED",
+    "UPDATE_IN_PROGRESS",
+    "UPDATE_COMPLETE_CLEANUP_IN_PROGRESS",
+    "UPDATE_COMPLETE",
+    "UPDATE_FAILED",
+    "UPDATE_ROLLBACK_IN_PROGRESS",
+    "UPDATE_ROLLBACK_FAILED",
+    "UPDATE_ROLLBACK_COMPLETE_CLEANUP_IN_PROGRESS",
+    "UPDATE_ROLLBACK_COMPLETE",
+    "REVIEW_IN_PROGRESS",
+    "IMPORT_IN_PROGRESS",
+    "IMPORT_COMPLETE",
+    "IMPORT_ROLLBACK_IN_PROGRESS",
+    "IMPORT_ROLLBACK_FAILED",
+    "IMPORT_ROLLBACK_COMPLETE",
+)
+
+type StackRecord = StackResources | TemplateError
+
+# markers sent by workers so the consumer knows when every stack has been listed
+_STARTED = object()
+_FINISHED = object()
+
+
+class AccountStacksProtocol(Protocol):
+    def stream_stack_resources(
+        self, stacks: Iterable[ARN] | None = None, follow_nested: bool = True
+    ) -> Iterator[StackRecord]: ...
+
+
+@frozen
+class AccountStacksAdapter(AccountStacksProtocol):
+    """Lists the resources of many Stacks at once, or of every Stack in the account and region.
+
+    Stacks are listed on a pool of `max_workers` threads, and every
+    CloudFormation call, across all threads, waits on the shared
+    `rate_limiter`. Resources are streamed one page at a time as they arrive.
+    When following nested Stacks, the children of `AWS::CloudFormation::Stack`
+    resources are listed as soon as they are found, and Stacks with a parent
+    are not listed again from the account.
+    """
+
+    client: CloudFormationClient
+    rate_limiter: RateLimiter
+    max_workers: int = 8
+
+    def _paginate(self, operation: str, **kwargs: Any) -> Iterator[dict[str, Any]]:
+        return self.rate_limiter.paginate(self.client.get_paginator(operation), **kwargs)
+
+    def list_stacks(self, follow_nested: bool = True) -> Iterator[ARN]:
+        for page in self._paginate("list_stacks", StackStatusFilter=list(ACTIVE_STACK_STATUSES)):
+            for stack in page["StackSummaries"]:
+                if follow_nested and stack.get("ParentId"):
+                    continue
+                yield ARN.from_str(stack["StackId"])
+
+    def _list_stack(self, stack: ARN, follow_nested: bool, executor: ThreadPoolExecutor, records: queue.SimpleQueue):
+        try:
+            for page in self._paginate("list_stack_resources", StackName=str(stack)):
+                resources = list[ShortResourceInfo]()
+                for summary in page["StackResourceSummaries"]:
+                    resources.append(
+                        ShortResourceInfo(TypeName=summary["ResourceType"], LogicalId=summary["LogicalResourceId"])
+                    )
+                    child = summary.get("PhysicalResourceId", "")
+                    if (
+                        follow_nested
+                        and summary["ResourceType"] == NESTED_STACK_TYPE
+                        and summary.get("ResourceStatus") != "DELETE_COMPLETE"
+                        and child.startswith(f"{ARN.domain}:")
+                    ):
+                        records.put(_STARTED)
+                        executor.submit(self._list_stack, ARN.from_str(child), follow_nested, executor, records)
+                records.put(StackResources(stack=stack, resources=resources, complete=not page.get("NextToken")))
+        except (ClientError, BotoCoreError) as error:
+            records.put(TemplateError(source=stack, error=str(error)))
+        except Exception as error:  # noqa: BLE001 re-raised by the consumer
+            records.put(error)
+        finally:
+            records.put(_FINISHED)
+
+    def _list_stacks(
+        self,
+        stacks: Iterable[ARN] | None,
+        follow_nested: bool,
+        executor: ThreadPoolExecutor,
+        records: queue.SimpleQueue,
+    ):
+        try:
+            for stack in self.list_stacks(follow_nested) if stacks is None else stacks:
+                records.put(_STARTED)
+                executor.submit(self._list_stack, stack, follow_nested, executor, records)
+        except Exception as error:  # noqa: BLE001 re-raised by the consumer
+            records.put(error)
+        finally:
+            records.put(_FINISHED)
+
+    def stream_stack_resources(
+        self, stacks: Iterable[ARN] | None = None, follow_nested: bool = True
+    ) -> Iterator[StackRecord]:
+        """Yield pages of resources of `stacks`, or of every Stack in the account, in the order they arrive"""
+        records = queue.SimpleQueue()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        outstanding = 1
+        executor.submit(self._list_stacks, stacks, follow_nested, executor, records)
+        try:
+            while outstanding:
+                record = records.get()
+                if record is _STARTED:
+                    outstanding += 1
+                elif record is _FINISHED:
+                    outstanding -= 1
+                elif isinstance(record, Exception):
+                    raise record
+                else:
+                    yield record
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
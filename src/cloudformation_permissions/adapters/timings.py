@@ -0,0 +1,142 @@
+"""Wall and CPU time spent in each stage of a query, and what each resource type cost.
+
+Handlers time the stages they run through a `TimingsProtocol`, adapters time
+their own, eg the parse stage within the load stage. A stage entered within
+another is only counted in the inner stage, so the stages of a thread add up
+to the time it spent in them. CPU time is that of the whole process, stages
+running on other threads at the same time are counted in each, as is the
+work of worker processes in neither.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from typing import Any, Protocol
+
+from attrs import asdict, define, field, frozen
+
+STAGES = ("load", "parse", "resolve", "simulate", "report")
+
+
+class TimingsProtocol(Protocol):
+    def stage(self, name: str) -> AbstractContextManager[Any]: ...
+
+    def resource_type(
+        self, type_name: str, resources: int = 0, seconds: float = 0.0, source: str | None = None
+    ) -> None: ...
+
+    def cache(self, name: str, hits: int = 0, misses: int = 0) -> None: ...
+
+
+@frozen
+class NoTimings(TimingsProtocol):
+    def stage(self, name: str) -> AbstractContextManager[Any]:
+        return nullcontext()
+
+    def resource_type(
+        self, type_name: str, resources: int = 0, seconds: float = 0.0, source: str | None = None
+    ) -> None:
+        return None
+
+    def cache(self, name: str, hits: int = 0, misses: int = 0) -> None:
+        return None
+
+
+NO_TIMINGS = NoTimings()
+
+_END: Any = object()
+
+
+def timed[T](timings: TimingsProtocol, name: str, items: Iterable[T]) -> Iterator[T]:
+    """`items`, each taken in the stage `name`, as for a generator that loads as it is iterated"""
+    iterator = iter(items)
+    while True:
+        with timings.stage(name):
+            item = next(iterator, _END)
+        if item is _END:
+            return
+        yield item
+
+
+@define
+class StageTiming:
+    calls: int = 0
+    wall: float = 0.0
+    cpu: float = 0.0
+
+
+@define
+class ResourceTypeCost:
+    resources: int = 0
+    seconds: float = 0.0
+    # where its schema came from: "permission table", "cache" or "DescribeType"
+    source: str | None = None
+
+
+@define
+class Timings(TimingsProtocol):
+    """Timings recorded for `bootstrap(timings=...)`, read once the query was handled"""
+
+    stages: dict[str, StageTiming] = field(factory=dict)
+    resource_types: dict[str, ResourceTypeCost] = field(factory=dict)
+    caches: dict[str, Counter[str]] = field(factory=dict)
+    _started: float = field(init=False, factory=time.perf_counter)
+    _local: threading.local = field(init=False, factory=threading.local)
+    _lock: threading.Lock = field(init=False, factory=threading.Lock)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        stack: list[list[float]] = self._local.__dict__.setdefault("stack", [])
+        # wall and CPU time of the stages entered within this one
+        stack.append([0.0, 0.0])
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            inner_wall, inner_cpu = stack.pop()
+            if stack:
+                stack[-1][0] += wall
+                stack[-1][1] += cpu
+            with self._lock:
+                timing = self.stages.setdefault(name, StageTiming())
+                timing.calls += 1
+                timing.wall += wall - inner_wall
+                timing.cpu += cpu - inner_cpu
+
+    def resource_type(
+        self, type_name: str, resources: int = 0, seconds: float = 0.0, source: str | None = None
+    ) -> None:
+        """Count `resources` of `type_name`, and the `seconds` its schema took to resolve from `source`"""
+        with self._lock:
+            cost = self.resource_types.setdefault(type_name, ResourceTypeCost())
+            cost.resources += resources
+            cost.seconds += seconds
+            cost.source = source or cost.source
+
+    def cache(self, name: str, hits: int = 0, misses: int = 0) -> None:
+        with self._lock:
+            counts = self.caches.setdefault(name, Counter())
+            counts.update(hits=hits, misses=misses)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._started
+
+    def as_dict(self) -> dict[str, Any]:
+        ordered = sorted(self.stages, key=lambda name: (STAGES.index(name) if name in STAGES else len(STAGES), name))
+        return {
+            "elapsed": self.elapsed,
+            "stages": {name: asdict(self.stages[name]) for name in ordered},
+            "resource_types": {
+                type_name: asdict(cost)
+                for type_name, cost in sorted(self.resource_types.items(), key=lambda item: -item[1].seconds)
+            },
+            "caches": {
+                name: {"hits": counts["hits"], "misses": counts["misses"]} for name, counts in self.caches.items()
+            },
+        }
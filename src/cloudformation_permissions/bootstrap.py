@@ -1,67 +1,362 @@
 from __future__ import annotations
 
-from collections.abc import Mapping
+import os
+import time
+from collections import Counter, OrderedDict
+from collections.abc import Callable, Hashable, Iterator, Mapping
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Literal
+from typing import IO, Any, Literal
 
 import punq
-from boto3 import session
+from attrs import asdict, define, field
 
 from .adapters import cloudformation, iam, permissions_resolver, sts, template_loader
-from .adapters.reporter import IAMPolicyReporter, ListReporter, Reporter, ResourceReporterTree
-from .adapters.sar import ServiceAuthorizationReferenceLocal, ServiceAuthorizationReferenceProcotol
+from .adapters.aws import AWS
+from .adapters.cache import CacheStats, DiskCache, default_cache_dir
+from .adapters.permissions_resolver import permission_table, schema_cache
+from .adapters.policy_compaction import PolicyCompactor
+from .adapters.policy_evaluator import LocalIAM
+from .adapters.rate_limit import RateLimiter
+from .adapters.reporter import (
+    IAMPolicyReporter,
+    JSONLinesReporter,
+    JSONReporter,
+    ListReporter,
+    PlainListReporter,
+    Reporter,
+    ResourceReporterTree,
+    SummaryReporter,
+)
+from .adapters.sar import (
+    REFERENCE_CACHE_NAMESPACE,
+    REFERENCE_SNAPSHOT,
+    REFERENCE_SOURCE,
+    ServiceAuthorizationReferenceProcotol,
+    reference_data_dir,
+)
+from .adapters.sar_snapshot import load_reference
+from .adapters.simulation_cache import (
+    SIMULATION_CACHE_MAX_BYTES,
+    SIMULATION_CACHE_NAMESPACE,
+    SIMULATION_CACHE_TTL,
+    DiskSimulationCache,
+    NoSimulationCache,
+    SimulationCacheProtocol,
+)
+from .adapters.telemetry import ApiCallsProtocol, NoApiCalls
+from .adapters.template_loader.parse_cache import (
+    TEMPLATE_CACHE_MAX_BYTES,
+    TEMPLATE_CACHE_NAMESPACE,
+    DiskTemplateParseCache,
+    NoTemplateParseCache,
+    TemplateParseCacheProtocol,
+)
+from .adapters.template_loader.stacks import (
+    DEFAULT_REQUESTS_PER_SECOND,
+    AccountStacksAdapter,
+    AccountStacksProtocol,
+)
+from .adapters.timings import NoTimings, TimingsProtocol
 from .domain.model import ARN
 from .domain.queries import Query
 from .service.handlers import QueryHandler
 
+DEFAULT_MAX_INSTANCES = 32
+DEFAULT_MAX_AGE = 60 * 60
 
-def bootstrap(
+
+@define
+class WarmInstances:
+    """Instances a long running process keeps between the queries it answers, see `entrypoints.daemon`.
+
+    Instances are kept by a key naming their kind first, eg `("resolver", ...)`.
+    At most `max_instances` are kept, the least recently used are dropped
+    first, and none is kept for longer than `max_age` seconds, so that the
+    schemas and AWS credentials they hold are eventually read again.
+    """
+
+    max_instances: int = DEFAULT_MAX_INSTANCES
+    max_age: float = DEFAULT_MAX_AGE
+    stats: CacheStats = field(factory=CacheStats)
+    clock: Callable[[], float] = time.monotonic
+    # instances and when they were created, least recently used first
+    _instances: OrderedDict[Hashable, tuple[float, Any]] = field(init=False, factory=OrderedDict)
+
+    def get[T](self, key: Hashable, factory: Callable[[], T]) -> T:
+        now = self.clock()
+        if (kept := self._instances.get(key)) is not None and now - kept[0] <= self.max_age:
+            self._instances.move_to_end(key)
+            self.stats.hits += 1
+            return kept[1]
+
+        self.stats.misses += 1
+        instance = factory()
+        self._instances[key] = (now, instance)
+        self._instances.move_to_end(key)
+        while len(self._instances) > self.max_instances:
+            self._instances.popitem(last=False)
+            self.stats.evictions += 1
+        return instance
+
+    def __len__(self) -> int:
+        return len(self._instances)
+
+    def describe(self) -> dict[str, Any]:
+        """Counts of the instances kept by kind, and the statistics of the disk caches among them"""
+        instances = [instance for _, instance in self._instances.values()]
+        return {
+            "kept": len(instances),
+            "max_instances": self.max_instances,
+            "max_age": self.max_age,
+            **asdict(self.stats),
+            "kinds": dict(Counter(key[0] for key in self._instances if isinstance(key, tuple))),
+            "caches": {
+                instance.namespace: asdict(instance.stats) for instance in instances if isinstance(instance, DiskCache)
+            },
+        }
+
+
+# set by a long running process while it answers a query
+warm_instances = ContextVar[WarmInstances | None]("warm_instances", default=None)
+
+
+def _warm[T](key: Hashable | None, factory: Callable[[], T]) -> T:
+    """A new instance from `factory`, or the one kept from an earlier query for the same `key` when it is not None"""
+    if key is None or (instances := warm_instances.get()) is None:
+        return factory()
+    return instances.get(key, factory)
+
+
+class LazyHandlers(Mapping[type[Query], QueryHandler]):
+    """Query handlers, each instantiated from the container when it is first looked up"""
+
+    def __init__(self, container: punq.Container):
+        self.container = container
+        self.handlers = dict[type[Query], QueryHandler]()
+
+    def __getitem__(self, query: type[Query]) -> QueryHandler:
+        if query not in self.handlers:
+            self.handlers[query] = self.container.instantiate(QueryHandler.registry[query])
+        return self.handlers[query]
+
+    def __iter__(self) -> Iterator[type[Query]]:
+        return iter(QueryHandler.registry)
+
+    def __len__(self) -> int:
+        return len(QueryHandler.registry)
+
+
+def bootstrap(  # noqa: PLR0913 - a keyword argument for each option of the CLI
     *,
     template_source: Path | ARN | None = None,
-    output_format: Literal["tree", "list", "iam"] | None = "list",
+    changes_only: bool = False,
+    output_format: Literal["tree", "list", "iam", "plain", "json", "ndjson", "summary"] | None = "list",
+    output_stream: IO[str] | None = None,
+    compact_policies: bool = False,
+    wildcard_access_levels: tuple[str, ...] = (),
+    cache_dir: Path | None = None,
+    use_cache: bool = True,
+    refresh_cache: bool = False,
+    concurrency: int = permissions_resolver.DEFAULT_MAX_WORKERS,
+    processes: int | None = None,
+    requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+    local_evaluation: bool = False,
+    policy_files: tuple[Path, ...] = (),
+    permissions_boundary: Path | None = None,
+    timings: TimingsProtocol | None = None,
+    api_calls: ApiCallsProtocol | None = None,
+    aws: AWS | None = None,
 ) -> Mapping[type[Query], QueryHandler]:
+    """Query handlers wired to adapters for these options.
+
+    With `timings`, eg a `Timings`, handlers and adapters record the time
+    spent in each stage of a query into it. With `api_calls`, eg an
+    `ApiCalls`, every AWS API call is recorded into it. `aws` replaces the
+    session clients are made from, eg with one whose clients are fakes.
+    """
     container = punq.Container()
+    container.register(TimingsProtocol, instance=timings or NoTimings())
 
-    _session = session.Session()
-    container.register(cloudformation.CloudFormationClient,
-                       instance=_session.client("cloudformation"))
-    container.register(iam.IAMClient, instance=_session.client("iam"))
-    container.register(sts.STSClient, instance=_session.client("sts"))
+    # instances kept between queries are only shared by those of the same AWS configuration
+    aws_environment = tuple(sorted((name, value) for name, value in os.environ.items() if name.startswith("AWS_")))
+    pool_connections = max(concurrency, 10)
+    if aws is None:
+        aws = _warm(("aws", aws_environment, pool_connections), lambda: AWS(max_pool_connections=pool_connections))
+    # a warm session records into the ApiCalls of the query at hand, the daemon runs one at a time
+    aws.api_calls = api_calls or NoApiCalls()
+    container.register(cloudformation.CloudFormationClient, instance=aws.client("cloudformation"))
+    container.register(iam.IAMClient, instance=aws.client("iam"))
+    container.register(sts.STSClient, instance=aws.client("sts"))
 
-    container.register(iam.IAMProtocol, iam.IAM)
-    container.register(sts.STSProtocol, sts.STS)
+    _register_iam(container, local_evaluation, policy_files, permissions_boundary)
 
+    # the snapshot is compiled into the cache, so it is only read when the cache is
+    snapshot = (cache_dir or default_cache_dir()) / REFERENCE_CACHE_NAMESPACE / REFERENCE_SNAPSHOT if use_cache else None
     container.register(
         ServiceAuthorizationReferenceProcotol,
-        ServiceAuthorizationReferenceLocal,
+        lambda: _warm(("reference", snapshot), lambda: load_reference(snapshot)),
+        scope=punq.Scope.singleton,
     )
 
+    _register_loaders(container, template_source, changes_only, processes)
+    container.register(
+        AccountStacksProtocol,
+        AccountStacksAdapter,
+        scope=punq.Scope.singleton,
+        rate_limiter=RateLimiter(rate=requests_per_second, burst=max(1, int(requests_per_second))),
+        max_workers=concurrency,
+    )
+    _register_caches(container, aws, cache_dir, use_cache, refresh_cache)
+
+    # a resolver holds every schema it resolved, refreshing needs a new one, as does recording timings
+    resolver_key = ("resolver", aws_environment, use_cache and (cache_dir or default_cache_dir()), concurrency)
+    container.register(
+        permissions_resolver.ResourceInformationResolverProtocol,
+        lambda: _warm(
+            None if refresh_cache or timings is not None else resolver_key,
+            lambda: container.instantiate(
+                permissions_resolver.ResourceInformationResolver, max_workers=concurrency
+            ),
+        ),
+        scope=punq.Scope.singleton,
+    )
+
+    _register_reporter(container, output_format, output_stream, compact_policies, wildcard_access_levels)
+    return LazyHandlers(container)
+
+
+def _register_iam(
+    container: punq.Container,
+    local_evaluation: bool,
+    policy_files: tuple[Path, ...],
+    permissions_boundary: Path | None,
+) -> None:
+    container.register(iam.IAM, iam.IAM, scope=punq.Scope.singleton)
+    if local_evaluation or policy_files:
+        container.register(
+            iam.IAMProtocol,
+            LocalIAM,
+            scope=punq.Scope.singleton,
+            policy_files=policy_files,
+            boundary_file=permissions_boundary,
+        )
+    else:
+        container.register(iam.IAMProtocol, iam.IAM, scope=punq.Scope.singleton)
+    container.register(sts.STSProtocol, sts.STS, scope=punq.Scope.singleton)
+
+
+def _register_loaders(
+    container: punq.Container, template_source: Path | ARN | None, changes_only: bool, processes: int | None
+) -> None:
     match template_source:
         case ARN() as stack if stack.resource.startswith("stack/"):
             container.register(
                 template_loader.TemplateResourceLoaderProtocol, template_loader.StackAdapter)
+        case ARN() as changeset if changeset.resource.startswith("changeSet/") and changes_only:
+            container.register(
+                template_loader.TemplateResourceLoaderProtocol, template_loader.ChangeSetChangesAdapter)
         case ARN() as changeset if changeset.resource.startswith("changeSet/"):
             container.register(
                 template_loader.TemplateResourceLoaderProtocol, template_loader.ChangeSetAdapter)
         case Path():
             container.register(
-                template_loader.TemplateResourceLoaderProtocol, template_loader.LocalAdapter)
+                template_loader.TemplateResourceLoaderProtocol, template_loader.LocalAdapter, max_processes=processes)
         case _:
             container.register(
-                template_loader.TemplateResourceLoaderProtocol, template_loader.LocalAdapter)
+                template_loader.TemplateResourceLoaderProtocol,
+                template_loader.TemplateSourceAdapter,
+                max_processes=processes,
+            )
 
-    container.register(
-        permissions_resolver.ResourceInformationResolverProtocol, permissions_resolver.ResourceInformationResolver
-    )
 
+def _register_caches(
+    container: punq.Container, aws: AWS, cache_dir: Path | None, use_cache: bool, refresh_cache: bool
+) -> None:
+    root = cache_dir or default_cache_dir()
+
+    def disk_cache(namespace: str, **limits: float | None) -> DiskCache:
+        return _warm(("cache", root, namespace), lambda: DiskCache(root=root, namespace=namespace, **limits))
+
+    if use_cache:
+        container.register(
+            schema_cache.SchemaCacheProtocol,
+            instance=schema_cache.DiskSchemaCache(
+                cache=disk_cache(
+                    schema_cache.SCHEMA_CACHE_NAMESPACE,
+                    ttl=schema_cache.SCHEMA_CACHE_TTL,
+                    max_bytes=schema_cache.SCHEMA_CACHE_MAX_BYTES,
+                ),
+                location=aws,
+                refresh=refresh_cache,
+            ),
+        )
+        container.register(
+            SimulationCacheProtocol,
+            instance=DiskSimulationCache(
+                cache=disk_cache(
+                    SIMULATION_CACHE_NAMESPACE, ttl=SIMULATION_CACHE_TTL, max_bytes=SIMULATION_CACHE_MAX_BYTES
+                ),
+                refresh=refresh_cache,
+            ),
+        )
+        container.register(
+            TemplateParseCacheProtocol,
+            instance=_warm(
+                None if refresh_cache else ("templates", root),
+                lambda: DiskTemplateParseCache(
+                    cache=disk_cache(TEMPLATE_CACHE_NAMESPACE, max_bytes=TEMPLATE_CACHE_MAX_BYTES),
+                    refresh=refresh_cache,
+                ),
+            ),
+        )
+    else:
+        container.register(schema_cache.SchemaCacheProtocol, schema_cache.NoSchemaCache)
+        container.register(SimulationCacheProtocol, NoSimulationCache)
+        container.register(TemplateParseCacheProtocol, NoTemplateParseCache)
+
+    # refreshing fetches every schema again, including those of types in the permission table
+    if refresh_cache:
+        container.register(permission_table.PermissionTableProtocol, permission_table.NoPermissionTable)
+    else:
+        container.register(
+            permission_table.PermissionTableProtocol,
+            instance=permission_table.DiskPermissionTable(
+                path=root / REFERENCE_CACHE_NAMESPACE / permission_table.PERMISSION_TABLE,
+                reference_source=reference_data_dir() / REFERENCE_SOURCE,
+                location=aws,
+            ),
+        )
+
+
+def _register_reporter(
+    container: punq.Container,
+    output_format: str | None,
+    output_stream: IO[str] | None,
+    compact_policies: bool,
+    wildcard_access_levels: tuple[str, ...],
+) -> None:
+    # reporters that write as they go rather than being rendered with rich
+    streaming = {} if output_stream is None else {"stream": output_stream}
     match output_format:
         case "list":
             container.register(Reporter, ListReporter)
         case "tree":
             container.register(Reporter, ResourceReporterTree)
+        case "iam" if compact_policies:
+            compactor = PolicyCompactor(
+                container.resolve(ServiceAuthorizationReferenceProcotol), access_levels=wildcard_access_levels
+            )
+            container.register(Reporter, IAMPolicyReporter, compactor=compactor)
         case "iam":
             container.register(Reporter, IAMPolicyReporter)
+        case "plain":
+            container.register(Reporter, PlainListReporter, **streaming)
+        case "json":
+            container.register(Reporter, JSONReporter, **streaming)
+        case "ndjson":
+            container.register(Reporter, JSONLinesReporter, **streaming)
+        case "summary":
+            container.register(Reporter, SummaryReporter)
         case _:
             container.register(Reporter, ListReporter)
-
-    return {Query: container.instantiate(Handler) for Query, Handler in QueryHandler.registry.items()}
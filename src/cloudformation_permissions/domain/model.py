@@ -1,3 +1,4 @@
+from collections.abc import Set as AbstractSet
 from enum import StrEnum, auto
 from pathlib import Path
 from typing import ClassVar, NewType, Self
@@ -43,6 +44,11 @@ class PermissionsLevels(StrEnum):
     READ = auto()
     MODIFY = auto()
     FULL = auto()
+    # the handlers run for a single change of a ChangeSet
+    CREATE = auto()
+    UPDATE = auto()
+    DELETE = auto()
+    REPLACE = auto()
 
 
 ResourceTypeName = str
@@ -59,12 +65,30 @@ class ActionPermission:
 class ShortResourceInfo:
     TypeName: str
     LogicalId: str
+    # resolved at this level rather than the query's, eg the level a ChangeSet's change of the resource needs
+    PermissionLevel: str | None = None
+
+
+@frozen
+class StackResources:
+    """One page of the resources of a Stack, `complete` once the Stack's last page has been listed"""
+
+    stack: ARN
+    resources: list[ShortResourceInfo]
+    complete: bool
 
 
 @frozen
 class ResourcePermissionSummary:
     resource_type: ResourceTypeName
-    permissions: list[ActionPermission]
+    # the actions needed, usually a `PermissionSet`, or once verified each action with its decision
+    permissions: AbstractSet[str] | list[ActionPermission]
+
+
+@frozen
+class ResolutionStatistics:
+    resources: int = 0
+    distinct_resources: int = 0
 
 
 @frozen
@@ -72,3 +96,17 @@ class TemplateSummary:
     source: ARN | Path
     resources: dict[str, ResourcePermissionSummary]
     failures: list[str]
+    statistics: ResolutionStatistics = field(factory=ResolutionStatistics)
+    # seconds spent in each stage of summarising the template
+    timings: dict[str, float] = field(factory=dict)
+
+
+@frozen
+class TemplateError:
+    source: ARN | Path
+    error: str
+
+
+@frozen
+class BatchSummary:
+    templates: list[TemplateSummary | TemplateError]
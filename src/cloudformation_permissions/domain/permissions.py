@@ -0,0 +1,153 @@
+"""Sets of actions held as bitsets of interned action IDs.
+
+Every action name a run resolves is interned once by `ActionIds`, which
+numbers names densely as they are first seen. A `PermissionSet` is then a
+single integer with one bit per action, so unions, intersections and
+differences between the permissions of resources or handlers are integer
+operations over machine words, and summaries resolved from the same handlers
+share one small object. Names are only looked up again when a set is
+iterated, as reporters do, and are the interned strings themselves.
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+from collections.abc import Iterable, Iterator
+from collections.abc import Set as AbstractSet
+from typing import Any
+
+
+class ActionIds:
+    """Dense integer IDs of action names, numbered in the order they are first interned"""
+
+    def __init__(self):
+        self._ids = dict[str, int]()
+        self._names = list[str]()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def get(self, name: str) -> int | None:
+        """The ID of `name`, None when it was never interned"""
+        return self._ids.get(name)
+
+    def intern(self, name: str) -> int:
+        if (action_id := self._ids.get(name)) is None:
+            with self._lock:
+                if (action_id := self._ids.get(name)) is None:
+                    action_id = len(self._names)
+                    self._names.append(sys.intern(name))
+                    self._ids[name] = action_id
+        return action_id
+
+    def name(self, action_id: int) -> str:
+        return self._names[action_id]
+
+    def bits(self, names: Iterable[str]) -> int:
+        """The bitset of `names`, interning those seen for the first time"""
+        bits = 0
+        for name in names:
+            bits |= 1 << self.intern(name)
+        return bits
+
+
+class PermissionSet(AbstractSet[str]):
+    """An immutable set of action names, stored as a bitset of their `ActionIds`.
+
+    Set operations between permission sets of the same `ActionIds` combine
+    the bitsets directly, any other operand is compared name by name. Sets
+    iterate their names sorted, and hash and compare equal to a `frozenset`
+    of the same names.
+    """
+
+    __slots__ = ("_hash_value", "_names", "bits", "ids")
+
+    def __init__(self, ids: ActionIds, bits: int = 0):
+        self.ids = ids
+        self.bits = bits
+        self._hash_value: int | None = None
+        self._names: tuple[str, ...] | None = None
+
+    @classmethod
+    def of(cls, ids: ActionIds, names: Iterable[str]) -> PermissionSet:
+        return cls(ids, ids.bits(names))
+
+    def _from_iterable(self, names: Iterable[str]) -> PermissionSet:
+        return PermissionSet.of(self.ids, names)
+
+    def _shares_ids(self, other: Any) -> bool:
+        return isinstance(other, PermissionSet) and other.ids is self.ids
+
+    def __contains__(self, name: object) -> bool:
+        action_id = self.ids.get(name) if isinstance(name, str) else None
+        return action_id is not None and bool(self.bits >> action_id & 1)
+
+    def names(self) -> tuple[str, ...]:
+        """The names of the set, sorted, looked up the first time they are asked for"""
+        if self._names is None:
+            names = []
+            bits = self.bits
+            while bits:
+                lowest = bits & -bits
+                names.append(self.ids.name(lowest.bit_length() - 1))
+                bits ^= lowest
+            self._names = tuple(sorted(names))
+        return self._names
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names())
+
+    def __len__(self) -> int:
+        return self.bits.bit_count()
+
+    def __or__(self, other: Any) -> Any:
+        if self._shares_ids(other):
+            return PermissionSet(self.ids, self.bits | other.bits)
+        return super().__or__(other)
+
+    def __and__(self, other: Any) -> Any:
+        if self._shares_ids(other):
+            return PermissionSet(self.ids, self.bits & other.bits)
+        return super().__and__(other)
+
+    def __sub__(self, other: Any) -> Any:
+        if self._shares_ids(other):
+            return PermissionSet(self.ids, self.bits & ~other.bits)
+        return super().__sub__(other)
+
+    def __xor__(self, other: Any) -> Any:
+        if self._shares_ids(other):
+            return PermissionSet(self.ids, self.bits ^ other.bits)
+        return super().__xor__(other)
+
+    def __le__(self, other: Any) -> bool:
+        if self._shares_ids(other):
+            return self.bits & ~other.bits == 0
+        return super().__le__(other)
+
+    def __ge__(self, other: Any) -> bool:
+        if self._shares_ids(other):
+            return other.bits & ~self.bits == 0
+        return super().__ge__(other)
+
+    def __eq__(self, other: object) -> bool:
+        if self._shares_ids(other):
+            return self.bits == other.bits
+        return super().__eq__(other)
+
+    def __hash__(self) -> int:
+        if self._hash_value is None:
+            self._hash_value = hash(frozenset(self))
+        return self._hash_value
+
+    def __repr__(self) -> str:
+        return f"PermissionSet({list(self.names())!r})"
+
+    @classmethod
+    def union_of(cls, ids: ActionIds, sets: Iterable[PermissionSet]) -> PermissionSet:
+        bits = 0
+        for permission_set in sets:
+            bits |= permission_set.bits
+        return cls(ids, bits)
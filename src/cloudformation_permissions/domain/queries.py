@@ -32,3 +32,20 @@ class VerifyTemplatePermissions(Query):
     TemplateSource: ARN | Path
     Role: ARN | None
     PermissionLevel: str
+
+
+@frozen
+class ListTemplateBatchPermissions(Query):
+    TemplateSources: tuple[ARN | Path, ...]
+    PermissionLevel: str
+    MaxWorkers: int = 8
+
+
+@frozen
+class ListAccountPermissions(Query):
+    """Stacks defaults to every Stack in the account and region"""
+
+    PermissionLevel: str
+    Stacks: tuple[ARN, ...] = ()
+    FollowNested: bool = True
+    MaxWorkers: int = 8
@@ -0,0 +1,133 @@
+"""Programmatic access to the queries the CLI runs."""
+
+from __future__ import annotations
+
+import glob
+import sys
+from collections.abc import Iterable
+from pathlib import Path
+
+from result import Err, Ok
+
+from ..adapters.permissions_resolver import DEFAULT_MAX_WORKERS
+from ..adapters.telemetry import ApiCallsProtocol
+from ..adapters.template_loader.stacks import DEFAULT_REQUESTS_PER_SECOND
+from ..adapters.timings import TimingsProtocol
+from ..bootstrap import bootstrap
+from ..domain import queries
+from ..domain.model import ARN, BatchSummary, TemplateError, TemplateSummary
+
+TEMPLATE_SUFFIXES = (".yaml", ".yml", ".json", ".template")
+
+
+def parse_template_source(template_source: str) -> ARN | Path:
+    if template_source.startswith(f"{ARN.domain}:"):
+        return ARN.from_str(template_source)
+    return Path(template_source)
+
+
+def _read_source_list(lines: Iterable[str]) -> list[str]:
+    return [stripped for line in lines if (stripped := line.strip()) and not stripped.startswith("#")]
+
+
+def expand_template_sources(inputs: Iterable[str]) -> list[ARN | Path]:
+    """Expand CLI style inputs into template sources.
+
+    Each input may be a Stack or ChangeSet ARN, a local template, a directory
+    searched recursively for templates, a glob, `@FILE` naming a file with one
+    input per line, or `-` to read inputs one per line from stdin.
+    """
+    sources = dict[ARN | Path, None]()
+    for template_input in inputs:
+        if template_input == "-":
+            sources.update(dict.fromkeys(expand_template_sources(_read_source_list(sys.stdin))))
+        elif template_input.startswith("@"):
+            lines = Path(template_input[1:]).read_text().splitlines()
+            sources.update(dict.fromkeys(expand_template_sources(_read_source_list(lines))))
+        elif template_input.startswith(f"{ARN.domain}:"):
+            sources[ARN.from_str(template_input)] = None
+        elif (path := Path(template_input)).is_dir():
+            templates = sorted(found for found in path.rglob("*") if found.suffix in TEMPLATE_SUFFIXES)
+            sources.update(dict.fromkeys(templates))
+        elif glob.has_magic(template_input):
+            sources.update(dict.fromkeys(Path(found) for found in sorted(glob.glob(template_input, recursive=True))))
+        else:
+            sources[path] = None
+    return list(sources)
+
+
+def list_template_batch_permissions(  # noqa: PLR0913 - keyword arguments mirroring the CLI options
+    template_sources: Iterable[str | ARN | Path],
+    permission_level: str = "full",
+    *,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    processes: int | None = None,
+    cache_dir: Path | None = None,
+    use_cache: bool = True,
+    timings: TimingsProtocol | None = None,
+    api_calls: ApiCallsProtocol | None = None,
+) -> list[TemplateSummary | TemplateError]:
+    """Resolve the permissions of many templates in one process, one result per template.
+
+    With `timings`, eg a `Timings`, the time spent in each stage is recorded into it,
+    with `api_calls`, eg an `ApiCalls`, every AWS API call.
+    """
+    sources = tuple(
+        parse_template_source(source) if isinstance(source, str) else source for source in template_sources
+    )
+    query = queries.ListTemplateBatchPermissions(
+        TemplateSources=sources, PermissionLevel=permission_level, MaxWorkers=max_workers
+    )
+    handlers = bootstrap(
+        output_format="summary",
+        cache_dir=cache_dir,
+        use_cache=use_cache,
+        concurrency=max_workers,
+        processes=processes,
+        timings=timings,
+        api_calls=api_calls,
+    )
+
+    match handlers[type(query)](query):
+        case Ok(report):
+            batch: BatchSummary = report.summaries[-1]
+            return batch.templates
+        case Err(error):
+            raise RuntimeError(error)
+
+
+def list_account_permissions(  # noqa: PLR0913 - keyword arguments mirroring the CLI options
+    stacks: Iterable[str | ARN] = (),
+    permission_level: str = "full",
+    *,
+    follow_nested: bool = True,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+    cache_dir: Path | None = None,
+    use_cache: bool = True,
+    timings: TimingsProtocol | None = None,
+    api_calls: ApiCallsProtocol | None = None,
+) -> list[TemplateSummary | TemplateError]:
+    """Resolve the permissions of `stacks`, or of every Stack in the account and region, one result per Stack"""
+    query = queries.ListAccountPermissions(
+        PermissionLevel=permission_level,
+        Stacks=tuple(ARN.from_str(stack) if isinstance(stack, str) else stack for stack in stacks),
+        FollowNested=follow_nested,
+        MaxWorkers=max_workers,
+    )
+    handlers = bootstrap(
+        output_format="summary",
+        cache_dir=cache_dir,
+        use_cache=use_cache,
+        concurrency=max_workers,
+        requests_per_second=requests_per_second,
+        timings=timings,
+        api_calls=api_calls,
+    )
+
+    match handlers[type(query)](query):
+        case Ok(report):
+            batch: BatchSummary = report.summaries[-1]
+            return batch.templates
+        case Err(error):
+            raise RuntimeError(error)
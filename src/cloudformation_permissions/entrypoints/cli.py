@@ -1,27 +1,307 @@
 from __future__ import annotations
 
+import cProfile
+import fnmatch
+import json
+import logging
 import sys
+from collections.abc import Mapping
+from datetime import UTC, datetime
 from logging import getLogger
 from pathlib import Path
-from typing import Literal
+from typing import Literal, TextIO
 
 import click
+from click.core import ParameterSource
 from result import Err, Ok
 from rich.console import Console
-
-from ..bootstrap import bootstrap
+from rich.table import Table
+
+from ..adapters.aws import AWS
+from ..adapters.cache import CACHE_DIR_ENV, DiskCache, default_cache_dir
+from ..adapters.permissions_resolver import DEFAULT_MAX_WORKERS, HANDLER_TYPES, handlers_permission_level
+from ..adapters.permissions_resolver.permission_table import (
+    PERMISSION_TABLE,
+    build_permission_table,
+    download_schemas,
+    read_schemas,
+)
+from ..adapters.permissions_resolver.schema_cache import SCHEMA_CACHE_NAMESPACE, SchemaLocation
+from ..adapters.policy_compaction import MANAGED_POLICY_MAX_SIZE
+from ..adapters.reporter import StreamingReporter
+from ..adapters.sar import (
+    REFERENCE_CACHE_NAMESPACE,
+    REFERENCE_SNAPSHOT,
+    REFERENCE_SOURCE,
+    ServiceAuthorizationReferenceLocal,
+    reference_data_dir,
+)
+from ..adapters.sar_snapshot import build_snapshot
+from ..adapters.simulation_cache import SIMULATION_CACHE_NAMESPACE
+from ..adapters.telemetry import METRICS_FORMATS, ApiCalls
+from ..adapters.template_loader.parse_cache import TEMPLATE_CACHE_NAMESPACE
+from ..adapters.template_loader.stacks import DEFAULT_REQUESTS_PER_SECOND
+from ..adapters.timings import NO_TIMINGS, Timings
+from ..bootstrap import DEFAULT_MAX_AGE, DEFAULT_MAX_INSTANCES, WarmInstances, bootstrap
 from ..domain import queries
 from ..domain.model import ARN
+from ..domain.queries import Query
+from ..service import QueryHandler
+from .api import expand_template_sources
+from .daemon import SOCKET_ENV, Daemon, DaemonError, default_socket_path, request
 
 logger = getLogger(__name__)
 
-OUTPUT_FORMATS = ("list", "tree", "iam")
+# plain, json and ndjson are written as each template is resolved, rather than rendered once every template is
+OUTPUT_FORMATS = ("list", "tree", "iam", "plain", "json", "ndjson")
 PERMISSION_LEVELS = ("read", "modify", "full")
+TIMINGS_FORMATS = ("table", "json")
+# resource types listed in the timings table, the slowest first
+TIMINGS_RESOURCE_TYPES = 10
+ACCESS_LEVELS = ("List", "Read", "Write", "Permissions Management", "Tagging")
+CACHE_NAMESPACES = {
+    SCHEMA_CACHE_NAMESPACE: "resource provider schemas",
+    SIMULATION_CACHE_NAMESPACE: "policy simulation decisions per role",
+    TEMPLATE_CACHE_NAMESPACE: "resources parsed from local templates",
+}
+
+
+def print_report(report, output_file: TextIO | None = None) -> None:
+    """Render `report` with rich, or finish writing it when it was written as it was built"""
+    if isinstance(report, StreamingReporter):
+        report.finish()
+    else:
+        Console(file=output_file).print(report)
+
+
+def print_timings(timings: Timings, timings_format: Literal["table", "json"]) -> None:
+    """Write where the time of a run went to stderr"""
+    if timings_format == "json":
+        click.echo(json.dumps(timings.as_dict(), indent=2), err=True)
+        return
+
+    recorded = timings.as_dict()
+    elapsed = recorded["elapsed"]
+    stages = Table("stage", "calls", "wall s", "cpu s", "share", title=f"{elapsed:.3f}s")
+    for name, stage in recorded["stages"].items():
+        share = f"{stage['wall'] / elapsed:.0%}"
+        stages.add_row(name, str(stage["calls"]), f"{stage['wall']:.3f}", f"{stage['cpu']:.3f}", share)
+    other = elapsed - sum(stage["wall"] for stage in recorded["stages"].values())
+    stages.add_row("other", "", f"{other:.3f}", "", f"{other / elapsed:.0%}")
+    renderables: list[Table] = [stages]
+
+    if recorded["resource_types"]:
+        resource_types = Table("resource type", "resources", "schema s", "from")
+        for type_name, cost in list(recorded["resource_types"].items())[:TIMINGS_RESOURCE_TYPES]:
+            resource_types.add_row(type_name, str(cost["resources"]), f"{cost['seconds']:.3f}", cost["source"] or "")
+        renderables.append(resource_types)
+    if recorded["caches"]:
+        caches = Table("cache", "hits", "misses")
+        for name, counts in recorded["caches"].items():
+            caches.add_row(name, str(counts["hits"]), str(counts["misses"]))
+        renderables.append(caches)
+    Console(stderr=True).print(*renderables)
+
+
+def write_api_metrics(api_calls: ApiCalls, path: Path, metrics_format: Literal["prometheus", "json"]) -> None:
+    """Write the AWS API calls of a run to `path`, or to stderr for -"""
+    if str(path) == "-":
+        click.echo(api_calls.export(metrics_format), err=True, nl=False)
+        return
+    # replaced in one step, so that collectors reading the file never see half of it
+    partial = path.with_name(f".{path.name}.tmp")
+    partial.write_text(api_calls.export(metrics_format))
+    partial.replace(path)
+
+
+def run_query(
+    handlers: Mapping[type[Query], QueryHandler],
+    query: Query,
+    output_file: TextIO | None = None,
+    *,
+    timings: Timings | None = None,
+    timings_format: Literal["table", "json"] | None = None,
+    profile_path: Path | None = None,
+    api_calls: ApiCalls | None = None,
+    api_metrics_path: Path | None = None,
+    api_metrics_format: Literal["prometheus", "json"] = "prometheus",
+) -> None:
+    """Handle `query` and print its report, then the timings and AWS API calls of the run when they were recorded"""
+    profiler = cProfile.Profile() if profile_path is not None else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        report_result = handlers[type(query)](query)
+        if isinstance(report_result, Ok):
+            with (timings or NO_TIMINGS).stage("report"):
+                print_report(report_result.ok_value, output_file)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        if timings is not None and timings_format is not None:
+            print_timings(timings, timings_format)
+        if api_calls is not None and api_metrics_path is not None:
+            write_api_metrics(api_calls, api_metrics_path, api_metrics_format)
+
+    if isinstance(report_result, Err):
+        logger.error(report_result.err_value)
+        sys.exit(1)
+
+
+def cache_options(command):
+    """Options controlling the on-disk resource schema cache"""
+    command = click.option(
+        "--refresh-cache", is_flag=True, help="Fetch resource schemas again and replace cached entries"
+    )(command)
+    command = click.option("--no-cache", is_flag=True, help="Neither read nor write the resource schema cache")(command)
+    return click.option(
+        "--cache-dir",
+        type=click.Path(file_okay=False, path_type=Path),
+        envvar=CACHE_DIR_ENV,
+        help="Directory for cached resource schemas, defaults to ~/.cache/cloudformation-permissions",
+    )(command)
+
+
+def timing_options(command):
+    """Options recording where the time of a run goes, and the AWS API calls it makes"""
+    command = click.option(
+        "--api-metrics-format",
+        type=click.Choice(METRICS_FORMATS),
+        default="prometheus",
+        show_default=True,
+        help="Format of the file written with --api-metrics",
+    )(command)
+    command = click.option(
+        "--api-metrics",
+        "api_metrics_path",
+        type=click.Path(dir_okay=False, allow_dash=True, path_type=Path),
+        help="Write the calls, retries, throttles, errors and latencies of each AWS API operation to this file, or -",
+    )(command)
+    command = click.option(
+        "--profile",
+        "profile_path",
+        type=click.Path(dir_okay=False, path_type=Path),
+        help="Write a cProfile dump of the run to this file, read it with python -m pstats",
+    )(command)
+    return click.option(
+        "--timings",
+        "timings_format",
+        type=click.Choice(TIMINGS_FORMATS),
+        is_flag=False,
+        flag_value="table",
+        default=None,
+        help="Print the time spent loading, parsing, resolving, simulating and reporting to stderr",
+    )(command)
+
+
+def evaluation_options(command):
+    """Options evaluating policies locally instead of with the IAM policy simulator"""
+    command = click.option(
+        "--permissions-boundary",
+        type=click.Path(exists=True, dir_okay=False, path_type=Path),
+        help="Policy document limiting the policies given with --policy",
+    )(command)
+    command = click.option(
+        "--policy",
+        "policies",
+        multiple=True,
+        type=click.Path(exists=True, dir_okay=False, path_type=Path),
+        help="Identity policy document to evaluate locally in place of the role's policies, may be repeated",
+    )(command)
+    return click.option(
+        "--local",
+        is_flag=True,
+        help="Fetch the role's policies once and evaluate them locally instead of calling the IAM policy simulator",
+    )(command)
+
+
+def compaction_options(command):
+    """Options compacting the policies of --output iam"""
+    command = click.option(
+        "--wildcard-access-level",
+        "wildcard_access_levels",
+        multiple=True,
+        type=click.Choice(ACCESS_LEVELS),
+        help="Let compacted wildcards also allow actions of this access level, may be repeated",
+    )(command)
+    return click.option(
+        "--compact",
+        is_flag=True,
+        help=(
+            "With --output iam, replace actions with wildcards and split them into policies "
+            f"under {MANAGED_POLICY_MAX_SIZE} characters"
+        ),
+    )(command)
+
+
+output_file_option = click.option(
+    "--output-file",
+    type=click.File("w"),
+    help="Write the report to this file rather than stdout",
+)
+
+
+def _parse_handlers(ctx: click.Context, param: click.Parameter, value: str | None) -> str | None:
+    if value is None:
+        return None
+    handler_types = {handler.strip() for handler in value.split(",") if handler.strip()}
+    if unknown := handler_types - set(HANDLER_TYPES):
+        raise click.BadParameter(f"{', '.join(sorted(unknown))} not one of {', '.join(HANDLER_TYPES)}")
+    if not handler_types:
+        raise click.BadParameter("name at least one handler")
+    return handlers_permission_level(handler_types)
+
+
+handlers_option = click.option(
+    "--handlers",
+    "handler_types",
+    callback=_parse_handlers,
+    metavar="HANDLER[,HANDLER...]",
+    help=f"Only the permissions of these handlers, of {', '.join(HANDLER_TYPES)}, in place of --permission-level",
+)
+
+changes_only_option = click.option(
+    "--changes-only",
+    is_flag=True,
+    help="For a ChangeSet, only resolve the resources it adds, modifies or removes, at the level each change needs",
+)
+
+concurrency_option = click.option(
+    "--concurrency",
+    default=DEFAULT_MAX_WORKERS,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Maximum number of resource schemas fetched at the same time",
+)
+
+
+def _check_changes_only(template_source: ARN | Path, changes_only: bool) -> None:
+    if changes_only and not (isinstance(template_source, ARN) and template_source.resource.startswith("changeSet/")):
+        raise click.UsageError("--changes-only needs the ARN of a ChangeSet")
+
+
+def _permission_level(handler_types: str | None, permission_level: str, changes_only: bool = False) -> str:
+    """The level of --handlers, or of --permission-level, rejecting options that would be ignored"""
+    ctx = click.get_current_context()
+    explicit_level = ctx.get_parameter_source("permission_level") is not ParameterSource.DEFAULT
+    if changes_only and (explicit_level or handler_types is not None):
+        raise click.UsageError("--changes-only resolves each change at the level it needs, give no other level")
+    if handler_types is None:
+        return permission_level
+    if explicit_level:
+        raise click.UsageError("--handlers is used in place of --permission-level, give only one")
+    return handler_types
 
 
 @click.group()
-def cli():
+@click.option("-v", "--verbose", count=True, help="Log more, repeat for debug logs")
+def cli(verbose: int):
     """Get Permissions for CloudFormation Stacks and Resources"""
+    if verbose:
+        logging.basicConfig(
+            level=logging.INFO if verbose == 1 else logging.DEBUG, format="%(levelname)s %(name)s: %(message)s"
+        )
 
 
 @cli.group()
@@ -37,56 +317,111 @@ def resource(ctx, resource_type: str) -> None:
 
 @resource.command("permissions")
 @click.option("--output", default="list", type=click.Choice(OUTPUT_FORMATS))
+@output_file_option
+@compaction_options
 @click.option("--permission-level", default="full", type=click.Choice(PERMISSION_LEVELS))
+@handlers_option
+@cache_options
+@timing_options
 @click.pass_obj
 def resource_permissions(
     resource_type: str,
-    output: Literal["list", "tree"],
+    output: Literal["list", "tree", "iam", "plain", "json", "ndjson"],
+    output_file: TextIO | None,
+    compact: bool,
+    wildcard_access_levels: tuple[str, ...],
     permission_level: Literal["read", "modify", "full"],
+    handler_types: str | None,
+    cache_dir: Path | None,
+    no_cache: bool,
+    refresh_cache: bool,
+    timings_format: Literal["table", "json"] | None,
+    profile_path: Path | None,
+    api_metrics_path: Path | None,
+    api_metrics_format: Literal["prometheus", "json"],
 ) -> None:
     """List of IAM Permissons required to manage this RESOURCE_TYPE"""
     query = queries.ListResourceTypePermissions(
-        ResourceType=resource_type, PermissionLevel=permission_level)
-
-    handlers = bootstrap(output_format=output)
-    handler = handlers[type(query)]
+        ResourceType=resource_type, PermissionLevel=_permission_level(handler_types, permission_level))
 
-    report_result = handler(query)
-
-    match report_result:
-        case Ok(report):
-            Console().print(report)
-        case Err(e):
-            logger.error(e)
-            sys.exit(1)
+    timings = Timings() if timings_format else None
+    api_calls = ApiCalls() if api_metrics_path else None
+    handlers = bootstrap(
+        output_format=output,
+        output_stream=output_file,
+        compact_policies=compact,
+        wildcard_access_levels=wildcard_access_levels,
+        cache_dir=cache_dir,
+        use_cache=not no_cache,
+        refresh_cache=refresh_cache,
+        timings=timings,
+        api_calls=api_calls,
+    )
+    run_query(
+        handlers,
+        query,
+        output_file,
+        timings=timings,
+        timings_format=timings_format,
+        profile_path=profile_path,
+        api_calls=api_calls,
+        api_metrics_path=api_metrics_path,
+        api_metrics_format=api_metrics_format,
+    )
 
 
 @resource.command("verify")
 @click.argument("role-arn", required=False)
 @click.option("--permission-level", default="full", type=click.Choice(PERMISSION_LEVELS))
+@handlers_option
+@cache_options
+@timing_options
+@evaluation_options
 @click.pass_obj
 def resource_verify(
     resource_type: str,
     role_arn: str | None,
     permission_level: Literal["read", "modify", "full"],
+    handler_types: str | None,
+    cache_dir: Path | None,
+    no_cache: bool,
+    refresh_cache: bool,
+    timings_format: Literal["table", "json"] | None,
+    profile_path: Path | None,
+    api_metrics_path: Path | None,
+    api_metrics_format: Literal["prometheus", "json"],
+    local: bool,
+    policies: tuple[Path, ...],
+    permissions_boundary: Path | None,
 ):
     """Verify ROLE_ARN can manage this RESOURCE_TYPE"""
     _role_arn = ARN.from_str(role_arn) if role_arn is not None else role_arn
     query = queries.VerifyResourceTypePermissions(
-        ResourceType=resource_type, Role=_role_arn, PermissionLevel=permission_level
+        ResourceType=resource_type, Role=_role_arn, PermissionLevel=_permission_level(handler_types, permission_level)
     )
 
-    handlers = bootstrap()
-    handler = handlers[type(query)]
-
-    report_result = handler(query)
-
-    match report_result:
-        case Ok(report):
-            Console().print(report)
-        case Err(e):
-            logger.error(e)
-            sys.exit(1)
+    timings = Timings() if timings_format else None
+    api_calls = ApiCalls() if api_metrics_path else None
+    handlers = bootstrap(
+        cache_dir=cache_dir,
+        use_cache=not no_cache,
+        refresh_cache=refresh_cache,
+        local_evaluation=local,
+        policy_files=policies,
+        permissions_boundary=permissions_boundary,
+        timings=timings,
+        api_calls=api_calls,
+    )
+    run_query(
+        handlers,
+        query,
+        timings=timings,
+        timings_format=timings_format,
+        profile_path=profile_path,
+        api_calls=api_calls,
+        api_metrics_path=api_metrics_path,
+        api_metrics_format=api_metrics_format,
+    )
 
 
 @cli.group()
@@ -106,42 +441,100 @@ def template(
 
 @template.command("permissions")
 @click.option("--output", default="list", type=click.Choice(OUTPUT_FORMATS))
+@output_file_option
+@compaction_options
 @click.option("--permission-level", default="full", type=click.Choice(PERMISSION_LEVELS))
+@handlers_option
+@changes_only_option
+@cache_options
+@timing_options
+@concurrency_option
 @click.pass_obj
 def template_permissions(
     template_source: str,
-    output: Literal["list", "tree"],
+    output: Literal["list", "tree", "iam", "plain", "json", "ndjson"],
+    output_file: TextIO | None,
+    compact: bool,
+    wildcard_access_levels: tuple[str, ...],
     permission_level: Literal["read", "modify", "full"],
+    handler_types: str | None,
+    changes_only: bool,
+    cache_dir: Path | None,
+    no_cache: bool,
+    refresh_cache: bool,
+    timings_format: Literal["table", "json"] | None,
+    profile_path: Path | None,
+    api_metrics_path: Path | None,
+    api_metrics_format: Literal["prometheus", "json"],
+    concurrency: int,
 ) -> None:
     """List permissions required to manage Stacks of this Template"""
     _template_source = (
         ARN.from_str(template_source) if template_source.startswith(
             f"{ARN.domain}:") else Path(template_source)
     )
+    _check_changes_only(_template_source, changes_only)
 
     query = queries.ListTemplatePermissions(
-        TemplateSource=_template_source, PermissionLevel=permission_level)
+        TemplateSource=_template_source,
+        PermissionLevel=_permission_level(handler_types, permission_level, changes_only),
+    )
 
+    timings = Timings() if timings_format else None
+    api_calls = ApiCalls() if api_metrics_path else None
     handlers = bootstrap(
-        template_source=query.TemplateSource, output_format=output)
-    handler = handlers[type(query)]
-
-    report_result = handler(query)
-    match report_result:
-        case Ok(report):
-            Console().print(report)
-        case Err(e):
-            logger.error(e)
-            sys.exit(1)
+        template_source=query.TemplateSource,
+        changes_only=changes_only,
+        output_format=output,
+        output_stream=output_file,
+        compact_policies=compact,
+        wildcard_access_levels=wildcard_access_levels,
+        cache_dir=cache_dir,
+        use_cache=not no_cache,
+        refresh_cache=refresh_cache,
+        concurrency=concurrency,
+        timings=timings,
+        api_calls=api_calls,
+    )
+    run_query(
+        handlers,
+        query,
+        output_file,
+        timings=timings,
+        timings_format=timings_format,
+        profile_path=profile_path,
+        api_calls=api_calls,
+        api_metrics_path=api_metrics_path,
+        api_metrics_format=api_metrics_format,
+    )
 
 
 @template.command("verify")
 @click.argument("role-arn", required=False)
 @click.option("--permission-level", default="full", type=click.Choice(PERMISSION_LEVELS))
+@handlers_option
+@changes_only_option
+@cache_options
+@timing_options
+@concurrency_option
+@evaluation_options
 @click.pass_obj
 def template_verify(
     template_source: str,
     permission_level: Literal["read", "modify", "full"],
+    handler_types: str | None,
+    changes_only: bool,
+    cache_dir: Path | None,
+    no_cache: bool,
+    refresh_cache: bool,
+    timings_format: Literal["table", "json"] | None,
+    profile_path: Path | None,
+    api_metrics_path: Path | None,
+    api_metrics_format: Literal["prometheus", "json"],
+    concurrency: int,
+    local: bool,
+    policies: tuple[Path, ...],
+    permissions_boundary: Path | None,
     role_arn: str | None = None,
 ) -> None:
     """Verify ROLE_ARN
@@ -153,20 +546,367 @@ def template_verify(
         ARN.from_str(template_source) if template_source.startswith(
             f"{ARN.domain}:") else Path(template_source)
     )
+    _check_changes_only(_template_source, changes_only)
 
     query = queries.VerifyTemplatePermissions(
         TemplateSource=_template_source,
         Role=_role_arn,
-        PermissionLevel=permission_level,
+        PermissionLevel=_permission_level(handler_types, permission_level, changes_only),
+    )
+
+    timings = Timings() if timings_format else None
+    api_calls = ApiCalls() if api_metrics_path else None
+    handlers = bootstrap(
+        template_source=query.TemplateSource,
+        changes_only=changes_only,
+        cache_dir=cache_dir,
+        use_cache=not no_cache,
+        refresh_cache=refresh_cache,
+        concurrency=concurrency,
+        local_evaluation=local,
+        policy_files=policies,
+        permissions_boundary=permissions_boundary,
+        timings=timings,
+        api_calls=api_calls,
+    )
+    run_query(
+        handlers,
+        query,
+        timings=timings,
+        timings_format=timings_format,
+        profile_path=profile_path,
+        api_calls=api_calls,
+        api_metrics_path=api_metrics_path,
+        api_metrics_format=api_metrics_format,
+    )
+
+
+@cli.command("template-batch")
+@click.argument("inputs", nargs=-1, required=True)
+@click.option("--output", default="list", type=click.Choice(OUTPUT_FORMATS))
+@output_file_option
+@compaction_options
+@click.option("--permission-level", default="full", type=click.Choice(PERMISSION_LEVELS))
+@handlers_option
+@cache_options
+@timing_options
+@concurrency_option
+@click.option(
+    "--processes",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of processes parsing local templates, defaults to one per core",
+)
+def template_batch(
+    inputs: tuple[str, ...],
+    output: Literal["list", "tree", "iam", "plain", "json", "ndjson"],
+    output_file: TextIO | None,
+    compact: bool,
+    wildcard_access_levels: tuple[str, ...],
+    permission_level: Literal["read", "modify", "full"],
+    handler_types: str | None,
+    cache_dir: Path | None,
+    no_cache: bool,
+    refresh_cache: bool,
+    timings_format: Literal["table", "json"] | None,
+    profile_path: Path | None,
+    api_metrics_path: Path | None,
+    api_metrics_format: Literal["prometheus", "json"],
+    concurrency: int,
+    processes: int | None,
+) -> None:
+    """List permissions required to manage Stacks of many Templates
+
+    Each of INPUTS may be the ARN of a Stack or ChangeSet, a template file, a
+    directory searched for templates, a glob, @FILE to read inputs from FILE,
+    one per line, or - to read them from stdin
+    """
+    try:
+        template_sources = expand_template_sources(inputs)
+    except OSError as error:
+        raise click.BadParameter(f"{error.filename}: {error.strerror}", param_hint="INPUTS") from error
+    query = queries.ListTemplateBatchPermissions(
+        TemplateSources=tuple(template_sources),
+        PermissionLevel=_permission_level(handler_types, permission_level),
+        MaxWorkers=concurrency,
+    )
+
+    timings = Timings() if timings_format else None
+    api_calls = ApiCalls() if api_metrics_path else None
+    handlers = bootstrap(
+        output_format=output,
+        output_stream=output_file,
+        compact_policies=compact,
+        wildcard_access_levels=wildcard_access_levels,
+        cache_dir=cache_dir,
+        use_cache=not no_cache,
+        refresh_cache=refresh_cache,
+        concurrency=concurrency,
+        processes=processes,
+        timings=timings,
+        api_calls=api_calls,
+    )
+    run_query(
+        handlers,
+        query,
+        output_file,
+        timings=timings,
+        timings_format=timings_format,
+        profile_path=profile_path,
+        api_calls=api_calls,
+        api_metrics_path=api_metrics_path,
+        api_metrics_format=api_metrics_format,
     )
 
-    handlers = bootstrap(template_source=query.TemplateSource)
-    handler = handlers[type(query)]
 
-    report_result = handler(query)
-    match report_result:
-        case Ok(report):
-            Console().print(report)
-        case Err(e):
-            logger.error(e)
-            sys.exit(1)
+@cli.group()
+def account() -> None:
+    """Perform Operations on the Stacks of an account and region"""
+
+
+@account.command("permissions")
+@click.option(
+    "--stack",
+    "stacks",
+    multiple=True,
+    help="ARN of a Stack to include, may be repeated, defaults to every Stack in the account and region",
+)
+@click.option(
+    "--nested/--no-nested", default=True, help="Follow AWS::CloudFormation::Stack resources into nested Stacks"
+)
+@click.option(
+    "--requests-per-second",
+    default=DEFAULT_REQUESTS_PER_SECOND,
+    show_default=True,
+    type=click.FloatRange(min=0, min_open=True),
+    help="Maximum rate of CloudFormation calls listing Stacks and their resources",
+)
+@click.option("--output", default="list", type=click.Choice(OUTPUT_FORMATS))
+@output_file_option
+@compaction_options
+@click.option("--permission-level", default="full", type=click.Choice(PERMISSION_LEVELS))
+@handlers_option
+@cache_options
+@timing_options
+@concurrency_option
+def account_permissions(
+    stacks: tuple[str, ...],
+    nested: bool,
+    requests_per_second: float,
+    output: Literal["list", "tree", "iam", "plain", "json", "ndjson"],
+    output_file: TextIO | None,
+    compact: bool,
+    wildcard_access_levels: tuple[str, ...],
+    permission_level: Literal["read", "modify", "full"],
+    handler_types: str | None,
+    cache_dir: Path | None,
+    no_cache: bool,
+    refresh_cache: bool,
+    timings_format: Literal["table", "json"] | None,
+    profile_path: Path | None,
+    api_metrics_path: Path | None,
+    api_metrics_format: Literal["prometheus", "json"],
+    concurrency: int,
+) -> None:
+    """List permissions required to manage the Stacks of an account"""
+    query = queries.ListAccountPermissions(
+        PermissionLevel=_permission_level(handler_types, permission_level),
+        Stacks=tuple(ARN.from_str(stack) for stack in stacks),
+        FollowNested=nested,
+        MaxWorkers=concurrency,
+    )
+
+    timings = Timings() if timings_format else None
+    api_calls = ApiCalls() if api_metrics_path else None
+    handlers = bootstrap(
+        output_format=output,
+        output_stream=output_file,
+        compact_policies=compact,
+        wildcard_access_levels=wildcard_access_levels,
+        cache_dir=cache_dir,
+        use_cache=not no_cache,
+        refresh_cache=refresh_cache,
+        concurrency=concurrency,
+        requests_per_second=requests_per_second,
+        timings=timings,
+        api_calls=api_calls,
+    )
+    run_query(
+        handlers,
+        query,
+        output_file,
+        timings=timings,
+        timings_format=timings_format,
+        profile_path=profile_path,
+        api_calls=api_calls,
+        api_metrics_path=api_metrics_path,
+        api_metrics_format=api_metrics_format,
+    )
+
+
+@cli.group("cache")
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    envvar=CACHE_DIR_ENV,
+    help="Cache directory, defaults to ~/.cache/cloudformation-permissions",
+)
+@click.pass_context
+def cache_group(ctx, cache_dir: Path | None) -> None:
+    """Inspect and evict cached schemas and simulation decisions"""
+    ctx.obj = cache_dir or default_cache_dir()
+
+
+@cache_group.command("info")
+@click.pass_obj
+def cache_info(cache_dir: Path) -> None:
+    """Number and size of entries in each cache"""
+    for namespace, description in CACHE_NAMESPACES.items():
+        entries = list(DiskCache(root=cache_dir, namespace=namespace).entries())
+        size = sum(entry.size for entry in entries)
+        click.echo(f"{namespace:<12}{len(entries):>8} entries{size:>12} bytes  {description}")
+
+
+@cache_group.command("list")
+@click.argument("namespace", type=click.Choice(tuple(CACHE_NAMESPACES)))
+@click.pass_obj
+def cache_list(cache_dir: Path, namespace: str) -> None:
+    """Key, creation time and size of each entry in NAMESPACE"""
+    for entry in sorted(DiskCache(root=cache_dir, namespace=namespace).entries(), key=lambda entry: entry.key):
+        created = datetime.fromtimestamp(entry.created, UTC).isoformat(timespec="seconds")
+        click.echo(f"{entry.key}\t{created}\t{entry.size}")
+
+
+@cache_group.command("clear")
+@click.argument("namespace", type=click.Choice(tuple(CACHE_NAMESPACES)), required=False)
+@click.option(
+    "--match", "pattern", help="Only evict entries whose key matches this glob, eg 'arn:aws:iam::*:role/deploy/*'"
+)
+@click.pass_obj
+def cache_clear(cache_dir: Path, namespace: str | None, pattern: str | None) -> None:
+    """Evict the entries of NAMESPACE, or of every cache"""
+    removed = 0
+    for name in (namespace,) if namespace else CACHE_NAMESPACES:
+        disk_cache = DiskCache(root=cache_dir, namespace=name)
+        if pattern is None:
+            removed += disk_cache.clear()
+        else:
+            keys = [entry.key for entry in disk_cache.entries() if fnmatch.fnmatchcase(entry.key, pattern)]
+            removed += sum(disk_cache.delete(key) for key in keys)
+    click.echo(f"Evicted {removed} entries")
+
+
+@cli.group()
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    envvar=CACHE_DIR_ENV,
+    help="Cache directory to compile into, defaults to ~/.cache/cloudformation-permissions",
+)
+@click.pass_context
+def reference(ctx, cache_dir: Path | None) -> None:
+    """Manage the bundled Service Authorization Reference"""
+    ctx.obj = (cache_dir or default_cache_dir()) / REFERENCE_CACHE_NAMESPACE
+
+
+@reference.command("build-snapshot")
+@click.option("--source", type=click.Path(exists=True, dir_okay=False, path_type=Path), default=None)
+@click.option("--output", type=click.Path(dir_okay=False, path_type=Path), default=None)
+@click.pass_obj
+def reference_build_snapshot(reference_dir: Path, source: Path | None, output: Path | None) -> None:
+    """Compile auth.json into the snapshot loaded at startup"""
+    source = source or reference_data_dir() / REFERENCE_SOURCE
+    output = output or reference_dir / REFERENCE_SNAPSHOT
+    count = build_snapshot(source, output)
+    click.echo(f"Compiled {count} actions from {source} into {output}")
+
+
+@reference.command("build-permission-table")
+@click.option(
+    "--schemas",
+    type=click.Path(exists=True, path_type=Path),
+    default=None,
+    help="Directory or zip of resource provider schemas, downloaded from CloudFormation when not given",
+)
+@click.option("--region", default=None, help="Region of the schemas, defaults to the configured region")
+@click.option("--output", type=click.Path(dir_okay=False, path_type=Path), default=None)
+@click.pass_obj
+def reference_build_permission_table(
+    reference_dir: Path, schemas: Path | None, region: str | None, output: Path | None
+) -> None:
+    """Precompute the permissions of every public resource type, so they are resolved without DescribeType"""
+    output = output or reference_dir / PERMISSION_TABLE
+    aws = AWS()
+    region = region or aws.region
+    location = SchemaLocation(partition=aws.session.get_partition_for_region(region), region=region)
+    source = schemas or download_schemas(region)
+    reference = ServiceAuthorizationReferenceLocal()
+    count = build_permission_table(read_schemas(source), reference, reference.source, output, location)
+    click.echo(f"Recorded the permissions of {count} resource types in {output}")
+
+
+socket_option = click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False, path_type=Path),
+    envvar=SOCKET_ENV,
+    help="Unix socket of the daemon, defaults to $XDG_RUNTIME_DIR/cloudformation-permissions.sock",
+)
+
+
+@cli.command("serve")
+@socket_option
+@click.option(
+    "--max-instances",
+    default=DEFAULT_MAX_INSTANCES,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Most AWS sessions, resolvers and caches kept between commands",
+)
+@click.option(
+    "--max-age",
+    default=DEFAULT_MAX_AGE,
+    show_default=True,
+    type=click.FloatRange(min=0),
+    help="Seconds an AWS session, resolver or cache is kept before it is created again",
+)
+@click.option(
+    "--idle-timeout",
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+    help="Stop once no command came for this many seconds",
+)
+def serve(socket_path: Path | None, max_instances: int, max_age: float, idle_timeout: float | None) -> None:
+    """Answer resource and template commands from a warm process listening on a Unix socket"""
+    instances = WarmInstances(max_instances=max_instances, max_age=max_age)
+    try:
+        Daemon(socket_path or default_socket_path(), instances, idle_timeout=idle_timeout).serve()
+    except DaemonError as error:
+        raise click.ClickException(str(error)) from error
+
+
+@cli.group()
+def daemon() -> None:
+    """Inspect or stop the process started with serve"""
+
+
+@daemon.command("stats")
+@socket_option
+def daemon_stats(socket_path: Path | None) -> None:
+    """Commands run, memory used and instances kept by the daemon"""
+    try:
+        reply = request({"stats": True}, socket_path)
+    except DaemonError as error:
+        raise click.ClickException(str(error)) from error
+    click.echo(json.dumps(reply["stats"], indent=2))
+
+
+@daemon.command("stop")
+@socket_option
+def daemon_stop(socket_path: Path | None) -> None:
+    """Stop the daemon once it finished the command it is running"""
+    try:
+        request({"stop": True}, socket_path)
+    except DaemonError as error:
+        raise click.ClickException(str(error)) from error
+    click.echo("Stopped")
@@ -0,0 +1,320 @@
+"""A long running process answering CLI commands over a Unix socket, and the client forwarding commands to it.
+
+`cloudformation-permissions serve` imports everything once and keeps the
+Service Authorization Reference, AWS sessions and clients, resolved schemas and
+caches between commands, see `bootstrap.WarmInstances`. While it listens, the
+`resource`, `template` and `template-batch` commands are forwarded to it by a
+client importing nothing but the standard library. The daemon runs each
+command as the CLI would, in the client's working directory and environment,
+one at a time, and streams its output back as it is written. Commands reading
+inputs from stdin are run by the client itself, as is every command when the
+daemon is not listening or `CLOUDFORMATION_PERMISSIONS_NO_DAEMON` is set.
+
+Requests and replies are JSON objects, one per line:
+
+    client  {"argv": [...], "cwd": ..., "environ": {...}}   run a command
+            {"stats": true}                                  the daemon's statistics
+            {"stop": true}                                   stop listening
+    daemon  {"stdout": ...} or {"stderr": ...}               output of the command, as it is written
+            {"exit": code}                                   the command finished
+            {"stats": {...}} or {"stopped": true}
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import os
+import resource
+import shutil
+import socket
+import stat
+import sys
+import tempfile
+import time
+import traceback
+from collections.abc import Mapping, Sequence
+from contextlib import redirect_stderr, redirect_stdout
+from logging import WARNING, getLogger
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from ..bootstrap import WarmInstances
+
+logger = getLogger(__name__)
+
+PROG_NAME = "cloudformation-permissions"
+SOCKET_ENV = "CLOUDFORMATION_PERMISSIONS_SOCKET"
+NO_DAEMON_ENV = "CLOUDFORMATION_PERMISSIONS_NO_DAEMON"
+FORWARDED_COMMANDS = frozenset({"resource", "template", "template-batch"})
+# output is sent to the client once this much was written, or the command flushes it
+FRAME_SIZE = 64 * 1024
+
+
+class DaemonError(Exception):
+    """The daemon cannot be reached, or is already listening"""
+
+
+def default_socket_path() -> Path:
+    if socket_path := os.environ.get(SOCKET_ENV):
+        return Path(socket_path)
+    if runtime_dir := os.environ.get("XDG_RUNTIME_DIR"):
+        return Path(runtime_dir) / f"{PROG_NAME}.sock"
+    return Path(tempfile.gettempdir()) / f"{PROG_NAME}-{os.getuid()}.sock"
+
+
+def forwardable(argv: Sequence[str]) -> bool:
+    """Whether the command of `argv` may be answered by the daemon"""
+    if os.environ.get(NO_DAEMON_ENV):
+        return False
+    command = next((argument for argument in argv if not argument.startswith("-")), None)
+    return command in FORWARDED_COMMANDS and "-" not in argv
+
+
+def _connect(socket_path: Path) -> socket.socket | None:
+    """A connection to the daemon listening at `socket_path`, None when none is"""
+    try:
+        # only talk to a daemon of the same user
+        if not stat.S_ISSOCK((status := socket_path.stat()).st_mode) or status.st_uid != os.getuid():
+            return None
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(str(socket_path))
+    except OSError:
+        return None
+    return connection
+
+
+def _send(connection: socket.socket, message: Mapping[str, Any]) -> None:
+    connection.sendall(json.dumps(message).encode() + b"\n")
+
+
+def request(message: Mapping[str, Any], socket_path: Path | None = None) -> dict[str, Any]:
+    """The daemon's reply to `message`"""
+    socket_path = socket_path or default_socket_path()
+    if (connection := _connect(socket_path)) is None:
+        raise DaemonError(f"No daemon is listening at {socket_path}")
+    with connection, connection.makefile("rb") as replies:
+        _send(connection, message)
+        if not (reply := replies.readline()):
+            raise DaemonError(f"The daemon at {socket_path} closed the connection")
+        return json.loads(reply)
+
+
+def forward(
+    argv: Sequence[str],
+    socket_path: Path | None = None,
+    stdout: IO[str] | None = None,
+    stderr: IO[str] | None = None,
+) -> int | None:
+    """Run the command of `argv` in the daemon, returning its exit code, or None when no daemon is listening"""
+    stdout, stderr = stdout or sys.stdout, stderr or sys.stderr
+    if (connection := _connect(socket_path or default_socket_path())) is None:
+        return None
+
+    environ = dict(os.environ)
+    if stdout.isatty():
+        # the daemon writes to a socket, rendering as it would to this terminal
+        environ.setdefault("COLUMNS", str(shutil.get_terminal_size().columns))
+        environ.setdefault("FORCE_COLOR", "1")
+    with connection, connection.makefile("rb") as replies:
+        try:
+            _send(connection, {"argv": list(argv), "cwd": os.getcwd(), "environ": environ})
+        except OSError:
+            return None
+        for line in replies:
+            match json.loads(line):
+                case {"stdout": str(output)}:
+                    stdout.write(output)
+                    stdout.flush()
+                case {"stderr": str(output)}:
+                    stderr.write(output)
+                    stderr.flush()
+                case {"exit": int(code)}:
+                    return code
+    stderr.write("The daemon stopped before the command finished\n")
+    return 1
+
+
+def main() -> None:
+    """The CLI, answered by the daemon when it is listening"""
+    argv = sys.argv[1:]
+    if forwardable(argv) and (code := forward(argv)) is not None:
+        sys.exit(code)
+
+    from .cli import cli  # noqa: PLC0415 - only imported when the daemon does not answer
+
+    cli(prog_name=PROG_NAME)
+
+
+class _FrameWriter(io.TextIOBase):
+    """A text stream sending what is written to the client as `{name: output}` replies"""
+
+    def __init__(self, connection: socket.socket, name: str):
+        self.connection = connection
+        self.name = name
+        self._pending = list[str]()
+        self._pending_size = 0
+        self.closed_by_client = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        # as other text streams do, click tells binary streams apart by writing bytes to them
+        if not isinstance(text, str):
+            raise TypeError(f"write() argument must be str, not {type(text).__name__}")
+        self._pending.append(text)
+        self._pending_size += len(text)
+        if self._pending_size >= FRAME_SIZE:
+            self.flush()
+        return len(text)
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        output, self._pending, self._pending_size = "".join(self._pending), [], 0
+        if self.closed_by_client:
+            return
+        try:
+            _send(self.connection, {self.name: output})
+        except OSError:
+            # the command runs to completion, its output is dropped
+            self.closed_by_client = True
+
+
+def _run_cli(argv: list[str]) -> int:
+    """Run `argv` as the CLI would, returning its exit code"""
+    import click  # noqa: PLC0415 - the client imports only the standard library
+
+    from .cli import cli  # noqa: PLC0415 - the client imports only the standard library
+
+    try:
+        cli.main(args=argv, prog_name=PROG_NAME, standalone_mode=False)
+    except click.ClickException as error:
+        error.show()
+        return error.exit_code
+    except click.Abort:
+        click.echo("Aborted!", err=True)
+        return 1
+    except SystemExit as error:
+        if error.code is None or isinstance(error.code, int):
+            return error.code or 0
+        print(error.code, file=sys.stderr)
+        return 1
+    except Exception:  # noqa: BLE001 - a failing command must not stop the daemon, it is reported as the CLI would
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+class Daemon:
+    """Answers requests on `socket_path` one at a time, see the module documentation"""
+
+    def __init__(self, socket_path: Path, instances: WarmInstances, idle_timeout: float | None = None):
+        self.socket_path = socket_path
+        self.instances = instances
+        self.idle_timeout = idle_timeout
+        self.started = time.monotonic()
+        self.commands = 0
+        self.failures = 0
+        self.stopping = False
+
+    def _listen(self) -> socket.socket:
+        if (connection := _connect(self.socket_path)) is not None:
+            connection.close()
+            raise DaemonError(f"A daemon is already listening at {self.socket_path}")
+        self.socket_path.unlink(missing_ok=True)
+
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # only the user running the daemon may connect to it
+        umask = os.umask(0o077)
+        try:
+            listener.bind(str(self.socket_path))
+        finally:
+            os.umask(umask)
+        listener.listen()
+        listener.settimeout(self.idle_timeout)
+        return listener
+
+    def serve(self) -> None:
+        """Answer requests until asked to stop, or for `idle_timeout` seconds no request came"""
+        with self._listen() as listener:
+            logger.info("Listening at %s", self.socket_path)
+            try:
+                while not self.stopping:
+                    try:
+                        connection, _ = listener.accept()
+                    except TimeoutError:
+                        logger.info("Stopping, no request for %s seconds", self.idle_timeout)
+                        break
+                    with connection:
+                        try:
+                            self.handle(connection)
+                        except Exception:
+                            # one request failing must not stop the daemon
+                            logger.exception("Failed to answer a request")
+            finally:
+                self.socket_path.unlink(missing_ok=True)
+
+    def handle(self, connection: socket.socket) -> None:
+        with connection.makefile("rb") as requests:
+            try:
+                message = json.loads(requests.readline() or "null")
+            except ValueError:
+                message = None
+            try:
+                match message:
+                    case {"argv": list(argv), "cwd": str(cwd), "environ": dict(environ)}:
+                        _send(connection, {"exit": self.run(argv, cwd, environ, connection)})
+                    case {"stats": True}:
+                        _send(connection, {"stats": self.stats()})
+                    case {"stop": True}:
+                        self.stopping = True
+                        _send(connection, {"stopped": True})
+                    case _:
+                        logger.warning("Ignoring an unknown request %r", message)
+            except OSError as error:
+                logger.info("The client went away: %s", error)
+
+    def run(self, argv: list[str], cwd: str, environ: dict[str, str], connection: socket.socket) -> int:
+        """Run a command in the client's working directory and environment, with its output sent to the client"""
+        from ..bootstrap import warm_instances  # noqa: PLC0415 - the client imports only the standard library
+
+        stdout, stderr = _FrameWriter(connection, "stdout"), _FrameWriter(connection, "stderr")
+        saved_environ, saved_cwd = dict(os.environ), os.getcwd()
+        root = getLogger()
+        saved_handlers, saved_level = root.handlers[:], root.level
+        token = warm_instances.set(self.instances)
+        try:
+            os.environ.clear()
+            os.environ.update(environ)
+            os.chdir(cwd)
+            # the command's own -v configures logging to its stderr
+            root.handlers, root.level = [], WARNING
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                code = _run_cli(argv)
+        finally:
+            warm_instances.reset(token)
+            root.handlers, root.level = saved_handlers, saved_level
+            os.chdir(saved_cwd)
+            os.environ.clear()
+            os.environ.update(saved_environ)
+            stdout.flush()
+            stderr.flush()
+
+        self.commands += 1
+        self.failures += code != 0
+        logger.info("Ran %s, exit code %d", " ".join(argv), code)
+        return code
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "uptime": time.monotonic() - self.started,
+            "commands": self.commands,
+            "failures": self.failures,
+            # kilobytes on Linux
+            "max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "instances": self.instances.describe(),
+        }
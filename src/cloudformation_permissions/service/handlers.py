@@ -1,40 +1,294 @@
 from __future__ import annotations
 
+import time
+from collections import Counter, deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from logging import getLogger
+from pathlib import Path
 from typing import assert_never
 
-from attrs import frozen
-from result import Err, Ok, Result
+from attrs import define, evolve, field, frozen
+from botocore.exceptions import ClientError
+from result import Err, Ok, Result, as_result
 
 from cloudformation_permissions.adapters.iam import IAMProtocol
 from cloudformation_permissions.adapters.permissions_resolver import ResourceInformationResolverProtocol
-from cloudformation_permissions.adapters.reporter import Reporter, ResourceReporterTree
+from cloudformation_permissions.adapters.policy_evaluator import PolicyError
+from cloudformation_permissions.adapters.reporter import Reporter, ResourceReporterTree, StreamingReporter
 from cloudformation_permissions.adapters.sts import STSProtocol
 from cloudformation_permissions.adapters.template_loader import TemplateResourceLoaderProtocol
+from cloudformation_permissions.adapters.template_loader.stacks import AccountStacksProtocol
+from cloudformation_permissions.adapters.timings import NO_TIMINGS, NoTimings, TimingsProtocol, timed
 from cloudformation_permissions.domain.model import (
+    ARN,
+    Action,
+    ActionPermission,
+    BatchSummary,
+    ResolutionStatistics,
     ResourcePermissionSummary,
+    ShortResourceInfo,
+    StackResources,
+    TemplateError,
     TemplateSummary,
 )
 from cloudformation_permissions.domain.queries import (
+    ListAccountPermissions,
     ListResourceTypePermissions,
+    ListTemplateBatchPermissions,
     ListTemplatePermissions,
     VerifyResourceTypePermissions,
     VerifyTemplatePermissions,
 )
 from cloudformation_permissions.service import QueryHandler
 
+logger = getLogger(__name__)
+
+# templates loaded at once by batches, bounding the resources held before they are summarised
+TEMPLATES_PER_BATCH = 1000
+
+
+def summarise_template(
+    permission_resolver: ResourceInformationResolverProtocol,
+    source: ARN | Path,
+    resources: Iterable[ShortResourceInfo],
+    permission_level: str,
+    *,
+    timings: TimingsProtocol = NO_TIMINGS,
+) -> TemplateSummary:
+    """Resolve the permissions of every resource in a template.
+
+    Resources are grouped by `(TypeName, PermissionLevel)`, where a resource's
+    own `PermissionLevel` takes the place of `permission_level`, and each group
+    is resolved once; every LogicalId in a group shares the same immutable
+    `ResourcePermissionSummary`.
+    """
+    start = time.perf_counter()
+    resources = list(resources)
+    groups = dict.fromkeys((resource.TypeName, resource.PermissionLevel or permission_level) for resource in resources)
+    for type_name, count in Counter(resource.TypeName for resource in resources).items():
+        timings.resource_type(type_name, resources=count)
+
+    resolved = dict[tuple[str, str], ResourcePermissionSummary | None]()
+    with timings.stage("resolve"):
+        permission_resolver.prefetch(type_name for type_name, _ in groups)
+        for type_name, level in groups:
+            match permission_resolver.resolve(type_name, permission_level=level):
+                case Ok(permissions):
+                    resolved[type_name, level] = ResourcePermissionSummary(
+                        resource_type=type_name, permissions=permissions
+                    )
+                case Err():
+                    resolved[type_name, level] = None
+
+    resource_summaries = dict[str, ResourcePermissionSummary]()
+    failures = []
+    for resource in resources:
+        if (summary := resolved[resource.TypeName, resource.PermissionLevel or permission_level]) is not None:
+            resource_summaries[resource.LogicalId] = summary
+        else:
+            failures.append(resource.TypeName)
+
+    statistics = ResolutionStatistics(resources=len(resources), distinct_resources=len(groups))
+    logger.debug("Resolved %d distinct resources for %d resources in %s", len(groups), len(resources), source)
+    return TemplateSummary(
+        source=source,
+        resources=resource_summaries,
+        failures=failures,
+        statistics=statistics,
+        timings={"resolve": time.perf_counter() - start},
+    )
+
+
+def summarise_templates(
+    template_loader: TemplateResourceLoaderProtocol,
+    permission_resolver: ResourceInformationResolverProtocol,
+    query: ListTemplateBatchPermissions,
+    *,
+    timings: TimingsProtocol = NO_TIMINGS,
+) -> Iterator[TemplateSummary | TemplateError]:
+    """Resolve the permissions of many templates, in the order of the query's sources.
+
+    Templates are loaded together by the template loader, up to
+    `TEMPLATES_PER_BATCH` at a time, then the schemas of every resource type
+    across the batch are prefetched at once before each template is
+    summarised.
+    """
+    sources, permission_level = query.TemplateSources, query.PermissionLevel
+    for start in range(0, len(sources), TEMPLATES_PER_BATCH):
+        batch = sources[start : start + TEMPLATES_PER_BATCH]
+        with timings.stage("load"):
+            loaded = template_loader.get_many_template_resources(batch, query.MaxWorkers)
+
+        with timings.stage("resolve"):
+            permission_resolver.prefetch(
+                resource.TypeName for resources_result in loaded if isinstance(resources_result, Ok)
+                for resource in resources_result.ok_value
+            )
+
+        for source, resources_result in zip(batch, loaded, strict=True):
+            match resources_result:
+                case Ok(resources):
+                    yield summarise_template(permission_resolver, source, resources, permission_level, timings=timings)
+                case Err(error):
+                    yield TemplateError(source=source, error=error)
+
+
+@define
+class ListedStack:
+    """The summary so far of a Stack whose resources are still being listed"""
+
+    resources: dict[str, ResourcePermissionSummary] = field(factory=dict)
+    failures: list[str] = field(factory=list)
+    groups: set[tuple[str, str]] = field(factory=set)
+    count: int = 0
+    seconds: float = 0.0
+
+    def add(self, page: TemplateSummary, resources: Iterable[ShortResourceInfo], permission_level: str) -> None:
+        self.resources.update(page.resources)
+        self.failures.extend(page.failures)
+        self.groups.update((resource.TypeName, resource.PermissionLevel or permission_level) for resource in resources)
+        self.count += page.statistics.resources
+        self.seconds += page.timings["resolve"]
+
+    def summary(self, stack: ARN) -> TemplateSummary:
+        return TemplateSummary(
+            source=stack,
+            resources=self.resources,
+            failures=self.failures,
+            statistics=ResolutionStatistics(resources=self.count, distinct_resources=len(self.groups)),
+            timings={"resolve": self.seconds},
+        )
+
+
+def summarise_stacks(
+    stack_loader: AccountStacksProtocol,
+    permission_resolver: ResourceInformationResolverProtocol,
+    query: ListAccountPermissions,
+    *,
+    timings: TimingsProtocol = NO_TIMINGS,
+) -> Iterator[TemplateSummary | TemplateError]:
+    """Resolve the permissions of Stacks while their resources are still being listed.
+
+    The schema of each resource type is fetched in the background as soon as
+    the first resource of that type arrives, while listing carries on. Pages
+    of resources wait, in the order they arrived, until the schemas of their
+    types are fetched, then each is summarised and released. Each Stack is
+    yielded once its last page has been, so Stacks are yielded in the order
+    they finish. Errors fetching a schema are raised.
+    """
+    permission_level = query.PermissionLevel
+    schemas = dict[str, Future]()
+    pending = deque[StackResources | TemplateError]()
+    listed = dict[ARN, ListedStack]()
+
+    def fetched(record: StackResources | TemplateError) -> bool:
+        return not isinstance(record, StackResources) or all(
+            schemas[resource.TypeName].done() for resource in record.resources
+        )
+
+    def drain(wait: bool) -> Iterator[TemplateSummary | TemplateError]:
+        while pending and (wait or fetched(pending[0])):
+            match pending.popleft():
+                case StackResources(stack=stack, resources=resources, complete=complete):
+                    for type_name in {resource.TypeName for resource in resources}:
+                        schemas[type_name].result()
+                    page = summarise_template(permission_resolver, stack, resources, permission_level, timings=timings)
+                    listed.setdefault(stack, ListedStack()).add(page, resources, permission_level)
+                    if complete:
+                        yield listed.pop(stack).summary(stack)
+                case TemplateError(source=stack) as error:
+                    listed.pop(stack, None)
+                    yield error
+
+    records = stack_loader.stream_stack_resources(query.Stacks or None, query.FollowNested)
+    with ThreadPoolExecutor(max_workers=query.MaxWorkers) as executor:
+        for record in timed(timings, "load", records):
+            if isinstance(record, StackResources):
+                for type_name in {resource.TypeName for resource in record.resources} - schemas.keys():
+                    schemas[type_name] = executor.submit(permission_resolver.prefetch, [type_name])
+            pending.append(record)
+            yield from drain(wait=False)
+        yield from drain(wait=True)
+
+
+def report_templates(
+    reporter: Reporter,
+    templates: Iterable[TemplateSummary | TemplateError],
+    order: Callable[[TemplateSummary | TemplateError], str] | None = None,
+    *,
+    timings: TimingsProtocol = NO_TIMINGS,
+) -> Reporter:
+    """Hand each template to a streaming reporter as it is summarised, or all of them, in `order`, to any other"""
+    if isinstance(reporter, StreamingReporter):
+        for template in templates:
+            with timings.stage("report"):
+                reporter.add_template(template)
+        return reporter
+    batch = BatchSummary(templates=sorted(templates, key=order) if order else list(templates))
+    with timings.stage("report"):
+        return reporter.add_summary(batch)
+
+
+def simulated_role(iam: IAMProtocol, sts: STSProtocol, role: ARN | None) -> Result[ARN | None, str]:
+    """`role`, else the caller's role, or None when `iam` decides without a principal and STS isn't called"""
+    if role is not None or not iam.needs_principal:
+        return Ok(role)
+    return sts()
+
+
+def verify_summaries(
+    iam: IAMProtocol,
+    role: ARN | None,
+    summaries: Iterable[ResourcePermissionSummary],
+    *,
+    timings: TimingsProtocol = NO_TIMINGS,
+) -> Result[dict[ResourcePermissionSummary, ResourcePermissionSummary], str]:
+    """Simulate the permissions of every summary as `role`, each distinct action once.
+
+    `role` is None only for an `iam` that doesn't need a principal. Returns a
+    copy of each summary whose permissions are `ActionPermission`s, keyed by
+    the original summary so summaries shared between resources stay shared.
+    """
+    summaries = list(dict.fromkeys(summaries))
+    actions = sorted({permission for summary in summaries for permission in summary.permissions})
+    principal = "" if role is None else str(role)
+    with timings.stage("simulate"):
+        simulated_result = as_result(ClientError, PolicyError)(lambda: list(iam.simulate(principal, actions)))()
+    match simulated_result:
+        case Ok(simulated):
+            decisions = {permission.action: permission for permission in simulated}
+            return Ok(
+                {
+                    summary: evolve(
+                        summary,
+                        permissions=[
+                            decisions.get(Action(permission), ActionPermission(action=Action(permission)))
+                            for permission in sorted(summary.permissions)
+                        ],
+                    )
+                    for summary in summaries
+                }
+            )
+        case Err(error):
+            return Err(str(error))
+
 
 @frozen
 class HandleListResourceTypePermissions(QueryHandler):
     permission_resolver: ResourceInformationResolverProtocol
     reporter: Reporter
+    timings: TimingsProtocol = field(factory=NoTimings)
 
     def __call__(self, query: ListResourceTypePermissions) -> Result[Reporter, str]:
-        result = self.permission_resolver.resolve(query.ResourceType, query.PermissionLevel)
+        with self.timings.stage("resolve"):
+            result = self.permission_resolver.resolve(query.ResourceType, query.PermissionLevel)
 
         match result:
             case Ok(permissions):
                 summary = ResourcePermissionSummary(resource_type=query.ResourceType, permissions=permissions)
-                report = self.reporter.add_summary(summary)
+                with self.timings.stage("report"):
+                    report = self.reporter.add_summary(summary)
                 return Ok(report)
 
             case Err():
@@ -50,18 +304,24 @@ class HandleVerifyResourceTypePermissions(QueryHandler):
     iam: IAMProtocol
     sts: STSProtocol
     reporter: Reporter
+    timings: TimingsProtocol = field(factory=NoTimings)
 
-    def __call__(self, query: VerifyResourceTypePermissions) -> Result[ResourcePermissionSummary, str]:
-        result = self.permission_resolver.resolve(
-            query.ResourceType,
-            permission_level=query.PermissionLevel,
-        )
+    def __call__(self, query: VerifyResourceTypePermissions) -> Result[Reporter, str]:
+        with self.timings.stage("resolve"):
+            result = self.permission_resolver.resolve(
+                query.ResourceType,
+                permission_level=query.PermissionLevel,
+            )
 
         match result:
             case Ok(permissions):
-                _ = ResourcePermissionSummary(resource_type=query.ResourceType, permissions=permissions)
-                _ = query.Role or self.sts()
-                return None
+                summary = ResourcePermissionSummary(resource_type=query.ResourceType, permissions=permissions)
+                role_result = simulated_role(self.iam, self.sts, query.Role)
+                verified = role_result.and_then(
+                    lambda role: verify_summaries(self.iam, role, [summary], timings=self.timings)
+                )
+                with self.timings.stage("report"):
+                    return verified.map(lambda summaries: self.reporter.add_summary(summaries[summary]))
 
             case Err(e):
                 return Err(str(e))
@@ -75,34 +335,23 @@ class HandleTemplateListPermissions(QueryHandler):
     template_loader: TemplateResourceLoaderProtocol
     permission_resolver: ResourceInformationResolverProtocol
     reporter: Reporter
+    timings: TimingsProtocol = field(factory=NoTimings)
 
     def __call__(self, query: ListTemplatePermissions) -> Result[ResourceReporterTree, str]:
-        resources_result = self.template_loader.get_template_resources(query.TemplateSource)
-        resource_summaries = dict[str, ResourcePermissionSummary]()
+        with self.timings.stage("load"):
+            resources_result = self.template_loader.get_template_resources(query.TemplateSource)
 
-        failures = []
         match resources_result:
             case Ok(resources):
-                for resource in resources:
-                    match self.permission_resolver.resolve(resource.TypeName, permission_level=query.PermissionLevel):
-                        case Ok(permissions):
-                            resource_summaries[resource.LogicalId] = ResourcePermissionSummary(
-                                resource_type=resource.TypeName,
-                                permissions=permissions,
-                            )
-                        case Err(e):
-                            failures.append(resource.TypeName)
-
-                        case _:
-                            assert_never(resources_result)
-
-                report = self.reporter.add_summary(
-                    TemplateSummary(
-                        source=query.TemplateSource,
-                        resources=resource_summaries,
-                        failures=failures,
-                    )
+                summary = summarise_template(
+                    self.permission_resolver,
+                    query.TemplateSource,
+                    resources,
+                    query.PermissionLevel,
+                    timings=self.timings,
                 )
+                with self.timings.stage("report"):
+                    report = self.reporter.add_summary(summary)
                 return Ok(report)
 
             case Err():
@@ -115,13 +364,70 @@ class HandleTemplateListPermissions(QueryHandler):
 @frozen
 class HandleVerifyPermissions(QueryHandler):
     template_loader: TemplateResourceLoaderProtocol
+    permission_resolver: ResourceInformationResolverProtocol
     iam: IAMProtocol
     sts: STSProtocol
     reporter: Reporter
+    timings: TimingsProtocol = field(factory=NoTimings)
+
+    def __call__(self, query: VerifyTemplatePermissions) -> Result[Reporter, str]:
+        with self.timings.stage("load"):
+            resources_result = self.template_loader.get_template_resources(query.TemplateSource)
+
+        match resources_result:
+            case Ok(resources):
+                summary = summarise_template(
+                    self.permission_resolver,
+                    query.TemplateSource,
+                    resources,
+                    query.PermissionLevel,
+                    timings=self.timings,
+                )
+                role_result = simulated_role(self.iam, self.sts, query.Role)
+                verified = role_result.and_then(
+                    lambda role: verify_summaries(self.iam, role, summary.resources.values(), timings=self.timings)
+                )
+                with self.timings.stage("report"):
+                    return verified.map(
+                        lambda summaries: self.reporter.add_summary(
+                            evolve(
+                                summary,
+                                resources={
+                                    logical_id: summaries[resource]
+                                    for logical_id, resource in summary.resources.items()
+                                },
+                            )
+                        )
+                    )
+
+            case Err():
+                return resources_result
+
+            case _:
+                assert_never(resources_result)
+
+
+@frozen
+class HandleTemplateBatchListPermissions(QueryHandler):
+    template_loader: TemplateResourceLoaderProtocol
+    permission_resolver: ResourceInformationResolverProtocol
+    reporter: Reporter
+    timings: TimingsProtocol = field(factory=NoTimings)
+
+    def __call__(self, query: ListTemplateBatchPermissions) -> Result[Reporter, str]:
+        templates = summarise_templates(self.template_loader, self.permission_resolver, query, timings=self.timings)
+        return Ok(report_templates(self.reporter, templates, timings=self.timings))
+
 
-    def __call__(self, query: VerifyTemplatePermissions) -> Result[TemplateSummary, str]:
-        role = query.Role or self.sts()
+@frozen
+class HandleAccountListPermissions(QueryHandler):
+    stack_loader: AccountStacksProtocol
+    permission_resolver: ResourceInformationResolverProtocol
+    reporter: Reporter
+    timings: TimingsProtocol = field(factory=NoTimings)
 
-        resources = self.template_loader.get_template_resources(query.TemplateSource)
-        collected_permissions = frozenset(resource.permissions for resource in resources)
-        self.iam.simulate(str(role), collected_permissions)
+    def __call__(self, query: ListAccountPermissions) -> Result[Reporter, str]:
+        stacks = summarise_stacks(self.stack_loader, self.permission_resolver, query, timings=self.timings)
+        return Ok(
+            report_templates(self.reporter, stacks, order=lambda template: str(template.source), timings=self.timings)
+        )
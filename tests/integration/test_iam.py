@@ -1,6 +1,7 @@
 import pytest
 from boto3 import client
-from cloudformation_permissions.adapters import iam
+from cloudformation_permissions.adapters import iam, policy_evaluator
+from cloudformation_permissions.adapters.sar import ServiceAuthorizationReferenceLocal
 from cloudformation_permissions.domain.model import (
     Action,
     ActionPermission,
@@ -51,3 +52,11 @@ def test_simulate(role, actions, result):
     iam_client = client("iam")
     adapter = iam.IAM(iam_client)
     assert result == list(adapter.simulate(role, actions))
+
+
+def test_local_evaluation_matches_simulator():
+    role = "arn:aws:iam::737710810646:role/PlanGitHubRoles"
+    actions = ["sts:GetCallerIdentity", "ec2:RunInstances", "iam:GetRole", "iam:PassRole", "s3:GetObject"]
+    adapter = iam.IAM(client("iam"))
+    local = policy_evaluator.LocalIAM(iam=adapter, reference=ServiceAuthorizationReferenceLocal())
+    assert list(local.simulate(role, actions)) == list(adapter.simulate(role, actions))
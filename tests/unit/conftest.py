@@ -0,0 +1,116 @@
+"""Fakes of the AWS clients and the Service Authorization Reference shared by the unit tests"""
+
+import json
+import threading
+from collections.abc import Mapping
+from urllib.parse import quote
+
+from cloudformation_permissions.adapters.action_index import ActionIndex
+
+
+class CountingCloudFormationClient:
+    """Describes every type with a schema whose read handler needs `<type>:Read`
+
+    Types outside `AWS::` are registered in the account at `default_version`, and listed by `list_types`.
+    """
+
+    def __init__(self, default_version="00000001"):
+        self.calls = []
+        self.default_version = default_version
+
+    @staticmethod
+    def _arn(type_name):
+        return f"arn:aws:cloudformation:eu-west-1::type/resource/{type_name.replace('::', '-')}"
+
+    def describe_type(self, Type, TypeName):
+        self.calls.append(TypeName)
+        schema = {"handlers": {"read": {"permissions": [f"{TypeName}:Read"]}}}
+        described = {"Arn": self._arn(TypeName), "Schema": json.dumps(schema)}
+        if not TypeName.startswith("AWS::"):
+            described["DefaultVersionId"] = self.default_version
+        return described
+
+    def get_paginator(self, operation):
+        assert operation == "list_types"
+        return self
+
+    def paginate(self, Visibility, Type, DeprecatedStatus):
+        type_name = "Example::Private::Queue"
+        summary = {"TypeName": type_name, "TypeArn": self._arn(type_name), "DefaultVersionId": self.default_version}
+        yield {"TypeSummaries": [summary]}
+
+
+class AnyReference:
+    """A Service Authorization Reference with every action"""
+
+    def list_actions_by_pattern(self, pattern):
+        return [pattern]
+
+
+class IndexedReference:
+    """A Service Authorization Reference of only `access_levels`, action names and their access level"""
+
+    def __init__(self, access_levels: Mapping[str, str]):
+        self.actions = {name: {"accessLevel": level} for name, level in access_levels.items()}
+        self.action_index = ActionIndex(access_levels)
+
+
+class FakePaginator:
+    def __init__(self, client, operation):
+        self.client = client
+        self.operation = operation
+
+    def paginate(self, PolicySourceArn=None, ActionNames=None, RoleName=None):
+        match self.operation:
+            case "list_attached_role_policies":
+                yield {"AttachedPolicies": [{"PolicyArn": "arn:aws:iam::aws:policy/ReadOnly"}], "IsTruncated": False}
+            case "list_role_policies":
+                yield {"PolicyNames": ["inline"], "IsTruncated": False}
+            case "simulate_principal_policy":
+                with self.client.lock:
+                    self.client.requests.append(ActionNames)
+                # two pages per request, as IAM returns truncated results
+                middle = len(ActionNames) // 2
+                for names, truncated in ((ActionNames[:middle], True), (ActionNames[middle:], False)):
+                    results = [
+                        {
+                            "EvalActionName": name,
+                            "EvalDecision": "allowed" if name.startswith("s3:") else "implicitDeny",
+                        }
+                        for name in names
+                    ]
+                    yield {"EvaluationResults": results, "IsTruncated": truncated}
+
+
+class FakeIAMClient:
+    """IAM with roles allowed `s3:*` by a managed policy and denied `s3:Put*` by an inline one.
+
+    Simulations allow only `s3` actions. `calls` records the operations
+    paginated, and `requests` the actions of each simulation.
+    """
+
+    def __init__(self, policy_version="v1"):
+        self.calls = []
+        self.requests = []
+        self.lock = threading.Lock()
+        self.policy_version = policy_version
+
+    def get_paginator(self, operation):
+        with self.lock:
+            self.calls.append(operation)
+        return FakePaginator(self, operation)
+
+    def get_role(self, RoleName):
+        return {"Role": {"RoleName": RoleName}}
+
+    def get_role_policy(self, RoleName, PolicyName):
+        # URL encoded, as IAM returns it when botocore does not decode it
+        statement = {"Effect": "Deny", "Action": "s3:Put*", "Resource": "*"}
+        return {"PolicyDocument": quote(json.dumps({"Statement": statement}))}
+
+    def get_policy(self, PolicyArn):
+        return {"Policy": {"DefaultVersionId": self.policy_version}}
+
+    def get_policy_version(self, PolicyArn, VersionId):
+        statement = {"Effect": "Allow", "Action": "s3:*", "Resource": "*"}
+        return {"PolicyVersion": {"Document": {"Statement": [statement]}}}
@@ -0,0 +1,36 @@
+import fnmatch
+
+from pytest import mark
+
+from cloudformation_permissions.adapters.action_index import ActionIndex
+
+names = [
+    "s3:GetObject",
+    "s3:GetObjectVersion",
+    "s3:PutObject",
+    "s3:GetBucketPolicy",
+    "s3express:CreateSession",
+    "iam:GetRole",
+    "iam:PassRole",
+    "sts:GetCallerIdentity",
+]
+
+
+@mark.parametrize(
+    "pattern",
+    ["s3:GetObject", "s3:Missing", "s3:Get*", "s3:*Object", "s3*", "s*:Get*", "*", "iam:?etRole", "iam:[GP]*Role", ""],
+)
+def test_match_is_equivalent_to_fnmatch(pattern):
+    assert ActionIndex(names).match(pattern) == fnmatch.filter(names, pattern)
+
+
+@mark.parametrize("pattern", ["S3:getobject", "s3:GET*", "IAM:?ETROLE", "*:*Role", "S3EXPRESS:*"])
+def test_match_ignore_case(pattern):
+    expected = [name for name in names if fnmatch.fnmatchcase(name.lower(), pattern.lower())]
+    assert ActionIndex(names).match(pattern, ignore_case=True) == expected
+
+
+def test_canonical():
+    index = ActionIndex(names)
+    assert index.canonical("S3:GETOBJECT") == "s3:GetObject"
+    assert index.canonical("s3:Missing") is None
@@ -0,0 +1,51 @@
+from pathlib import Path
+
+import click
+import pytest
+from click.testing import CliRunner
+
+from cloudformation_permissions.domain.model import ARN
+from cloudformation_permissions.entrypoints.api import expand_template_sources
+from cloudformation_permissions.entrypoints.cli import cli
+
+
+def test_expand_template_sources(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    Path("templates/nested").mkdir(parents=True)
+    for name in ("templates/a.yaml", "templates/nested/b.json", "templates/README.md", "c.yml"):
+        Path(name).write_text("Resources: {}")
+    stack = "arn:aws:cloudformation:eu-west-1:123456789012:stack/example/1"
+    Path("inputs.txt").write_text(f"# templates\n{stack}\n\nc.yml\n")
+
+    sources = expand_template_sources(["templates", "*.yml", "@inputs.txt"])
+
+    assert sources == [
+        Path("templates/a.yaml"),
+        Path("templates/nested/b.json"),
+        Path("c.yml"),
+        ARN.from_str(stack),
+    ]
+
+
+def test_missing_input_list_is_a_usage_error(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    result = CliRunner().invoke(cli, ["template-batch", "@missing.txt"])
+
+    assert result.exit_code == click.BadParameter.exit_code
+    assert "missing.txt: No such file or directory" in result.output
+
+
+@pytest.mark.parametrize(
+    "options,option",
+    [
+        (["--permission-level", "read", "--handlers", "read"], "--handlers"),
+        (["--changes-only", "--handlers", "read"], "--changes-only"),
+        (["--changes-only", "--permission-level", "full"], "--changes-only"),
+    ],
+)
+def test_ignored_permission_levels_are_usage_errors(options, option):
+    changeset = "arn:aws:cloudformation:eu-west-1:123456789012:changeSet/example/1"
+    result = CliRunner().invoke(cli, ["template", changeset, "permissions", *options])
+
+    assert result.exit_code == click.UsageError.exit_code
+    assert f"Error: {option}" in result.output
@@ -0,0 +1,98 @@
+import os
+
+from conftest import AnyReference, CountingCloudFormationClient
+from result import Ok
+
+from cloudformation_permissions.adapters.aws import AWS
+from cloudformation_permissions.adapters.cache import DiskCache
+from cloudformation_permissions.adapters.permissions_resolver import ResourceInformationResolver
+from cloudformation_permissions.adapters.permissions_resolver.schema_cache import DiskSchemaCache, SchemaLocation
+from cloudformation_permissions.bootstrap import bootstrap
+
+
+def test_disk_cache_round_trip(tmp_path):
+    cache = DiskCache(root=tmp_path, namespace="test")
+    assert cache.get("key") is None
+    cache.put("key", {"value": 1})
+    assert cache.get("key") == {"value": 1}
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.writes) == (1, 1, 1)
+
+
+def test_disk_cache_ttl(tmp_path):
+    cache = DiskCache(root=tmp_path, namespace="test", ttl=-1)
+    cache.put("key", "value")
+    assert cache.get("key") is None
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(root=tmp_path, namespace="test")
+    cache.put("old", "x" * 100)
+    cache.put("new", "x" * 100)
+    old_path = cache._path("old")
+    os.utime(old_path, (0, 0))
+
+    size = sum(path.stat().st_size for path in cache._files())
+    cache.max_bytes = size - 1
+    cache.evict()
+
+    assert cache.get("old") is None
+    assert cache.get("new") == "x" * 100
+    assert cache.stats.evictions == 1
+
+
+def test_resolver_reads_schema_from_cache(tmp_path):
+    def resolver(client):
+        location = SchemaLocation(partition="aws", region="eu-west-1")
+        schema_cache = DiskSchemaCache(DiskCache(root=tmp_path, namespace="schemas"), location)
+        return ResourceInformationResolver(client, AnyReference(), schema_cache)
+
+    cold, warm = CountingCloudFormationClient(), CountingCloudFormationClient()
+    assert resolver(cold).resolve("AWS::SQS::Queue", "read") == Ok(frozenset({"AWS::SQS::Queue:Read"}))
+    assert resolver(warm).resolve("AWS::SQS::Queue", "read") == Ok(frozenset({"AWS::SQS::Queue:Read"}))
+    assert cold.calls == ["AWS::SQS::Queue"]
+    assert warm.calls == []
+
+
+def test_disk_cache_put_is_best_effort(tmp_path):
+    root = tmp_path / "not-a-directory"
+    root.write_text("")
+    cache = DiskCache(root=root, namespace="test", max_bytes=1)
+    cache.put("key", "value")
+    assert cache.get("key") is None
+    assert cache.stats.writes == 0
+
+
+def test_private_types_are_cached_per_account(tmp_path):
+    def resolver(client, account):
+        location = SchemaLocation(partition="aws", region="eu-west-1", account=account)
+        schema_cache = DiskSchemaCache(DiskCache(root=tmp_path, namespace="schemas"), location)
+        return ResourceInformationResolver(client, AnyReference(), schema_cache)
+
+    first, second, unknown = (CountingCloudFormationClient() for _ in range(3))
+    for client, account in ((first, "111111111111"), (first, "111111111111"), (second, "222222222222")):
+        resolver(client, account).resolve("Example::Private::Queue", "read")
+    resolver(unknown, None).resolve("Example::Private::Queue", "read")
+    resolver(unknown, None).resolve("Example::Private::Queue", "read")
+    assert first.calls == second.calls == ["Example::Private::Queue"]
+    assert unknown.calls == ["Example::Private::Queue"] * 2
+
+
+def test_private_types_are_cached_per_default_version(tmp_path):
+    def resolver(client):
+        location = SchemaLocation(partition="aws", region="eu-west-1", account="111111111111")
+        schema_cache = DiskSchemaCache(DiskCache(root=tmp_path, namespace="schemas"), location)
+        return ResourceInformationResolver(client, AnyReference(), schema_cache)
+
+    first, published, again = (
+        CountingCloudFormationClient(version) for version in ("00000001", "00000002", "00000002")
+    )
+    for client in (first, published, again):
+        resolver(client).resolve("Example::Private::Queue", "read")
+    assert first.calls == published.calls == ["Example::Private::Queue"]
+    assert again.calls == []
+
+
+def test_bootstrap_does_not_create_the_aws_session(tmp_path):
+    aws = AWS()
+    bootstrap(cache_dir=tmp_path, aws=aws)
+    assert aws._session is None
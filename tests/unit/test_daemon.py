@@ -0,0 +1,58 @@
+import io
+import threading
+import time
+
+from cloudformation_permissions.bootstrap import WarmInstances
+from cloudformation_permissions.entrypoints.daemon import Daemon, forward, forwardable, request
+
+
+def test_warm_instances_are_bounded_by_count_and_age():
+    now = [0.0]
+    instances = WarmInstances(max_instances=2, max_age=10, clock=lambda: now[0])
+
+    first = instances.get(("aws", 1), object)
+    assert instances.get(("aws", 1), object) is first
+    instances.get(("aws", 2), object)
+    instances.get(("aws", 3), object)
+    assert instances.get(("aws", 1), object) is not first
+
+    now[0] = 11
+    kept = instances.get(("aws", 3), object)
+    assert instances.get(("aws", 3), object) is kept
+    assert (instances.stats.hits, instances.stats.misses, instances.stats.evictions) == (2, 5, 2)
+    assert instances.describe()["kinds"] == {"aws": 2}
+
+
+def test_only_resource_and_template_commands_are_forwarded(monkeypatch):
+    monkeypatch.delenv("CLOUDFORMATION_PERMISSIONS_NO_DAEMON", raising=False)
+    assert forwardable(["-v", "template", "template.yaml", "permissions"])
+    assert forwardable(["resource", "AWS::SQS::Queue", "permissions"])
+    assert not forwardable(["template-batch", "-"])
+    assert not forwardable(["cache", "info"])
+    monkeypatch.setenv("CLOUDFORMATION_PERMISSIONS_NO_DAEMON", "1")
+    assert not forwardable(["template", "template.yaml", "permissions"])
+
+
+def test_daemon_runs_commands_and_streams_their_output(tmp_path):
+    socket_path = tmp_path / "daemon.sock"
+    assert forward(["cache", "info"], socket_path) is None
+
+    daemon = Daemon(socket_path, WarmInstances(), idle_timeout=10)
+    listening = threading.Thread(target=daemon.serve)
+    listening.start()
+    try:
+        while not socket_path.exists():
+            time.sleep(0.01)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        assert forward(["cache", "--cache-dir", str(tmp_path), "info"], socket_path, stdout, stderr) == 0
+        assert "schemas" in stdout.getvalue()
+
+        assert forward(["cache", "list", "nope"], socket_path, stdout, stderr) == 2
+        assert "Invalid value" in stderr.getvalue()
+
+        stats = request({"stats": True}, socket_path)["stats"]
+        assert (stats["commands"], stats["failures"]) == (2, 1)
+    finally:
+        request({"stop": True}, socket_path)
+        listening.join()
+    assert not socket_path.exists()
@@ -0,0 +1,157 @@
+import threading
+from pathlib import Path
+
+import pytest
+from botocore.exceptions import ClientError
+from result import Err, Ok
+
+from cloudformation_permissions.adapters.template_loader import TemplateSourceAdapter
+from cloudformation_permissions.domain.model import ARN, ShortResourceInfo, StackResources, TemplateError
+from cloudformation_permissions.domain.queries import ListAccountPermissions, ListTemplateBatchPermissions
+from cloudformation_permissions.service.handlers import summarise_stacks, summarise_template, summarise_templates
+
+
+class RecordingResolver:
+    def __init__(self):
+        self.resolved = []
+
+    def prefetch(self, resource_types):
+        list(resource_types)
+
+    def resolve(self, resource_type, permission_level):
+        self.resolved.append((resource_type, permission_level))
+        if resource_type.startswith("Custom::"):
+            return Err(LookupError(resource_type))
+        return Ok(frozenset({f"{resource_type}:{permission_level}"}))
+
+
+def test_summarise_template_resolves_each_type_once():
+    resources = [
+        ShortResourceInfo(TypeName="AWS::Lambda::Permission", LogicalId=f"Permission{index}") for index in range(300)
+    ]
+    resources += [
+        ShortResourceInfo(TypeName="AWS::IAM::Role", LogicalId="Role"),
+        ShortResourceInfo(TypeName="Custom::Thing", LogicalId="Custom"),
+    ]
+    resolver = RecordingResolver()
+
+    summary = summarise_template(resolver, Path("template.yaml"), resources, "full")
+
+    assert resolver.resolved == [
+        ("AWS::Lambda::Permission", "full"),
+        ("AWS::IAM::Role", "full"),
+        ("Custom::Thing", "full"),
+    ]
+    assert list(summary.resources)[:2] == ["Permission0", "Permission1"]
+    assert summary.resources["Permission0"] is summary.resources["Permission299"]
+    assert summary.failures == ["Custom::Thing"]
+    assert (summary.statistics.resources, summary.statistics.distinct_resources) == (302, 3)
+    assert summary.timings["resolve"] >= 0
+
+
+def test_summarise_template_resolves_resources_at_their_own_permission_level():
+    resources = [
+        ShortResourceInfo(TypeName="AWS::SQS::Queue", LogicalId="Added", PermissionLevel="create"),
+        ShortResourceInfo(TypeName="AWS::SQS::Queue", LogicalId="Removed", PermissionLevel="delete"),
+        ShortResourceInfo(TypeName="AWS::SQS::Queue", LogicalId="AlsoAdded", PermissionLevel="create"),
+    ]
+    resolver = RecordingResolver()
+
+    summary = summarise_template(resolver, Path("template.yaml"), resources, "full")
+
+    assert resolver.resolved == [("AWS::SQS::Queue", "create"), ("AWS::SQS::Queue", "delete")]
+    assert summary.resources["Added"] is summary.resources["AlsoAdded"]
+    assert summary.resources["Removed"].permissions == frozenset({"AWS::SQS::Queue:delete"})
+
+
+STACK = ARN.from_str("arn:aws:cloudformation:eu-west-1:123456789012:stack/example/1")
+GONE = ARN.from_str("arn:aws:cloudformation:eu-west-1:123456789012:stack/gone/1")
+ACCOUNT = ListAccountPermissions(PermissionLevel="full", MaxWorkers=2)
+
+
+class PagedStacks:
+    def stream_stack_resources(self, stacks=None, follow_nested=True):
+        yield StackResources(
+            stack=STACK, resources=[ShortResourceInfo(TypeName="AWS::IAM::Role", LogicalId="Role")], complete=False
+        )
+        yield TemplateError(source=GONE, error="missing")
+        yield StackResources(
+            stack=STACK,
+            resources=[
+                ShortResourceInfo(TypeName="AWS::IAM::Role", LogicalId="OtherRole"),
+                ShortResourceInfo(TypeName="Custom::Thing", LogicalId="Custom"),
+            ],
+            complete=True,
+        )
+
+
+def test_summarise_stacks_summarises_each_page_as_it_arrives():
+    summaries = list(summarise_stacks(PagedStacks(), RecordingResolver(), ACCOUNT))
+
+    assert summaries[0] == TemplateError(source=GONE, error="missing")
+    assert list(summaries[1].resources) == ["Role", "OtherRole"]
+    assert summaries[1].failures == ["Custom::Thing"]
+    assert (summaries[1].statistics.resources, summaries[1].statistics.distinct_resources) == (3, 2)
+
+
+class FailingPrefetchResolver(RecordingResolver):
+    def prefetch(self, resource_types):
+        raise RuntimeError("DescribeType failed")
+
+
+class BlockingResolver(RecordingResolver):
+    """Fetches schemas only once every Stack has been listed"""
+
+    def __init__(self):
+        super().__init__()
+        self.listed = threading.Event()
+
+    def prefetch(self, resource_types):
+        list(resource_types)
+        if not self.listed.wait(timeout=5):
+            raise TimeoutError("listing waited for DescribeType")
+
+
+class ListedStacks(PagedStacks):
+    def __init__(self, resolver):
+        self.resolver = resolver
+
+    def stream_stack_resources(self, stacks=None, follow_nested=True):
+        yield from super().stream_stack_resources(stacks, follow_nested)
+        self.resolver.listed.set()
+
+
+def test_summarise_stacks_lists_while_schemas_are_fetched():
+    resolver = BlockingResolver()
+    summaries = list(summarise_stacks(ListedStacks(resolver), resolver, ACCOUNT))
+
+    assert summaries[0] == TemplateError(source=GONE, error="missing")
+    assert list(summaries[1].resources) == ["Role", "OtherRole"]
+
+
+def test_summarise_stacks_raises_prefetch_errors():
+    with pytest.raises(RuntimeError, match="DescribeType failed"):
+        list(summarise_stacks(PagedStacks(), FailingPrefetchResolver(), ACCOUNT))
+
+
+class MissingStacksClient:
+    def get_paginator(self, operation):
+        return self
+
+    def paginate(self, StackName):
+        error = {"Error": {"Code": "ValidationError", "Message": f"Stack with id {StackName} does not exist"}}
+        raise ClientError(error, "ListStackResources")
+
+
+def test_summarise_templates_reports_stacks_that_cannot_be_listed(tmp_path):
+    (template := tmp_path / "template.yaml").write_text("Resources:\n  Role:\n    Type: AWS::IAM::Role\n")
+    loader = TemplateSourceAdapter(MissingStacksClient(), max_processes=1)
+
+    query = ListTemplateBatchPermissions(TemplateSources=(GONE, template), PermissionLevel="full", MaxWorkers=2)
+
+    summaries = list(summarise_templates(loader, RecordingResolver(), query))
+
+    assert isinstance(summaries[0], TemplateError)
+    assert summaries[0].source == GONE
+    assert "does not exist" in summaries[0].error
+    assert list(summaries[1].resources) == ["Role"]
@@ -0,0 +1,57 @@
+from conftest import FakeIAMClient
+
+from cloudformation_permissions.adapters.cache import DiskCache
+from cloudformation_permissions.adapters.iam import IAM
+from cloudformation_permissions.adapters.simulation_cache import DiskSimulationCache
+from cloudformation_permissions.domain.model import ARN, ActionPermission, Authorized, ResourcePermissionSummary
+from cloudformation_permissions.service.handlers import verify_summaries
+
+
+def test_simulate_chunks_distinct_actions():
+    actions = [f"s3:Action{index}" for index in range(150)] + [f"ec2:Action{index}" for index in range(100)]
+    client = FakeIAMClient()
+
+    permissions = list(IAM(client, chunk_size=100, max_workers=3).simulate("role", actions + actions[:50]))
+
+    assert sorted(len(request) for request in client.requests) == [50, 100, 100]
+    assert [permission.action for permission in permissions] == actions
+    assert permissions[0] == ActionPermission("s3:Action0", Authorized.ALLOWED)
+    assert permissions[-1] == ActionPermission("ec2:Action99", Authorized.DENIED)
+
+
+def test_verify_summaries_simulates_shared_actions_once():
+    client = FakeIAMClient()
+    bucket = ResourcePermissionSummary(resource_type="AWS::S3::Bucket", permissions=frozenset({"s3:CreateBucket"}))
+    role = ResourcePermissionSummary(
+        resource_type="AWS::IAM::Role", permissions=frozenset({"iam:CreateRole", "s3:CreateBucket"})
+    )
+
+    verified = verify_summaries(
+        IAM(client), ARN.from_str("arn:aws:iam::123456789012:role/deploy"), [bucket, role, bucket]
+    )
+
+    assert client.requests == [["iam:CreateRole", "s3:CreateBucket"]]
+    assert verified.ok_value[role].permissions == [
+        ActionPermission("iam:CreateRole", Authorized.DENIED),
+        ActionPermission("s3:CreateBucket", Authorized.ALLOWED),
+    ]
+    assert verified.ok_value[bucket].permissions == [ActionPermission("s3:CreateBucket", Authorized.ALLOWED)]
+
+
+def test_simulate_reuses_cached_decisions_until_policies_change(tmp_path):
+    role = "arn:aws:iam::123456789012:role/deploy"
+    simulation_cache = DiskSimulationCache(DiskCache(root=tmp_path, namespace="simulations"))
+
+    def simulate(client, actions):
+        return list(IAM(client, simulation_cache=simulation_cache).simulate(role, actions))
+
+    cold, warm, changed = FakeIAMClient(), FakeIAMClient(), FakeIAMClient(policy_version="v2")
+    first = simulate(cold, ["s3:GetObject", "iam:PassRole"])
+    second = simulate(warm, ["iam:PassRole", "s3:GetObject", "s3:PutObject"])
+    simulate(changed, ["s3:GetObject"])
+
+    assert cold.requests == [["s3:GetObject", "iam:PassRole"]]
+    assert warm.requests == [["s3:PutObject"]]
+    assert changed.requests == [["s3:GetObject"]]
+    assert second[:2] == first[::-1]
+    assert (simulation_cache.stats.hits, simulation_cache.stats.misses) == (2, 4)
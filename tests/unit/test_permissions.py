@@ -0,0 +1,30 @@
+from cloudformation_permissions.domain.permissions import ActionIds, PermissionSet
+
+
+def test_permission_sets_combine_as_bitsets():
+    ids = ActionIds()
+    create = PermissionSet.of(ids, ["sqs:CreateQueue", "sqs:TagQueue"])
+    update = PermissionSet.of(ids, ["sqs:SetQueueAttributes", "sqs:TagQueue"])
+
+    assert create | update == frozenset({"sqs:CreateQueue", "sqs:SetQueueAttributes", "sqs:TagQueue"})
+    assert create & update == frozenset({"sqs:TagQueue"})
+    assert create - update == frozenset({"sqs:CreateQueue"})
+    assert (create | update).bits == create.bits | update.bits
+    assert PermissionSet.union_of(ids, [create, update]) == create | update
+    assert create & update <= create
+    assert len(ids) == len(create | update)
+
+
+def test_permission_sets_behave_as_frozensets():
+    ids = ActionIds()
+    permissions = PermissionSet.of(ids, ["sqs:CreateQueue", "sqs:TagQueue"])
+
+    assert "sqs:CreateQueue" in permissions
+    assert "sqs:DeleteQueue" not in permissions
+    assert permissions == frozenset({"sqs:CreateQueue", "sqs:TagQueue"})
+    assert hash(permissions) == hash(frozenset({"sqs:CreateQueue", "sqs:TagQueue"}))
+    assert permissions | {"sqs:DeleteQueue"} == PermissionSet.of(
+        ids, ["sqs:CreateQueue", "sqs:TagQueue", "sqs:DeleteQueue"]
+    )
+    assert sorted(permissions) == ["sqs:CreateQueue", "sqs:TagQueue"]
+    assert PermissionSet(ids) == frozenset()
@@ -0,0 +1,78 @@
+import random
+
+from conftest import IndexedReference
+from pytest import mark
+
+from cloudformation_permissions.adapters.policy_compaction import PolicyCompactor, policy_size
+
+access_levels = {
+    "s3:GetObject": "Read",
+    "s3:GetObjectAcl": "Read",
+    "s3:GetObjectTagging": "Read",
+    "s3:GetBucketPolicy": "Read",
+    "s3:ListBucket": "List",
+    "s3:PutObject": "Write",
+    "s3:PutObjectAcl": "Permissions Management",
+    "s3:DeleteObject": "Write",
+    "iam:GetRole": "Read",
+    "iam:PassRole": "Write",
+    "sqs:CreateQueue": "Write",
+    "sqs:DeleteQueue": "Write",
+}
+
+
+reference = IndexedReference(access_levels)
+
+
+def test_wildcards_only_match_required_actions():
+    compactor = PolicyCompactor(reference)
+
+    assert compactor.compact_actions(["s3:GetObject", "s3:GetObjectAcl"]) == {"s3": ["s3:GetObject", "s3:GetObjectAcl"]}
+    assert compactor.compact_actions(["s3:GetObject", "s3:GetObjectAcl", "s3:GetObjectTagging"]) == {"s3": ["s3:GetO*"]}
+    assert compactor.compact_actions(["sqs:CreateQueue", "sqs:DeleteQueue", "iam:PassRole"]) == {
+        "iam": ["iam:PassRole"],
+        "sqs": ["sqs:*"],
+    }
+
+
+def test_wildcards_may_allow_chosen_access_levels():
+    compactor = PolicyCompactor(reference, access_levels=("Read",))
+
+    assert compactor.compact_actions(["s3:GetObject", "s3:GetObjectAcl", "s3:PutObject"]) == {
+        "s3": ["s3:G*", "s3:PutObject"]
+    }
+
+
+def test_actions_missing_from_reference_and_patterns_are_kept():
+    compactor = PolicyCompactor(reference)
+
+    assert compactor.compact_actions(["s3:Put*", "s3:PutObject", "s3:PutObjectAcl", "new:Action"]) == {
+        "new": ["new:Action"],
+        "s3": ["s3:Put*"],
+    }
+
+
+@mark.parametrize("seed", range(20))
+def test_compacted_actions_allow_exactly_the_required_actions(seed):
+    required = random.Random(seed).sample(sorted(access_levels), 6)  # noqa: S311 - seeded, cases are repeatable
+    index = reference.action_index
+
+    patterns = [
+        pattern for patterns in PolicyCompactor(reference).compact_actions(required).values() for pattern in patterns
+    ]
+
+    assert {name for pattern in patterns for name in index.match(pattern)} == set(required)
+
+
+def test_policies_are_packed_under_the_size_limit():
+    actions = [f"service{index}:Action{action}" for index in range(30) for action in range(10)]
+
+    policies = PolicyCompactor(reference, max_policy_size=1000).policies(actions)
+
+    assert all(policy_size(policy) <= 1000 for policy in policies)
+    # no two policies could have been one
+    sizes = sorted(policy_size(policy) for policy in policies)
+    assert sizes[0] + sizes[1] - policy_size({"Version": "2012-10-17", "Statement": []}) > 1000
+    assert sorted(
+        action for policy in policies for statement in policy["Statement"] for action in statement["Action"]
+    ) == sorted(actions)
@@ -0,0 +1,114 @@
+import json
+from pathlib import Path
+
+import pytest
+from conftest import FakeIAMClient, IndexedReference
+
+from cloudformation_permissions.adapters.iam import IAM, authorization
+from cloudformation_permissions.adapters.policy_evaluator import LocalIAM, PolicyError, PolicyEvaluator
+from cloudformation_permissions.domain.model import ActionPermission, Authorized, ResourcePermissionSummary
+from cloudformation_permissions.service.handlers import simulated_role, verify_summaries
+
+# policies, and the EvaluationResults expected of SimulatePrincipalPolicy for them. These are
+# hand-written from the documented policy evaluation logic, not recorded from the simulator.
+SIMULATIONS = Path(__file__).parent / "data" / "simulations"
+
+# the access levels of the actions don't matter to evaluation
+service_reference = IndexedReference(
+    dict.fromkeys(
+        [
+            "s3:GetObject",
+            "s3:GetBucketPolicy",
+            "s3:PutObject",
+            "s3:PutBucketPolicy",
+            "s3:DeleteBucket",
+            "iam:CreateRole",
+            "iam:CreateUser",
+            "iam:DeleteRole",
+            "iam:GetRole",
+            "iam:PassRole",
+            "ec2:CreateTags",
+            "ec2:DescribeInstances",
+            "ec2:DescribeTags",
+            "ec2:RunInstances",
+            "sts:AssumeRole",
+            "sts:GetCallerIdentity",
+        ],
+        "Read",
+    )
+)
+reference = service_reference.action_index
+
+
+@pytest.mark.parametrize("expected", sorted(SIMULATIONS.glob("*.json")), ids=lambda path: path.stem)
+def test_decisions_match_documented_evaluation(expected):
+    simulation = json.loads(expected.read_text())
+    evaluator = PolicyEvaluator.from_documents(reference, simulation["Policies"], simulation.get("PermissionsBoundary"))
+
+    decisions = {
+        result["EvalActionName"]: evaluator.decide(result["EvalActionName"])
+        for result in simulation["EvaluationResults"]
+    }
+
+    assert decisions == {result["EvalActionName"]: result["EvalDecision"] for result in simulation["EvaluationResults"]}
+
+
+def test_wildcards_match_actions_missing_from_reference():
+    policy = {"Statement": {"Effect": "Allow", "Action": "s3:Get*", "Resource": "*"}}
+    evaluator = PolicyEvaluator.from_documents(reference, [policy])
+
+    assert evaluator.decide("s3:GetNewFeature") == "allowed"
+    assert evaluator.decide("s3:PutNewFeature") == "implicitDeny"
+
+
+def test_statements_for_specific_resources_do_not_apply():
+    policy = {"Statement": {"Effect": "Allow", "Action": "s3:GetObject", "Resource": "arn:aws:s3:::bucket/*"}}
+
+    assert PolicyEvaluator.from_documents(reference, [policy]).decide("s3:GetObject") == "implicitDeny"
+
+
+def test_invalid_policies_are_rejected():
+    with pytest.raises(PolicyError):
+        PolicyEvaluator.from_documents(reference, [{"Statement": {"Effect": "Allow", "Resource": "*"}}])
+
+
+def test_local_iam_fetches_role_policies_once():
+    client = FakeIAMClient()
+    local = LocalIAM(iam=IAM(client), reference=service_reference)
+    role = "arn:aws:iam::123456789012:role/deploy"
+
+    first = list(local.simulate(role, ["s3:GetObject", "s3:PutObject", "s3:GetObject"]))
+    second = list(local.simulate(role, ["iam:PassRole"]))
+
+    assert client.calls == ["list_attached_role_policies", "list_role_policies"]
+    assert first == [
+        ActionPermission("s3:GetObject", Authorized.ALLOWED),
+        ActionPermission("s3:PutObject", Authorized.DENIED),
+    ]
+    assert second == [ActionPermission("iam:PassRole", authorization("implicitDeny"))]
+
+
+def test_local_iam_reads_policy_files(tmp_path):
+    policy = tmp_path / "policy.json"
+    policy.write_text(json.dumps({"Statement": {"Effect": "Allow", "Action": "iam:*", "Resource": "*"}}))
+    local = LocalIAM(iam=IAM(FakeIAMClient()), reference=service_reference, policy_files=(policy,))
+
+    assert list(local.simulate("arn:aws:sts::123456789012:assumed-role/deploy/session", ["iam:GetRole"])) == [
+        ActionPermission("iam:GetRole", Authorized.ALLOWED)
+    ]
+
+
+class FailingSTS:
+    def __call__(self):
+        raise AssertionError("the caller's role is not needed to evaluate policy files")
+
+
+def test_policy_files_are_verified_without_calling_sts(tmp_path):
+    policy = tmp_path / "policy.json"
+    policy.write_text(json.dumps({"Statement": {"Effect": "Allow", "Action": "s3:*", "Resource": "*"}}))
+    local = LocalIAM(iam=IAM(FakeIAMClient()), reference=service_reference, policy_files=(policy,))
+    summary = ResourcePermissionSummary(resource_type="AWS::S3::Bucket", permissions=frozenset({"s3:PutObject"}))
+
+    verified = simulated_role(local, FailingSTS(), None).and_then(lambda role: verify_summaries(local, role, [summary]))
+
+    assert verified.ok_value[summary].permissions == [ActionPermission("s3:PutObject", Authorized.ALLOWED)]
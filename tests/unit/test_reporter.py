@@ -0,0 +1,112 @@
+import io
+import json
+from pathlib import Path
+
+from cloudformation_permissions.adapters.reporter import (
+    SCHEMA_VERSION,
+    JSONLinesReporter,
+    JSONReporter,
+    ListReporter,
+    PlainListReporter,
+)
+from cloudformation_permissions.domain.model import (
+    ActionPermission,
+    Authorized,
+    BatchSummary,
+    ResourcePermissionSummary,
+    TemplateError,
+    TemplateSummary,
+)
+from cloudformation_permissions.service.handlers import report_templates
+
+role = ResourcePermissionSummary(
+    resource_type="AWS::IAM::Role", permissions=frozenset({"iam:GetRole", "iam:CreateRole"})
+)
+template = TemplateSummary(
+    source=Path("a.yaml"), resources={"Role": role}, failures=["Custom::Thing"], timings={"resolve": 0.5}
+)
+error = TemplateError(source=Path("b.yaml"), error="not found")
+
+
+def test_json_lines_reporter_writes_a_line_per_resource():
+    stream = io.StringIO()
+    JSONLinesReporter(stream).add_summary(BatchSummary(templates=[template, error]))
+
+    assert [json.loads(line) for line in stream.getvalue().splitlines()] == [
+        {
+            "schema_version": SCHEMA_VERSION,
+            "record": "resource",
+            "source": "a.yaml",
+            "logical_id": "Role",
+            "resource_type": "AWS::IAM::Role",
+            "permissions": ["iam:CreateRole", "iam:GetRole"],
+        },
+        {
+            "schema_version": SCHEMA_VERSION,
+            "record": "template",
+            "source": "a.yaml",
+            "failures": ["Custom::Thing"],
+            "statistics": {"resources": 0, "distinct_resources": 0},
+            "timings": {"resolve": 0.5},
+        },
+        {"schema_version": SCHEMA_VERSION, "record": "error", "source": "b.yaml", "error": "not found"},
+    ]
+
+
+def test_json_reporter_writes_one_document():
+    stream = io.StringIO()
+    reporter = JSONReporter(stream)
+    reporter.add_template(template).add_template(error).finish()
+
+    document = json.loads(stream.getvalue())
+    assert document["schema_version"] == SCHEMA_VERSION
+    assert document["templates"][0]["resources"] == [
+        {"logical_id": "Role", "resource_type": "AWS::IAM::Role", "permissions": ["iam:CreateRole", "iam:GetRole"]}
+    ]
+    assert document["templates"][0]["timings"] == {"resolve": 0.5}
+    assert document["templates"][1] == {"source": "b.yaml", "error": "not found"}
+
+
+def test_json_reporter_without_templates():
+    stream = io.StringIO()
+    JSONReporter(stream).finish()
+
+    assert json.loads(stream.getvalue()) == {"schema_version": SCHEMA_VERSION, "templates": []}
+
+
+def test_json_lines_reporter_writes_decisions():
+    stream = io.StringIO()
+    verified = ResourcePermissionSummary(
+        resource_type="AWS::IAM::Role", permissions=[ActionPermission("iam:GetRole", Authorized.ALLOWED)]
+    )
+    JSONLinesReporter(stream).add_summary(verified)
+
+    assert json.loads(stream.getvalue()) == {
+        "schema_version": SCHEMA_VERSION,
+        "record": "resource_type",
+        "resource_type": "AWS::IAM::Role",
+        "permissions": [{"action": "iam:GetRole", "authorization": "allowed"}],
+    }
+
+
+def test_report_templates_streams_each_template_as_it_is_summarised():
+    stream = io.StringIO()
+    written = []
+
+    def templates():
+        for summary in (template, error):
+            yield summary
+            written.append(stream.getvalue())
+
+    report_templates(PlainListReporter(stream), templates())
+
+    assert written == [
+        "a.yaml\niam:CreateRole\niam:GetRole\n",
+        "a.yaml\niam:CreateRole\niam:GetRole\nb.yaml: not found\n",
+    ]
+
+
+def test_report_templates_batches_for_other_reporters():
+    report = report_templates(ListReporter(), iter([error, template]), order=lambda summary: str(summary.source))
+
+    assert [str(text) for text in report.items] == ["a.yaml", "iam:CreateRole", "iam:GetRole", "b.yaml: not found"]
@@ -1,6 +1,22 @@
-from cloudformation_permissions.adapters.permissions_resolver import ResourceInformationResolver
+import json
+
+from conftest import AnyReference, CountingCloudFormationClient
 from pytest import mark
 
+from cloudformation_permissions.adapters.permissions_resolver import (
+    HANDLER_TYPES,
+    ResourceInformationResolver,
+    handlers_permission_level,
+    level_handler_types,
+)
+from cloudformation_permissions.adapters.permissions_resolver.permission_table import (
+    PERMISSION_TABLE,
+    DiskPermissionTable,
+    build_permission_table,
+    read_schemas,
+)
+from cloudformation_permissions.adapters.permissions_resolver.schema_cache import NoSchemaCache, SchemaLocation
+
 test_data = (
     ("Organization::Service::UseCase::MODULE", True),
     ("AWS:SQS:Queue", False),
@@ -10,3 +26,113 @@ test_data = (
 @mark.parametrize("resource_type_name,result", test_data)
 def test_module_detection(resource_type_name, result):
     assert ResourceInformationResolver._is_module(resource_type_name) is result
+
+
+def test_prefetch_describes_each_type_once():
+    client = CountingCloudFormationClient()
+    resolver = ResourceInformationResolver(client, AnyReference(), NoSchemaCache(), max_workers=4)
+    resolver.prefetch(["c", "a", "b", "a", "c"])
+
+    assert sorted(client.calls) == ["a", "b", "c"]
+    assert resolver.resolve("a", "read").ok_value == frozenset({"a:Read"})
+    assert len(client.calls) == 3
+
+
+class FailingCloudFormationClient:
+    def describe_type(self, Type, TypeName):
+        raise AssertionError(f"{TypeName} should be answered from the permission table")
+
+
+IRELAND = SchemaLocation(partition="aws", region="eu-west-1")
+
+
+class KnownReference:
+    def list_actions_by_pattern(self, pattern):
+        return [pattern] if pattern.startswith("sqs:") else []
+
+
+def test_resolver_answers_public_types_from_permission_table(tmp_path):
+    schemas = tmp_path / "schemas"
+    schemas.mkdir()
+    queue = {
+        "typeName": "AWS::SQS::Queue",
+        "handlers": {
+            "create": {"permissions": ["sqs:CreateQueue", "sqs:TagQueue"]},
+            "read": {"permissions": ["sqs:GetQueueAttributes", "invalid:Action"]},
+            "delete": {"permissions": []},
+        },
+    }
+    (schemas / "aws-sqs-queue.json").write_text(json.dumps(queue))
+    (schemas / "aws-sqs-other.json").write_text(json.dumps({"typeName": "AWS::SQS::Other"}))
+    reference_source = tmp_path / "auth.json"
+    reference_source.write_text("[]")
+    table_path = tmp_path / PERMISSION_TABLE
+
+    count = build_permission_table(read_schemas(schemas), KnownReference(), reference_source, table_path, IRELAND)
+    table = DiskPermissionTable(path=table_path, reference_source=reference_source, location=IRELAND)
+    resolver = ResourceInformationResolver(
+        FailingCloudFormationClient(), KnownReference(), NoSchemaCache(), permission_table=table
+    )
+    resolver.prefetch(["AWS::SQS::Queue"])
+
+    assert count == 2
+    assert resolver.resolve("AWS::SQS::Queue", "read").ok_value == frozenset({"sqs:GetQueueAttributes"})
+    assert resolver.resolve("AWS::SQS::Queue", "full").ok_value == frozenset(
+        {"sqs:CreateQueue", "sqs:TagQueue", "sqs:GetQueueAttributes"}
+    )
+    assert resolver.resolve("AWS::SQS::Other", "full").is_err()
+
+
+@mark.parametrize(
+    "changed_reference,location",
+    [
+        (True, IRELAND),
+        (False, SchemaLocation(partition="aws", region="us-east-1")),
+        (False, SchemaLocation(partition="aws-cn", region="eu-west-1")),
+    ],
+    ids=["reference", "region", "partition"],
+)
+def test_stale_permission_table_is_not_used(tmp_path, changed_reference, location):
+    reference_source = tmp_path / "auth.json"
+    reference_source.write_text("[]")
+    table_path = tmp_path / PERMISSION_TABLE
+    schema = {"typeName": "AWS::SQS::Queue", "handlers": {"read": {"permissions": ["sqs:GetQueueAttributes"]}}}
+    build_permission_table([schema], KnownReference(), reference_source, table_path, IRELAND)
+    if changed_reference:
+        reference_source.write_text('[{"servicePrefix": "sqs", "actions": []}]')
+
+    table = DiskPermissionTable(path=table_path, reference_source=reference_source, location=location)
+    client = CountingCloudFormationClient()
+    resolver = ResourceInformationResolver(client, AnyReference(), NoSchemaCache(), permission_table=table)
+
+    assert resolver.resolve("AWS::SQS::Queue", "read").ok_value == frozenset({"AWS::SQS::Queue:Read"})
+    assert client.calls == ["AWS::SQS::Queue"]
+
+
+class CountingReference:
+    def __init__(self):
+        self.patterns = []
+
+    def list_actions_by_pattern(self, pattern):
+        self.patterns.append(pattern)
+        return [pattern]
+
+
+class HandlersCloudFormationClient:
+    def describe_type(self, Type, TypeName):
+        handlers = {handler: {"permissions": [f"sqs:{handler.title()}Queue"]} for handler in HANDLER_TYPES}
+        return {"Schema": json.dumps({"handlers": handlers})}
+
+
+def test_each_handler_is_filtered_once_across_levels():
+    reference = CountingReference()
+    resolver = ResourceInformationResolver(HandlersCloudFormationClient(), reference, NoSchemaCache())
+
+    full = resolver.resolve("AWS::SQS::Queue", "full").ok_value
+    read = resolver.resolve("AWS::SQS::Queue", "read").ok_value
+    create_update = resolver.resolve("AWS::SQS::Queue", handlers_permission_level({"update", "create"})).ok_value
+
+    assert sorted(reference.patterns) == sorted(full)
+    assert read == frozenset({"sqs:ReadQueue", "sqs:ListQueue"})
+    assert create_update == frozenset({"sqs:CreateQueue", "sqs:UpdateQueue"})
+    assert level_handler_types("create,update") == frozenset({"create", "update"})
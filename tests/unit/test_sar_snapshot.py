@@ -0,0 +1,43 @@
+import json
+import os
+
+from cloudformation_permissions.adapters.sar_snapshot import build_snapshot, load_snapshot
+
+reference = [
+    {
+        "name": "Amazon S3",
+        "servicePrefix": "s3",
+        "actions": [
+            {"name": "GetObject", "accessLevel": "Read", "description": "Grants permission to retrieve objects"},
+            {"name": "PutObject", "accessLevel": "Write", "description": "Grants permission to add an object"},
+        ],
+    },
+    {
+        "name": "AWS Identity and Access Management",
+        "servicePrefix": "iam",
+        "actions": [{"name": "PassRole", "accessLevel": "Write", "description": "Grants permission to pass a role"}],
+    },
+]
+
+
+def test_snapshot_round_trip(tmp_path):
+    source, snapshot_path = tmp_path / "auth.json", tmp_path / "auth.snapshot"
+    source.write_text(json.dumps(reference))
+    assert build_snapshot(source, snapshot_path) == 3
+
+    snapshot = load_snapshot(snapshot_path, source)
+    assert list(snapshot.actions) == ["s3:GetObject", "s3:PutObject", "iam:PassRole"]
+    assert snapshot.actions["iam:PassRole"] == {**reference[1]["actions"][0], "qualifiedName": "iam:PassRole"}
+    assert snapshot.actions["s3:PutObject"] is snapshot.actions["s3:PutObject"]
+
+
+def test_snapshot_survives_touch_but_not_changes(tmp_path):
+    source, snapshot_path = tmp_path / "auth.json", tmp_path / "auth.snapshot"
+    source.write_text(json.dumps(reference))
+    build_snapshot(source, snapshot_path)
+
+    os.utime(source, ns=(0, 0))
+    assert load_snapshot(snapshot_path, source) is not None
+
+    source.write_text(json.dumps(reference[:1]))
+    assert load_snapshot(snapshot_path, source) is None
@@ -0,0 +1,104 @@
+from botocore.exceptions import ClientError
+
+from cloudformation_permissions.adapters.rate_limit import RateLimiter
+from cloudformation_permissions.adapters.template_loader.stacks import AccountStacksAdapter
+from cloudformation_permissions.domain.model import ARN, StackResources, TemplateError
+
+ROOT = "arn:aws:cloudformation:eu-west-1:123456789012:stack/root/1"
+NESTED = "arn:aws:cloudformation:eu-west-1:123456789012:stack/root-Child-1/2"
+OTHER = "arn:aws:cloudformation:eu-west-1:123456789012:stack/other/3"
+GONE = "arn:aws:cloudformation:eu-west-1:123456789012:stack/gone/4"
+
+
+def summary(logical_id, resource_type, physical_id=""):
+    return {"LogicalResourceId": logical_id, "ResourceType": resource_type, "PhysicalResourceId": physical_id}
+
+
+STACKS = [
+    {"StackId": ROOT},
+    {"StackId": NESTED, "ParentId": ROOT},
+    {"StackId": OTHER},
+    {"StackId": GONE},
+]
+STACK_RESOURCES = {
+    ROOT: [
+        [summary("Role", "AWS::IAM::Role"), summary("Child", "AWS::CloudFormation::Stack", NESTED)],
+    ],
+    NESTED: [
+        [summary("Bucket", "AWS::S3::Bucket")],
+        [summary("Queue", "AWS::SQS::Queue")],
+    ],
+    OTHER: [[]],
+}
+
+
+class FakePaginator:
+    def __init__(self, client, operation):
+        self.client = client
+        self.operation = operation
+
+    def paginate(self, StackName=None, **kwargs):
+        if self.operation == "list_stacks":
+            self.client.calls.append(None)
+            yield {"StackSummaries": STACKS}
+            return
+        for index, page in enumerate(STACK_RESOURCES.get(StackName, [None])):
+            self.client.calls.append(StackName)
+            if page is None:
+                raise ClientError({"Error": {"Code": "ValidationError", "Message": "missing"}}, "ListStackResources")
+            last = index == len(STACK_RESOURCES[StackName]) - 1
+            yield {"StackResourceSummaries": page} | ({} if last else {"NextToken": "next"})
+
+
+class FakeCloudFormationClient:
+    def __init__(self):
+        self.calls = []
+
+    def get_paginator(self, operation):
+        return FakePaginator(self, operation)
+
+
+class CountingRateLimiter(RateLimiter):
+    def __init__(self):
+        self.acquired = 0
+
+    def acquire(self):
+        self.acquired += 1
+
+
+def test_stream_stack_resources_follows_nested_stacks():
+    client, rate_limiter = FakeCloudFormationClient(), CountingRateLimiter()
+    adapter = AccountStacksAdapter(client, rate_limiter, max_workers=4)
+
+    records = list(adapter.stream_stack_resources())
+
+    pages = {}
+    for record in records:
+        if isinstance(record, StackResources):
+            pages.setdefault(str(record.stack), []).append(record)
+    assert [page.complete for page in pages[NESTED]] == [False, True]
+    assert [resource.LogicalId for page in pages[NESTED] for resource in page.resources] == ["Bucket", "Queue"]
+    assert [resource.TypeName for resource in pages[ROOT][0].resources] == [
+        "AWS::IAM::Role",
+        "AWS::CloudFormation::Stack",
+    ]
+    assert pages[OTHER][0].resources == []
+    assert [record.source for record in records if isinstance(record, TemplateError)] == [ARN.from_str(GONE)]
+    # the nested stack is listed once, through its parent, not again from list_stacks
+    assert sorted(stack for stack in client.calls if stack) == sorted([ROOT, NESTED, NESTED, OTHER, GONE])
+    assert rate_limiter.acquired == len(client.calls)
+
+
+def test_rate_limiter_waits_for_tokens():
+    now = [0.0]
+    slept = []
+
+    def sleep(seconds):
+        slept.append(seconds)
+        now[0] += seconds
+
+    rate_limiter = RateLimiter(rate=2, burst=2, clock=lambda: now[0], sleep=sleep)
+    for _ in range(4):
+        rate_limiter.acquire()
+
+    assert slept == [0.5, 0.5]
@@ -0,0 +1,86 @@
+"""Cold start budget for the CLI.
+
+Set CLOUDFORMATION_PERMISSIONS_STARTUP_BUDGET (seconds) to adjust the budget on slower machines.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from cloudformation_permissions.adapters.cache import DiskCache
+from cloudformation_permissions.adapters.permissions_resolver.schema_cache import (
+    SCHEMA_CACHE_NAMESPACE,
+    DiskSchemaCache,
+    SchemaLocation,
+)
+from cloudformation_permissions.adapters.sar import (
+    REFERENCE_CACHE_NAMESPACE,
+    REFERENCE_SNAPSHOT,
+    REFERENCE_SOURCE,
+    reference_data_dir,
+)
+from cloudformation_permissions.adapters.sar_snapshot import build_snapshot
+
+STARTUP_BUDGET = float(os.environ.get("CLOUDFORMATION_PERMISSIONS_STARTUP_BUDGET", "1.0"))
+HEAVY_MODULES = ("boto3", "cfnlint", "samtranslator", "s3transfer")
+
+RUN_CLI = """
+import json, sys
+from cloudformation_permissions.entrypoints.cli import cli
+try:
+    cli(sys.argv[1:])
+except SystemExit as exit:
+    code = exit.code
+print(json.dumps({"code": code, "modules": sorted(sys.modules)}), file=sys.stderr)
+"""
+
+
+def run_cli(*args, env=None):
+    start = time.perf_counter()
+    process = subprocess.run(  # noqa: S603 - runs this interpreter on the test's own code
+        [sys.executable, "-c", RUN_CLI, *args], capture_output=True, text=True, env=env, check=False
+    )
+    elapsed = time.perf_counter() - start
+    return elapsed, process.stdout, json.loads(process.stderr.splitlines()[-1])
+
+
+def test_importing_cli_does_not_import_heavy_modules():
+    process = subprocess.run(
+        [sys.executable, "-c", "import sys, cloudformation_permissions.entrypoints.cli; print(*sys.modules)"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = {module.partition(".")[0] for module in process.stdout.split()}
+    assert modules.isdisjoint(HEAVY_MODULES)
+
+
+@pytest.mark.skipif(
+    not (reference_data_dir() / REFERENCE_SOURCE).exists(), reason="Service Authorization Reference not available"
+)
+def test_resource_permissions_cold_start(tmp_path):
+    schema = {"handlers": {"read": {"permissions": ["iam:GetRole"]}, "list": {"permissions": ["iam:ListRoles"]}}}
+    location = SchemaLocation(partition="aws", region="us-east-1")
+    DiskSchemaCache(DiskCache(root=tmp_path, namespace=SCHEMA_CACHE_NAMESPACE), location).put(
+        "AWS::IAM::Role", {"Schema": json.dumps(schema)}
+    )
+    build_snapshot(reference_data_dir() / REFERENCE_SOURCE, tmp_path / REFERENCE_CACHE_NAMESPACE / REFERENCE_SNAPSHOT)
+    env = {
+        **os.environ,
+        "CLOUDFORMATION_PERMISSIONS_CACHE_DIR": str(tmp_path),
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "AWS_CONFIG_FILE": str(tmp_path / "config"),
+        "AWS_SHARED_CREDENTIALS_FILE": str(tmp_path / "credentials"),
+    }
+
+    runs = [run_cli("resource", "AWS::IAM::Role", "permissions", env=env) for _ in range(3)]
+    elapsed, stdout, result = min(runs, key=lambda run: run[0])
+
+    assert result["code"] in (None, 0)
+    assert stdout.split() == ["iam:GetRole", "iam:ListRoles"]
+    assert {module.partition(".")[0] for module in result["modules"]}.isdisjoint(HEAVY_MODULES)
+    assert elapsed < STARTUP_BUDGET, f"resource permissions took {elapsed:.3f}s, budget {STARTUP_BUDGET}s"
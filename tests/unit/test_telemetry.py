@@ -0,0 +1,70 @@
+import time
+from contextlib import suppress
+
+from botocore.awsrequest import AWSResponse
+
+from cloudformation_permissions.adapters.aws import AWS
+from cloudformation_permissions.adapters.telemetry import ApiCalls
+
+THROTTLED = (
+    400,
+    (
+        b"<ErrorResponse><Error><Type>Sender</Type><Code>Throttling</Code><Message>Rate exceeded</Message></Error>"
+        b"<RequestId>1</RequestId></ErrorResponse>"
+    ),
+)
+DENIED = (
+    403,
+    (
+        b"<ErrorResponse><Error><Type>Sender</Type><Code>AccessDenied</Code><Message>Denied</Message></Error>"
+        b"<RequestId>2</RequestId></ErrorResponse>"
+    ),
+)
+IDENTITY = (
+    200,
+    (
+        b"<GetCallerIdentityResponse><GetCallerIdentityResult><Arn>arn:aws:iam::123456789012:user/me</Arn>"
+        b"<UserId>ME</UserId><Account>123456789012</Account></GetCallerIdentityResult>"
+        b"<ResponseMetadata><RequestId>3</RequestId></ResponseMetadata></GetCallerIdentityResponse>"
+    ),
+)
+
+
+class Body:
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def stream(self, **kwargs):
+        yield self.content
+
+
+def test_aws_clients_record_calls_retries_throttles_and_errors(monkeypatch, tmp_path):
+    monkeypatch.setenv("AWS_CONFIG_FILE", str(tmp_path / "config"))
+    monkeypatch.setenv("AWS_SHARED_CREDENTIALS_FILE", str(tmp_path / "credentials"))
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    # retries back off
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    responses = iter([THROTTLED, IDENTITY, DENIED])
+
+    def respond(request, **kwargs):
+        status, content = next(responses)
+        return AWSResponse(request.url, status, {}, Body(content))
+
+    aws = AWS()
+    aws.api_calls = api_calls = ApiCalls()
+    sts = aws.client("sts")
+    sts.meta.events.register("before-send", respond)
+
+    assert sts.get_caller_identity()["Account"] == "123456789012"
+    with suppress(sts.exceptions.ClientError):
+        sts.get_caller_identity()
+
+    recorded = api_calls.as_dict()["sts"]["GetCallerIdentity"]
+    assert (recorded["calls"], recorded["retries"], recorded["throttles"]) == (2, 1, 1)
+    assert recorded["errors"] == {"AccessDenied": 1}
+    assert recorded["latency_buckets"]["+Inf"] == 2
+    assert 'cloudformation_permissions_aws_api_calls_total{service="sts",operation="GetCallerIdentity"} 2\n' in (
+        api_calls.prometheus()
+    )
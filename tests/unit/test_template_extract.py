@@ -0,0 +1,63 @@
+import pytest
+
+from cloudformation_permissions.adapters.template_loader import LocalAdapter
+from cloudformation_permissions.adapters.template_loader.extract import UnsupportedTemplate, extract_resources
+from cloudformation_permissions.domain.model import ShortResourceInfo
+
+TEMPLATE = """
+AWSTemplateFormatVersion: "2010-09-09"
+Parameters:
+  Name: {Type: String}
+Resources:
+  Queue:
+    Type: AWS::SQS::Queue
+    Properties:
+      QueueName: !Sub "${Name}-queue"
+      Tags: [{Key: a, Value: b}]
+  Topic:
+    Properties: {TopicName: !Ref Name}
+    Type: 'AWS::SNS::Topic'
+  Untyped:
+    Properties: {}
+  Empty: ~
+Outputs:
+  Queue: {Value: !GetAtt Queue.Arn}
+"""
+
+
+@pytest.mark.parametrize(
+    "template",
+    [
+        TEMPLATE,
+        '{"Resources": {"Queue": {"Type": "AWS::SQS::Queue"}, "Topic": {"Type": "AWS::SNS::Topic"}}}',
+    ],
+)
+def test_extract_resources(template):
+    assert extract_resources(template)[:2] == [("Queue", "AWS::SQS::Queue"), ("Topic", "AWS::SNS::Topic")]
+
+
+@pytest.mark.parametrize(
+    "template",
+    [
+        "Resources:\n  Queue: &queue\n    Type: AWS::SQS::Queue\n  Copy: *queue\n",
+        "Resources:\n  Queue:\n    Type: !Sub AWS::SQS::Queue\n",
+        "Resources:\n  Queue:\n    Type: AWS::SQS::Queue\n  Queue:\n    Type: AWS::SNS::Topic\n",
+        "Resources: {}\n---\nResources: {}\n",
+    ],
+)
+def test_extract_resources_rejects_templates_it_cannot_answer(template):
+    with pytest.raises(UnsupportedTemplate):
+        extract_resources(template)
+
+
+def test_local_adapter_matches_cfnlint(tmp_path):
+    aliased = "Resources:\n  Queue: &queue\n    Type: AWS::SQS::Queue\n  Copy: *queue\n"
+    for name, template in {"template.yaml": TEMPLATE, "aliased.yaml": aliased}.items():
+        (source := tmp_path / name).write_text(template)
+        adapter = LocalAdapter(client=None)
+
+        extracted = adapter.get_template_resources(source).ok_value
+        decoded = adapter._get_template_resources_with_cfnlint(source).ok_value
+
+        assert extracted == decoded
+        assert all(isinstance(resource, ShortResourceInfo) for resource in extracted)
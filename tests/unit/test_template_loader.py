@@ -0,0 +1,97 @@
+import shutil
+from typing import ClassVar
+
+from cloudformation_permissions.adapters.cache import DiskCache
+from cloudformation_permissions.adapters.template_loader import ChangeSetChangesAdapter, LocalAdapter, parse_cache
+from cloudformation_permissions.adapters.template_loader.parse_cache import DiskTemplateParseCache
+from cloudformation_permissions.domain.model import ARN, ShortResourceInfo
+
+
+def test_local_templates_parsed_in_processes_keep_their_order(tmp_path):
+    sources = []
+    for index in range(4):
+        source = tmp_path / f"template{index}.yaml"
+        source.write_text(f"Resources:\n  Queue{index}:\n    Type: AWS::SQS::Queue\n")
+        sources.append(source)
+    (broken := tmp_path / "broken.yaml").write_text("Resources: [")
+    sources.insert(2, broken)
+
+    results = LocalAdapter(client=None, max_processes=2).get_many_template_resources(sources, max_workers=1)
+
+    assert [result.is_ok() for result in results] == [True, True, False, True, True]
+    assert results[0].ok_value == [ShortResourceInfo(TypeName="AWS::SQS::Queue", LogicalId="Queue0")]
+    assert results[4].ok_value == [ShortResourceInfo(TypeName="AWS::SQS::Queue", LogicalId="Queue3")]
+
+
+def test_local_templates_are_cached_by_their_content(tmp_path):
+    def adapter():
+        return LocalAdapter(client=None, parse_cache=DiskTemplateParseCache(DiskCache(tmp_path, "templates")))
+
+    (template := tmp_path / "template.yaml").write_text("Resources:\n  Queue:\n    Type: AWS::SQS::Queue\n")
+    shutil.copy(template, copy := tmp_path / "copy.yaml")
+    (changed := tmp_path / "changed.yaml").write_text("Resources:\n  Topic:\n    Type: AWS::SNS::Topic\n")
+    cold = adapter()
+    assert cold.get_template_resources(template).ok_value == [ShortResourceInfo("AWS::SQS::Queue", "Queue")]
+
+    warm = adapter()
+    results = warm.get_many_template_resources([template, copy, changed], max_workers=1)
+
+    assert [result.ok_value for result in results] == [
+        [ShortResourceInfo("AWS::SQS::Queue", "Queue")],
+        [ShortResourceInfo("AWS::SQS::Queue", "Queue")],
+        [ShortResourceInfo("AWS::SNS::Topic", "Topic")],
+    ]
+    stats = warm.parse_cache.stats
+    assert (stats.hits, stats.misses, stats.writes) == (2, 1, 1)
+
+
+def test_cached_templates_are_parsed_again_by_another_extractor_version(tmp_path, monkeypatch):
+    def adapter():
+        return LocalAdapter(client=None, parse_cache=DiskTemplateParseCache(DiskCache(tmp_path, "templates")))
+
+    (template := tmp_path / "template.yaml").write_text("Resources:\n  Queue:\n    Type: AWS::SQS::Queue\n")
+    adapter().get_template_resources(template)
+    monkeypatch.setattr(parse_cache, "EXTRACTOR_VERSION", parse_cache.EXTRACTOR_VERSION + 1)
+
+    upgraded = adapter()
+    assert upgraded.get_template_resources(template).ok_value == [ShortResourceInfo("AWS::SQS::Queue", "Queue")]
+    assert (upgraded.parse_cache.stats.hits, upgraded.parse_cache.stats.misses) == (0, 1)
+
+
+def resource_change(action, logical_id, type_name, **change):
+    change |= {"Action": action, "LogicalResourceId": logical_id, "ResourceType": type_name}
+    return {"Type": "Resource", "ResourceChange": change}
+
+
+class PagedChangeSetClient:
+    pages: ClassVar[dict[str | None, dict]] = {
+        None: {
+            "Changes": [
+                resource_change("Add", "Queue", "AWS::SQS::Queue"),
+                resource_change("Modify", "Bucket", "AWS::S3::Bucket", Replacement="False"),
+            ],
+            "NextToken": "page2",
+        },
+        "page2": {
+            "Changes": [
+                resource_change("Modify", "Table", "AWS::DynamoDB::Table", Replacement="True"),
+                resource_change("Remove", "Topic", "AWS::SNS::Topic"),
+            ]
+        },
+    }
+
+    def describe_change_set(self, ChangeSetName, NextToken=None):
+        return self.pages[NextToken]
+
+
+def test_changeset_changes_carry_the_permission_level_of_their_change():
+    changeset = ARN.from_str("arn:aws:cloudformation:eu-west-1:123456789012:changeSet/change/id")
+
+    resources = ChangeSetChangesAdapter(client=PagedChangeSetClient()).get_template_resources(changeset).ok_value
+
+    assert [(resource.LogicalId, resource.PermissionLevel) for resource in resources] == [
+        ("Queue", "create"),
+        ("Bucket", "update"),
+        ("Table", "replace"),
+        ("Topic", "delete"),
+    ]
@@ -0,0 +1,47 @@
+import time
+from pathlib import Path
+
+from result import Ok
+
+from cloudformation_permissions.adapters.timings import Timings, timed
+from cloudformation_permissions.domain.model import ShortResourceInfo
+from cloudformation_permissions.service.handlers import summarise_template
+
+
+class Resolver:
+    def prefetch(self, resource_types):
+        list(resource_types)
+
+    def resolve(self, resource_type, permission_level):
+        return Ok(frozenset({f"{resource_type}:{permission_level}"}))
+
+
+def test_nested_stages_are_only_counted_in_the_inner_stage():
+    timings = Timings()
+    with timings.stage("load"):
+        time.sleep(0.01)
+        with timings.stage("parse"):
+            time.sleep(0.1)
+
+    load, parse = timings.stages["load"].wall, timings.stages["parse"].wall
+    # were parse counted in load too, load would take longer
+    assert load >= 0.01
+    assert parse >= 0.1
+    assert load < parse
+    assert (timings.stages["load"].calls, timings.stages["parse"].calls) == (1, 1)
+
+
+def test_timed_items_are_each_taken_in_the_stage():
+    timings = Timings()
+    assert list(timed(timings, "load", iter("abc"))) == ["a", "b", "c"]
+    assert timings.stages["load"].calls == 4
+
+
+def test_summarise_template_records_the_resolve_stage_and_resources_by_type():
+    resources = [ShortResourceInfo(TypeName="AWS::SQS::Queue", LogicalId=f"Queue{index}") for index in range(3)]
+    timings = Timings()
+
+    summarise_template(Resolver(), Path("template.yaml"), resources, "full", timings=timings)
+
+    assert timings.stages["resolve"].calls == 1
+    assert timings.as_dict()["resource_types"] == {"AWS::SQS::Queue": {"resources": 3, "seconds": 0.0, "source": None}}